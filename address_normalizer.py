@@ -0,0 +1,146 @@
+# address_normalizer.py
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Address components, named after the M1 / Vicmap address attributes they correspond to.
+ADDRESS_COMPONENTS = ("blg_unit_type", "blg_unit_id_1", "house_number_1", "house_suffix_1",
+                      "road_name", "road_type", "locality_name")
+
+ROAD_TYPES = {
+    "ALLEY": "ALLEY", "AV": "AVENUE", "AVE": "AVENUE", "AVENUE": "AVENUE", "BLVD": "BOULEVARD",
+    "BOULEVARD": "BOULEVARD", "BVD": "BOULEVARD", "CCT": "CIRCUIT", "CIRCUIT": "CIRCUIT", "CL": "CLOSE",
+    "CLOSE": "CLOSE", "COURT": "COURT", "CRES": "CRESCENT", "CRESCENT": "CRESCENT", "CT": "COURT",
+    "DR": "DRIVE", "DRIVE": "DRIVE", "ESP": "ESPLANADE", "ESPLANADE": "ESPLANADE", "GR": "GROVE",
+    "GROVE": "GROVE", "HWY": "HIGHWAY", "HIGHWAY": "HIGHWAY", "LA": "LANE", "LANE": "LANE", "LN": "LANE",
+    "PARADE": "PARADE", "PDE": "PARADE", "PL": "PLACE", "PLACE": "PLACE", "RD": "ROAD", "ROAD": "ROAD",
+    "SQ": "SQUARE", "SQUARE": "SQUARE", "ST": "STREET", "STREET": "STREET", "TCE": "TERRACE",
+    "TERRACE": "TERRACE", "TRACK": "TRACK", "TRK": "TRACK", "WAY": "WAY", "WY": "WAY",
+}
+UNIT_TYPES = {"APT": "APARTMENT", "APARTMENT": "APARTMENT", "FLAT": "FLAT", "SHOP": "SHOP", "SUITE": "SUITE",
+              "U": "UNIT", "UNIT": "UNIT"}
+
+_HOUSE_NUMBER = re.compile(r"(\d+(?:-\d+)?)([A-Z]?)")
+_FLOAT_TEXT = re.compile(r"(\d+)\.0+")
+
+
+class Address(namedtuple("Address", ADDRESS_COMPONENTS)):
+    """Canonical address components; empty strings for absent ones. An all-empty Address is falsy."""
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return any(self)
+
+    def __str__(self):
+        return " ".join(part for part in self if part)
+
+
+EMPTY_ADDRESS = Address(*[""] * len(ADDRESS_COMPONENTS))
+
+
+class AddressNormalizer:
+    """
+    Parses and canonicalises addresses into `Address` component tuples, so addresses from Council,
+    Vicmap, M1 and Rates compare component by component instead of as raw strings.
+
+    Text is upper-cased with whitespace collapsed, road and unit types are expanded from their
+    abbreviations ('ST' -> 'STREET') and house numbers or unit ids exported as floats ('71.0') lose
+    the decimal part. Results are memoised by raw input, since the same road and locality strings repeat
+    across thousands of records.
+
+    Usage:
+        normalizer = AddressNormalizer()
+        normalizer.parse("71A Gowrie St, Tatura")     # Address(..., house_number_1='71', house_suffix_1='A', ...)
+        normalizer.changes("10 MAIN STREET, SPRINGFIELD", "10 MAIN ROAD, SPRINGFIELD")  # ('road_type',)
+    """
+
+    def __init__(self, cache_size=65536):
+        self.parse = lru_cache(maxsize=cache_size)(self._parse)
+        self.component = lru_cache(maxsize=cache_size)(self._component)
+
+    @staticmethod
+    def _text(value):
+        if value is None or value != value:  # None or NaN
+            return ""
+        return " ".join(str(value).upper().split())
+
+    def _component(self, field, value):
+        """Canonical form of one address component given as a separate field (e.g. an M1 column)."""
+        text = self._text(value).strip(" ,.")
+        if field in ("house_number_1", "blg_unit_id_1"):
+            float_text = _FLOAT_TEXT.fullmatch(text)
+            return float_text.group(1) if float_text else text
+        if field == "road_type":
+            return ROAD_TYPES.get(text, text)
+        if field == "blg_unit_type":
+            return UNIT_TYPES.get(text, text)
+        return text
+
+    def _parse(self, value):
+        """Splits a full address string ('UNIT 3 10A MAIN ST, SPRINGFIELD') into canonical components."""
+        text = self._text(value)
+        if not text:
+            return EMPTY_ADDRESS
+        street, comma, locality = text.partition(",")
+        tokens = street.replace("/", " / ").split()
+        parts = dict.fromkeys(ADDRESS_COMPONENTS, "")
+
+        if len(tokens) > 1 and tokens[0] in UNIT_TYPES:
+            parts["blg_unit_type"], parts["blg_unit_id_1"] = UNIT_TYPES[tokens[0]], tokens[1]
+            tokens = tokens[2:]
+        elif len(tokens) > 2 and tokens[1] == "/":
+            parts["blg_unit_id_1"] = tokens[0]
+            tokens = tokens[2:]
+        house_number = _HOUSE_NUMBER.fullmatch(tokens[0]) if tokens else None
+        if house_number:
+            parts["house_number_1"], parts["house_suffix_1"] = house_number.groups()
+            tokens = tokens[1:]
+            if not parts["house_suffix_1"] and len(tokens) > 1 and len(tokens[0]) == 1 and tokens[0].isalpha():
+                parts["house_suffix_1"], tokens = tokens[0], tokens[1:]  # '71 A GOWRIE STREET'
+
+        # Without a comma the locality follows the road type, so split at the last road type token.
+        road_type_at = [i for i, token in enumerate(tokens) if i > 0 and token in ROAD_TYPES]
+        if comma:
+            split = len(tokens) - 1 if road_type_at and road_type_at[-1] == len(tokens) - 1 else None
+            locality_tokens = locality.replace(",", " ").split()
+        else:
+            # 'ST' after another road type starts a Saint locality ('10 FITZROY STREET ST KILDA'), not the road type.
+            while len(road_type_at) > 1 and tokens[road_type_at[-1]] == "ST" and road_type_at[-1] < len(tokens) - 1:
+                road_type_at.pop()
+            split = road_type_at[-1] if road_type_at else None
+            locality_tokens = tokens[split + 1:] if split is not None else []
+        if split is not None:
+            parts["road_type"] = ROAD_TYPES[tokens[split]]
+            tokens = tokens[:split]
+        parts["road_name"] = " ".join(tokens).strip(" ,.")
+        parts["locality_name"] = " ".join(locality_tokens).strip(" ,.")
+        return Address(**parts)
+
+    def from_components(self, record):
+        """
+        Address from a record of separate component fields (an M1 row). The unit type only counts
+        when a unit id is present, and the house number and suffix only when present.
+        """
+        def present(field):
+            value = record.get(field)
+            return value is not None and value == value
+
+        unit = present("blg_unit_id_1")
+        return Address(
+            self.component("blg_unit_type", record.get("blg_unit_type")) if unit else "",
+            self.component("blg_unit_id_1", record.get("blg_unit_id_1")) if unit else "",
+            self.component("house_number_1", record.get("house_number_1")) if present("house_number_1") else "",
+            self.component("house_suffix_1", record.get("house_suffix_1")) if present("house_suffix_1") else "",
+            self.component("road_name", record.get("road_name")),
+            self.component("road_type", record.get("road_type")),
+            self.component("locality_name", record.get("locality_name")),
+        )
+
+    def changes(self, old_address, new_address):
+        """Names of the components that differ between two full address strings, in component order."""
+        old, new = self.parse(old_address), self.parse(new_address)
+        if old == new:
+            return ()
+        return tuple(field for field, before, after in zip(ADDRESS_COMPONENTS, old, new) if before != after)
@@ -0,0 +1,783 @@
+# benchmark.py
+
+import argparse
+import contextlib
+import io
+import json
+import functools
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import PROFILER
+from keyword_matcher import KeywordMatcher
+from comparison_engine import (CHANGE_REPORT_FIELDS, SnapshotStore, compare_datasets, compare_datasets_columnar, compare_incremental,
+                               iter_changes_sorted, iter_csv_records, write_vicmap_snapshot)
+from rates_sources import DbApiRatesSource, RatesSnapshot, create_sqlite_rates_table, write_rates_snapshot
+from reference_snapshot import ReferenceSnapshot
+from report_sinks import CsvSink, JsonArraySink, NdjsonSink
+from synthetic_data import make_extracts, make_m1_dataset, make_rates_records
+from m1_validator import (MEMO_KEYWORDS, RULES, RatesIndex, get_rates_data, iter_m1_identifiers, join_rates_data,
+                          sample_rates_data, scan_rates_records, ValidationCache, validate_m1_batch, validate_m1_csv,
+                          validate_m1_row)
+
+SAMPLE_M1_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data.csv")
+CLI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+
+
+def _time_lookups(lookup, queries):
+    start = time.perf_counter()
+    for propnum, spi, pfi in queries:
+        lookup(propnum, spi, pfi)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def bench_rates_lookup(sizes=(1000, 10000, 60000), lookups=2000, linear_lookups=50, seed=0):
+    """
+    Times propnum/SPI/PFI lookups through `RatesIndex` against the old linear scans as the
+    rates table grows. Index cost per lookup should stay flat; the linear scan grows with the table.
+    """
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        records = make_rates_records(size, seed=seed)
+        # Mix of propnum hits, SPI and PFI-suffix fallbacks, and misses that try every key.
+        queries = []
+        for _ in range(lookups):
+            record = rng.choice(records)
+            roll = rng.random()
+            if roll < 0.4:
+                queries.append((record["propnum"], None, None))
+            elif roll < 0.6:
+                queries.append(("0.0", record["spi"], None))
+            elif roll < 0.8:
+                queries.append((None, None, record["property_pfi"].rsplit("_", 1)[-1]))
+            else:
+                queries.append(("0.0", "0\\XX000000", "999999999"))
+
+        start = time.perf_counter()
+        rates_index = RatesIndex(records)
+        build_seconds = time.perf_counter() - start
+
+        indexed = _time_lookups(lambda p, s, f: get_rates_data(p, s, f, rates_index), queries)
+        linear = _time_lookups(lambda p, s, f: scan_rates_records(p, s, f, records), queries[:linear_lookups])
+        results.append({"rates_records": size, "index_build_s": build_seconds,
+                        "indexed_lookup_us": indexed * 1e6, "linear_lookup_us": linear * 1e6})
+    return results
+
+
+def bench_batch_validation(csv_path=SAMPLE_M1_CSV, rates_records=None, repeat=3):
+    """
+    Checks that `validate_m1_batch` gives exactly the per-row `validate_m1_row` statuses (and the same
+    per-rule hit counts) for the M1 CSV at `csv_path`, then times both paths. Raises AssertionError on
+    any mismatch.
+    """
+    m1_df = pd.read_csv(csv_path)
+    m1_df.columns = [col.strip() for col in m1_df.columns]
+    rates_index = RatesIndex(sample_rates_data if rates_records is None else rates_records)
+
+    def per_row():
+        statuses = []
+        for _, row in m1_df.iterrows():
+            rates_record = get_rates_data(row.get('propnum'), row.get('spi'),
+                                          row.get('property_pfi', row.get('property pfi')), rates_index)
+            statuses.append(validate_m1_row(row, rates_record))
+        return statuses
+
+    def batch():
+        return validate_m1_batch(m1_df, join_rates_data(m1_df, rates_index)).tolist()
+
+    RULES.reset_hits()
+    expected = per_row()
+    row_hits = RULES.hits
+    RULES.reset_hits()
+    actual = batch()
+    assert RULES.hits == row_hits, f"batch/per-row rule hit counts differ: {RULES.hits} vs {row_hits}"
+    mismatches = [i for i, (e, a) in enumerate(zip(expected, actual)) if e != a]
+    assert len(expected) == len(actual) and not mismatches, f"batch/per-row mismatch at rows {mismatches[:10]}"
+
+    timings = {}
+    for name, run in (("per_row", per_row), ("batch", batch)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        timings[name] = (time.perf_counter() - start) / repeat
+    return {"rows": len(m1_df), "per_row_s": timings["per_row"], "batch_s": timings["batch"]}
+
+
+def bench_keyword_matching(memo_bytes=(200, 2000, 8000), memos=200, seed=0):
+    """
+    Times classifying distinct Rates memos into MEMO_KEYWORDS categories: one compiled
+    `KeywordMatcher` scan per memo against one `any(kw in memo ...)` pass per category. Most memos
+    are routine text; one in five mentions a single keyword phrase. The warm column is a repeat
+    scan of the same memos, as happens when several M1 rows share a rates record. A cold compiled scan
+    is not expected to beat the per-category pass (it is slower on short memos); the warm column is
+    where reuse pays off.
+    """
+    rng = random.Random(seed)
+    words = ["property", "active", "rates", "notice", "owner", "valuation", "council", "parcel", "standard",
+             "recorded", "payment", "received", "instalment", "2024-05-01"]
+    phrases = ["subdivision", "retired", "old address", "address update", "demolished"]
+    results = []
+    for size in memo_bytes:
+        texts = []
+        for i in range(memos):
+            text = f"memo {i}:"
+            while len(text) < size:
+                text += " " + rng.choice(words)
+            if rng.random() < 0.2:
+                cut = rng.randint(0, len(text))
+                text = text[:cut] + " " + rng.choice(phrases) + " " + text[cut:]
+            texts.append(text)
+
+        start = time.perf_counter()
+        for text in texts:
+            {name for name, keywords in MEMO_KEYWORDS.items() if any(kw in text for kw in keywords)}
+        per_category = (time.perf_counter() - start) / memos
+
+        matcher = KeywordMatcher(MEMO_KEYWORDS)  # Fresh matcher so the memo cache starts cold.
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            for text in texts:
+                matcher.scan(text)
+            timings.append((time.perf_counter() - start) / memos)
+        results.append({"memo_bytes": size, "per_category_us": per_category * 1e6,
+                        "compiled_us": timings[0] * 1e6, "compiled_warm_us": timings[1] * 1e6})
+    return results
+
+
+def bench_streaming(copies=20, chunksizes=(2000, 10000), csv_path=SAMPLE_M1_CSV):
+    """
+    Compares peak traced memory of validating a large M1 CSV (`copies` x the sample) whole versus
+    streamed with `validate_m1_csv`. Streaming peak should follow chunk size, not file size.
+    """
+    rates_index = RatesIndex(sample_rates_data)
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = os.path.join(tmp, "m1.csv"), os.path.join(tmp, "validated.csv")
+        sample = pd.read_csv(csv_path)
+        pd.concat([sample] * copies).to_csv(source, index=False)
+        rows = len(sample) * copies
+        del sample
+
+        def whole_file():
+            m1_df = pd.read_csv(source)
+            m1_df.columns = [col.strip() for col in m1_df.columns]
+            m1_df['validation_status'] = validate_m1_batch(m1_df, join_rates_data(m1_df, rates_index))
+            m1_df.to_csv(output, index=False)
+
+        runs = [("whole file", whole_file)]
+        runs += [(f"chunks of {size}", lambda size=size: validate_m1_csv(source, output, rates_index, chunksize=size))
+                 for size in chunksizes]
+        results = []
+        for name, run in runs:
+            tracemalloc.start()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):  # Silence per-chunk progress lines.
+                run()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({"mode": name, "rows": rows, "seconds": seconds, "peak_mb": peak / 2**20})
+    return results
+
+
+def bench_report_sinks(changes=100000):
+    """
+    Peak traced memory and time of writing `changes` change-report entries the old way (collect a list,
+    then one `json.dumps(..., indent=4)`) versus streaming them from a generator into each sink.
+    Checks JsonArraySink writes the same text as `json.dumps`.
+    """
+    def entries():
+        for i in range(changes):
+            yield {"change_category": "Address Update", "justification": "Address details mismatch between Council and Vicmap.",
+                   "council_propnum": f"{i:07d}", "vicmap_pfi": f"PFI_{i}", "linked_propnums": "",
+                   "attribute_changed": "road_type", "vicmap_old_value": f"{i % 400} MAIN STREET, SPRINGFIELD",
+                   "council_new_value": f"{i % 400} MAIN ROAD, SPRINGFIELD", "proposed_edit_code": "S",
+                   "review_status": "Pending", "reviewer_notes": ""}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def list_then_dumps(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(list(entries()), indent=4) + "\n")
+
+        def stream(sink_class, **options):
+            def run(path):
+                with sink_class(path, **options) as sink:
+                    sink.write_many(entries())
+            return run
+
+        runs = [("list + json.dumps", "json", list_then_dumps), ("JsonArraySink", "json", stream(JsonArraySink)),
+                ("NdjsonSink", "ndjson", stream(NdjsonSink)), ("CsvSink", "csv", stream(CsvSink, columns=CHANGE_REPORT_FIELDS))]
+        results = []
+        for name, extension, run in runs:
+            path = os.path.join(tmp, f"{name.split()[0]}.{extension}")
+            start = time.perf_counter()
+            run(path)
+            seconds = time.perf_counter() - start
+            tracemalloc.start()  # Traced separately: tracing slows the run several-fold.
+            run(path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results.append({"sink": name, "changes": changes, "seconds": seconds, "peak_mb": peak / 2**20, "path": path})
+        with open(results[0]["path"], encoding="utf-8") as a, open(results[1]["path"], encoding="utf-8") as b:
+            assert a.read() == b.read(), "JsonArraySink output differs from json.dumps"
+    for row in results:
+        del row["path"]
+    return results
+
+
+def bench_parallel(copies=100, worker_counts=(1, 2, 4, 8), chunksize=20000, csv_path=SAMPLE_M1_CSV):
+    """
+    Times `validate_m1_csv` on a large M1 CSV (`copies` x the sample) with growing `--workers`
+    counts, capped at the machine's CPU count, and reports speed-up over the serial run.
+    """
+    rates_index = RatesIndex(sample_rates_data)
+    counts = [count for count in worker_counts if count <= (os.cpu_count() or 1)] or [1]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = os.path.join(tmp, "m1.csv"), os.path.join(tmp, "validated.csv")
+        pd.concat([pd.read_csv(csv_path)] * copies).to_csv(source, index=False)
+        for workers in counts:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                rows = validate_m1_csv(source, output, rates_index, chunksize=chunksize, workers=workers)
+            seconds = time.perf_counter() - start
+            results.append({"workers": workers, "rows": rows, "seconds": seconds,
+                            "speedup": results[0]["seconds"] / seconds if results else 1.0})
+    return results
+
+
+def bench_validation_cache(copies=100, change_rate=0.001, chunksize=20000, csv_path=SAMPLE_M1_CSV, seed=0):
+    """
+    Re-validates a large M1 CSV (`copies` x the sample) with a `ValidationCache` after editing the
+    comments of `change_rate` of its rows, against an uncached run of the edited file. Checks the cached
+    output is identical and reports how many rows the second run had to validate.
+    """
+    rates_index = RatesIndex(sample_rates_data)
+    with tempfile.TemporaryDirectory() as tmp:
+        original, edited = os.path.join(tmp, "m1.csv"), os.path.join(tmp, "m1_edited.csv")
+        cache_path = os.path.join(tmp, "validation_cache.npz")
+        m1_df = pd.concat([pd.read_csv(csv_path, dtype=str)] * copies, ignore_index=True)
+        m1_df.to_csv(original, index=False)
+        rng = np.random.default_rng(seed)
+        edited_rows = rng.choice(len(m1_df), int(len(m1_df) * change_rate), replace=False)
+        m1_df.loc[edited_rows, "comments"] = "new lot created by subdivision"
+        m1_df.to_csv(edited, index=False)
+
+        def run(source, output, cache=None):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                validate_m1_csv(source, os.path.join(tmp, output), rates_index, chunksize=chunksize, cache=cache)
+            return time.perf_counter() - start
+
+        uncached_s = run(edited, "uncached.csv")
+        first_run_s = run(original, "first.csv", ValidationCache(cache_path))
+        cache = ValidationCache(cache_path)
+        cached_s = run(edited, "cached.csv", cache)
+        with open(os.path.join(tmp, "uncached.csv")) as a, open(os.path.join(tmp, "cached.csv")) as b:
+            assert a.read() == b.read(), "Cached validation differs from a full run"
+    return {"rows": len(m1_df), "edited": len(edited_rows), "uncached_s": uncached_s, "first_run_s": first_run_s,
+            "cached_s": cached_s, "validated": cache.misses}
+
+
+def bench_instrumentation(copies=100, chunksize=20000, repeat=3, csv_path=SAMPLE_M1_CSV, stage_calls=1000000):
+    """
+    Validates a large M1 CSV (`copies` x the sample) with the stage profiler off and on (best of
+    `repeat` runs each), checks the outputs are identical, and times a disabled `PROFILER.stage()`.
+    Profiling off should cost nothing measurable; on, it adds a few timer calls per chunk.
+    """
+    rates_index = RatesIndex(sample_rates_data)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "m1.csv")
+        pd.concat([pd.read_csv(csv_path)] * copies).to_csv(source, index=False)
+
+        def run(output):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                validate_m1_csv(source, os.path.join(tmp, output), rates_index, chunksize=chunksize)
+            return time.perf_counter() - start
+
+        disabled_s = min(run("disabled.csv") for _ in range(repeat))
+        PROFILER.enable()
+        try:
+            enabled_s = min(run("enabled.csv") for _ in range(repeat))
+            stages = sum(calls for calls, _, _ in PROFILER.stages.values())
+        finally:
+            PROFILER.disable()
+        with open(os.path.join(tmp, "disabled.csv")) as a, open(os.path.join(tmp, "enabled.csv")) as b:
+            assert a.read() == b.read(), "Profiled validation differs from an unprofiled run"
+
+    start = time.perf_counter()
+    for _ in range(stage_calls):
+        with PROFILER.stage("noop"):
+            pass
+    disabled_stage_ns = (time.perf_counter() - start) / stage_calls * 1e9
+    return {"rows": len(pd.read_csv(csv_path)) * copies, "disabled_s": disabled_s, "enabled_s": enabled_s,
+            "stage_calls": stages // repeat, "disabled_stage_ns": disabled_stage_ns}
+
+
+def bench_db_rates_source(rates_count=60000, m1_rows=20000, chunksizes=(1000, 5000, 20000), seed=0):
+    """
+    Looks up M1 rows against a SQLite rates table through `DbApiRatesSource` and reports database
+    round-trips per run: they follow the number of chunks, not the number of M1 rows. PFI fallbacks
+    use exact matching here, as the suffix LIKE scans the whole table once per pattern.
+    """
+    rng = random.Random(seed)
+    records = make_rates_records(rates_count, seed=seed)
+    sampled = [rng.choice(records) for _ in range(m1_rows)]
+    m1_df = pd.DataFrame({
+        "propnum": [r["propnum"] if rng.random() < 0.7 else None for r in sampled],
+        "spi": [r["spi"] if rng.random() < 0.5 else None for r in sampled],
+        "property_pfi": [r["property_pfi"] for r in sampled],
+    })
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rates.db")
+        conn = sqlite3.connect(path)
+        create_sqlite_rates_table(conn, records)
+        conn.close()
+        for chunksize in chunksizes:
+            source = DbApiRatesSource(functools.partial(sqlite3.connect, path), order_by="rowid", pfi_match="exact")
+            start = time.perf_counter()
+            for begin in range(0, m1_rows, chunksize):
+                chunk = m1_df.iloc[begin:begin + chunksize]
+                join_rates_data(chunk, source.index_for(chunk))
+            seconds = time.perf_counter() - start
+            source.close()
+            results.append({"m1_rows": m1_rows, "chunksize": chunksize, "round_trips": source.round_trips,
+                            "seconds": seconds})
+    return results
+
+
+def bench_reference_snapshot(rates_count=500000, lookups=100000, vicmap_size=500000, seed=0):
+    """
+    Startup and lookup cost of the memory-mapped reference snapshots against the in-memory structures
+    they replace. Rates: building a `RatesIndex` from the records (after they are fetched) versus opening
+    a `RatesSnapshot`, then the per-lookup cost of each on the same M1 identifiers, which must agree.
+    Vicmap: reading the extract CSV into record dicts versus opening the snapshot, then `compare_datasets`
+    on each, which must give the same report. Writing a snapshot is a one-off cost per extract.
+    """
+    rng = random.Random(seed)
+    records = make_rates_records(rates_count, seed=seed)
+    sampled = [rng.choice(records) for _ in range(lookups)]
+    queries = [(r["propnum"] if rng.random() < 0.7 else None, r["spi"] if rng.random() < 0.5 else None,
+                r["property_pfi"][-rng.randint(6, 12):]) for r in sampled]
+    with tempfile.TemporaryDirectory() as tmp:
+        rates_path, vicmap_path = os.path.join(tmp, "rates.snap"), os.path.join(tmp, "vicmap.snap")
+        start = time.perf_counter()
+        write_rates_snapshot(rates_path, records)
+        rates_write_s = time.perf_counter() - start
+        start = time.perf_counter()
+        rates_index = RatesIndex(records)
+        index_build_s = time.perf_counter() - start
+        start = time.perf_counter()
+        snapshot = RatesSnapshot(rates_path)
+        snapshot_open_s = time.perf_counter() - start
+        index_lookup_us = _time_lookups(rates_index.lookup, queries) * 1e6
+        snapshot_lookup_us = _time_lookups(snapshot.lookup, queries) * 1e6
+        assert all(rates_index.lookup(*q) == snapshot.lookup(*q) for q in queries), "Snapshot lookups differ"
+        rates = {"records": rates_count, "write_s": rates_write_s, "file_mb": os.path.getsize(rates_path) / 2**20,
+                 "build_s": index_build_s, "open_s": snapshot_open_s,
+                 "build_lookup_us": index_lookup_us, "snapshot_lookup_us": snapshot_lookup_us}
+        snapshot.close()
+        del records, sampled, rates_index
+
+        council_df, vicmap_df = make_extracts(vicmap_size, seed=seed)
+        csv_path = os.path.join(tmp, "vicmap.csv")
+        vicmap_df.to_csv(csv_path, index=False)
+        council_records = council_df.to_dict("records")
+        del council_df, vicmap_df
+        start = time.perf_counter()
+        vicmap_records = list(iter_csv_records(csv_path))
+        load_s = time.perf_counter() - start
+        start = time.perf_counter()
+        write_vicmap_snapshot(vicmap_path, vicmap_records)
+        vicmap_write_s = time.perf_counter() - start
+        start = time.perf_counter()
+        vicmap_snapshot = ReferenceSnapshot(vicmap_path)
+        vicmap_open_s = time.perf_counter() - start
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            from_records = compare_datasets(council_records, vicmap_records)
+            records_compare_s = time.perf_counter() - start
+            start = time.perf_counter()
+            from_snapshot = compare_datasets(council_records, vicmap_snapshot)
+            snapshot_compare_s = time.perf_counter() - start
+        assert from_records == from_snapshot, "Comparison against the Vicmap snapshot differs"
+        vicmap_snapshot.close()
+        vicmap = {"records": len(vicmap_records), "write_s": vicmap_write_s, "file_mb": os.path.getsize(csv_path) / 2**20,
+                  "load_s": load_s, "open_s": vicmap_open_s,
+                  "records_compare_s": records_compare_s, "snapshot_compare_s": snapshot_compare_s}
+    return rates, vicmap
+
+
+# Cold start: `cli.py` run from a fresh interpreter, as a scheduler launches it.
+COLD_START_TARGET_S = 0.25
+HEAVY_MODULES = ("numpy", "pandas", "requests")
+
+
+def _imported_modules(argv):
+    # Top-level module names a fresh `python -X importtime` run of `argv` imported.
+    stderr = subprocess.run([sys.executable, "-X", "importtime"] + argv, check=True, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True).stderr
+    return {line.rsplit("|", 1)[1].strip() for line in stderr.splitlines() if line.startswith("import time:")}
+
+
+def bench_cold_start(repeat=5):
+    """
+    Wall time of `cli.py` commands from a fresh interpreter (best of `repeat` runs), and which of
+    HEAVY_MODULES each one imported. `--help` and the dict-engine comparison need none of them and have to
+    finish within COLD_START_TARGET_S. Validating sample_data.csv needs pandas and is timed for reference,
+    as is the bare interpreter.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        commands = [
+            ("python -c pass", ["-c", "pass"], None),
+            ("cli.py --help", [CLI_SCRIPT, "--help"], COLD_START_TARGET_S),
+            ("cli.py validate --help", [CLI_SCRIPT, "validate", "--help"], COLD_START_TARGET_S),
+            ("cli.py compare", [CLI_SCRIPT, "compare", "--output", os.path.join(tmp, "changes.json")],
+             COLD_START_TARGET_S),
+            ("cli.py validate sample_data.csv",
+             [CLI_SCRIPT, "validate", SAMPLE_M1_CSV, "--output", os.path.join(tmp, "validated.csv")], None),
+        ]
+        for command, argv, target_s in commands:
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run([sys.executable] + argv, check=True, stdout=subprocess.DEVNULL)
+                timings.append(time.perf_counter() - start)
+            results.append({"command": command, "seconds": min(timings), "target_s": target_s,
+                            "heavy_imports": sorted(_imported_modules(argv).intersection(HEAVY_MODULES))})
+    return results
+
+
+def cold_start_regressions(results):
+    """Commands in `bench_cold_start` results that missed their target or imported a heavy module they don't need."""
+    regressions = []
+    for result in results:
+        if result["target_s"] is None:
+            continue
+        if result["seconds"] > result["target_s"]:
+            regressions.append(f"{result['command']}: cold start {result['seconds'] * 1e3:.0f} ms "
+                               f"vs target {result['target_s'] * 1e3:.0f} ms")
+        if result["heavy_imports"]:
+            regressions.append(f"{result['command']}: imports {', '.join(result['heavy_imports'])}")
+    return regressions
+
+
+def _print_cold_start(results):
+    print("Cold start (best of several runs from a fresh interpreter)")
+    print(f"{'command':>32} {'ms':>7} {'target (ms)':>12} {'heavy imports':>15}")
+    for row in results:
+        target = f"{row['target_s'] * 1e3:.0f}" if row["target_s"] else "-"
+        print(f"{row['command']:>32} {row['seconds'] * 1e3:>7.0f} {target:>12} {', '.join(row['heavy_imports']) or '-':>15}")
+
+
+def bench_compare_engines(sizes=(100000, 1000000), seed=0):
+    """
+    Times the dict-based `compare_datasets` against `compare_datasets_columnar` and the
+    `iter_changes_sorted` sort-merge on synthetic extracts of each size, checking they agree.
+    `records_s` is the extra cost of materialising record dicts, which only the columnar engine avoids.
+    """
+    results = []
+    for size in sizes:
+        council_df, vicmap_df = make_extracts(size, seed=seed)
+        start = time.perf_counter()
+        council_records, vicmap_records = council_df.to_dict("records"), vicmap_df.to_dict("records")
+        records_seconds = time.perf_counter() - start
+        timings = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, run in (
+                ("dict", lambda: compare_datasets(council_records, vicmap_records)),
+                ("columnar", lambda: compare_datasets_columnar(council_df, vicmap_df)),
+                ("sort_merge", lambda: list(iter_changes_sorted(council_records, vicmap_records))),
+            ):
+                start = time.perf_counter()
+                timings[name] = (run(), time.perf_counter() - start)
+        assert timings["columnar"][0] == timings["dict"][0], "columnar engine disagrees with compare_datasets"
+        # Sort-merge yields address updates before new and missing properties, so compare in one order.
+        by_change = lambda entry: (entry["council_propnum"] or "", entry["change_category"])
+        assert sorted(timings["sort_merge"][0], key=by_change) == sorted(timings["dict"][0], key=by_change), \
+            "sort-merge engine disagrees with compare_datasets"
+        results.append({"properties": size, "changes": len(timings["dict"][0]), "records_s": records_seconds,
+                        **{f"{name}_s": seconds for name, (_, seconds) in timings.items()}})
+    return results
+
+
+def bench_incremental(size=1000000, delta_rate=0.01, seed=0):
+    """
+    Times a second fortnightly run of `compare_incremental` (about `delta_rate` of properties
+    re-addressed in Council since the stored snapshot) against a full `compare_datasets_columnar`,
+    checking the delta report equals the full report restricted to the changed propnums.
+    """
+    council_df, vicmap_df = make_extracts(size, seed=seed)
+    next_council = council_df.copy()
+    moved = np.random.default_rng(seed + 1).random(len(next_council)) < delta_rate
+    next_council.loc[moved, "full_address"] = next_council.loc[moved, "full_address"] + " (MOVED)"
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        path = os.path.join(tmp, "snapshot.npz")
+        start = time.perf_counter()
+        store = SnapshotStore(path)
+        store.save(compare_incremental(council_df, vicmap_df, store)[1])
+        first_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        store = SnapshotStore(path)
+        delta, hashes = compare_incremental(next_council, vicmap_df, store)
+        store.save(hashes)
+        incremental_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        full = compare_datasets_columnar(next_council, vicmap_df)
+        full_seconds = time.perf_counter() - start
+    # The delta also re-reports propnums sharing a plan with a moved one (subdivision links).
+    delta_propnums = {entry["council_propnum"] for entry in delta}
+    assert set(next_council.loc[moved, "propnum"]) <= delta_propnums, "incremental report misses changed propnums"
+    assert delta == [entry for entry in full if entry["council_propnum"] in delta_propnums], \
+        "incremental report disagrees with the full comparison"
+    return {"properties": size, "changed": int(moved.sum()), "delta_changes": len(delta),
+            "first_run_s": first_seconds, "incremental_s": incremental_seconds, "full_s": full_seconds}
+
+
+# Benchmark suite: throughput and peak memory of the hot paths on synthetic data, kept in a baseline file.
+SUITE_SIZES = (10000, 100000, 1000000)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+def _measure(name, size, items, run, trace_memory=True):
+    # Throughput from an untraced run; peak memory from a second run under tracemalloc, which slows it down.
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+    peak_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        run()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return {"benchmark": name, "size": size, "items": items, "seconds": seconds, "items_per_s": items / seconds,
+            "peak_mb": peak_mb}
+
+
+def _suite_validation(size, seed, tmp, lookups, sample_rows, trace_memory):
+    # Rates lookups, per-row validation and the CSV pipeline on an M1 dataset of `size` rows.
+    m1_path, output = os.path.join(tmp, "m1.csv"), os.path.join(tmp, "validated.csv")
+    m1_df, rates_records = make_m1_dataset(size, seed=seed)
+    m1_df.to_csv(m1_path, index=False)
+    rates_index = RatesIndex(rates_records)
+    # Identifiers and rows as the pipeline reads them from the CSV (e.g. propnum '100000.0').
+    m1_df = pd.read_csv(m1_path, nrows=max(lookups, sample_rows))
+    queries = list(iter_m1_identifiers(m1_df))[:lookups]
+    rows = m1_df.head(sample_rows).to_dict("records")
+    rows_rates = [get_rates_data(row.get("propnum"), row.get("spi"), row.get("property_pfi"), rates_index)
+                  for row in rows]
+    del m1_df
+
+    def lookup_all():
+        for propnum, spi, pfi in queries:
+            get_rates_data(propnum, spi, pfi, rates_index)
+
+    def validate_rows():
+        for row, rates_record in zip(rows, rows_rates):
+            validate_m1_row(row, rates_record)
+
+    def pipeline():
+        with contextlib.redirect_stdout(io.StringIO()):
+            validate_m1_csv(m1_path, output, rates_index)
+
+    return [_measure("get_rates_data", size, len(queries), lookup_all, trace_memory),
+            _measure("validate_m1_row", size, len(rows), validate_rows, trace_memory),
+            _measure("m1_pipeline", size, size, pipeline, trace_memory)]
+
+
+def _suite_compare(size, seed, trace_memory):
+    # compare_datasets on Council and Vicmap extracts of `size` properties.
+    council_df, vicmap_df = make_extracts(size, seed=seed)
+    council, vicmap = council_df.to_dict("records"), vicmap_df.to_dict("records")
+    del council_df, vicmap_df
+
+    def compare():
+        with contextlib.redirect_stdout(io.StringIO()):
+            compare_datasets(council, vicmap)
+
+    return _measure("compare_datasets", size, len(vicmap), compare, trace_memory)
+
+
+def run_suite(sizes=SUITE_SIZES, seed=0, lookups=100000, sample_rows=20000, trace_memory=True):
+    """
+    Benchmarks the hot paths on seeded synthetic data (see `synthetic_data`) of each size in `sizes`:
+    `get_rates_data` (up to `lookups` lookups), `validate_m1_row` (up to `sample_rows` rows), the M1
+    pipeline (`validate_m1_csv` from CSV to CSV, as `main()` runs it) and `compare_datasets` on Council and
+    Vicmap extracts of the same size. Returns one result per benchmark and size, with items per second
+    and peak traced memory in MB. Each size's data is freed before the next size is generated.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            results += _suite_validation(size, seed, tmp, lookups, sample_rows, trace_memory)
+            results.append(_suite_compare(size, seed, trace_memory))
+    return results
+
+
+def write_baseline(results, path=BASELINE_PATH):
+    """Writes suite results as JSON, with the versions and machine they were measured on."""
+    baseline = {
+        "machine": {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                    "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def compare_to_baseline(results, baseline, tolerance=0.25):
+    """
+    Regressions of `results` against a loaded baseline file: any benchmark and size whose throughput fell,
+    or whose peak memory grew, by more than `tolerance` (a fraction). Returns a list of descriptions.
+    """
+    expected = {(result["benchmark"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = expected.get((result["benchmark"], result["size"]))
+        if base is None:
+            continue
+        name = f"{result['benchmark']} at {result['size']} rows"
+        if result["items_per_s"] < base["items_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['items_per_s']:,.0f} items/s vs {base['items_per_s']:,.0f} in baseline")
+        if result["peak_mb"] and base.get("peak_mb") and result["peak_mb"] > base["peak_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak {result['peak_mb']:.1f} MB vs {base['peak_mb']:.1f} MB in baseline")
+    return regressions
+
+
+def main_suite(args):
+    results = run_suite(args.sizes, seed=args.seed, trace_memory=not args.no_memory)
+    print(f"{'benchmark':>17} {'rows':>8} {'items':>8} {'seconds':>8} {'items/s':>11} {'peak traced (MB)':>17}")
+    for row in results:
+        peak = f"{row['peak_mb']:.1f}" if row["peak_mb"] is not None else "-"
+        print(f"{row['benchmark']:>17} {row['size']:>8} {row['items']:>8} {row['seconds']:>8.2f} "
+              f"{row['items_per_s']:>11,.0f} {peak:>17}")
+    print()
+    cold_start = bench_cold_start()
+    _print_cold_start(cold_start)
+    print()
+    # Cold start is held to a fixed target rather than the baseline, so it is checked on every run.
+    regressions = cold_start_regressions(cold_start)
+    if args.update_baseline or not os.path.exists(args.baseline):
+        write_baseline(results, args.baseline)
+        print(f"INFO: Wrote baseline to {args.baseline}")
+    else:
+        with open(args.baseline) as f:
+            regressions += compare_to_baseline(results, json.load(f), args.tolerance)
+        if not regressions:
+            print(f"INFO: No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Benchmarks for the M1 validator and the comparison engine.")
+    parser.add_argument("--suite", action="store_true",
+                        help="Run the synthetic-data suite and check it against the baseline file instead of the "
+                             "component benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SUITE_SIZES), help="Suite data sizes in rows.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file (JSON) to check against or write.")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run's results as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed throughput drop or peak memory growth before a regression (default 0.25).")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced runs for peak memory.")
+    args = parser.parse_args(argv)
+    if args.suite:
+        return main_suite(args)
+
+    row = bench_batch_validation()
+    print(f"Batch validation parity OK on {row['rows']} rows of {os.path.basename(SAMPLE_M1_CSV)}: "
+          f"per-row {row['per_row_s'] * 1e3:.1f} ms, batch {row['batch_s'] * 1e3:.1f} ms")
+    print()
+    print("Rates lookup benchmark (per-lookup cost vs rates table size)")
+    print(f"{'rates records':>14} {'index build (ms)':>17} {'indexed (us)':>13} {'linear scan (us)':>17}")
+    for row in bench_rates_lookup():
+        print(f"{row['rates_records']:>14} {row['index_build_s'] * 1e3:>17.1f} "
+              f"{row['indexed_lookup_us']:>13.2f} {row['linear_lookup_us']:>17.1f}")
+    print()
+    print("Memo keyword classification (per memo)")
+    print(f"{'memo bytes':>11} {'any() per category (us)':>24} {'matcher cold (us)':>18} {'matcher warm (us)':>18}")
+    for row in bench_keyword_matching():
+        print(f"{row['memo_bytes']:>11} {row['per_category_us']:>24.1f} {row['compiled_us']:>18.1f} "
+              f"{row['compiled_warm_us']:>18.2f}")
+    print()
+    results = bench_streaming()
+    print(f"M1 validation peak memory ({results[0]['rows']} rows)")
+    print(f"{'mode':>18} {'seconds':>8} {'peak traced (MB)':>17}")
+    for row in results:
+        print(f"{row['mode']:>18} {row['seconds']:>8.2f} {row['peak_mb']:>17.1f}")
+    print()
+    row = bench_validation_cache()
+    print(f"Validation cache ({row['rows']} M1 rows, {row['edited']} edited since the cached run)")
+    print(f"{'uncached (s)':>13} {'first run (s)':>14} {'cached re-run (s)':>18} {'rows validated':>15}")
+    print(f"{row['uncached_s']:>13.2f} {row['first_run_s']:>14.2f} {row['cached_s']:>18.2f} {row['validated']:>15}")
+    print()
+    row = bench_instrumentation()
+    print(f"Stage profiler overhead ({row['rows']} M1 rows, {row['stage_calls']} stages timed per run)")
+    print(f"{'off (s)':>8} {'on (s)':>7} {'overhead':>9} {'disabled stage() (ns)':>22}")
+    print(f"{row['disabled_s']:>8.2f} {row['enabled_s']:>7.2f} {row['enabled_s'] / row['disabled_s'] - 1:>9.1%} "
+          f"{row['disabled_stage_ns']:>22.0f}")
+    print()
+    results = bench_db_rates_source()
+    print(f"SQLite rates source ({results[0]['m1_rows']} M1 rows)")
+    print(f"{'chunksize':>10} {'round-trips':>12} {'seconds':>8}")
+    for row in results:
+        print(f"{row['chunksize']:>10} {row['round_trips']:>12} {row['seconds']:>8.2f}")
+    print()
+    rates, vicmap = bench_reference_snapshot()
+    print(f"Reference snapshots: rates ({rates['records']} records, {rates['file_mb']:.0f} MB snapshot, "
+          f"written once in {rates['write_s']:.1f} s)")
+    print(f"{'RatesIndex build (s)':>21} {'snapshot open (ms)':>19} {'index lookup (us)':>18} {'snapshot lookup (us)':>21}")
+    print(f"{rates['build_s']:>21.2f} {rates['open_s'] * 1e3:>19.2f} {rates['build_lookup_us']:>18.2f} "
+          f"{rates['snapshot_lookup_us']:>21.2f}")
+    print(f"Reference snapshots: Vicmap ({vicmap['records']} records, {vicmap['file_mb']:.0f} MB extract CSV, "
+          f"snapshot written once in {vicmap['write_s']:.1f} s)")
+    print(f"{'CSV load (s)':>13} {'snapshot open (ms)':>19} {'compare, records (s)':>21} {'compare, snapshot (s)':>22}")
+    print(f"{vicmap['load_s']:>13.2f} {vicmap['open_s'] * 1e3:>19.2f} {vicmap['records_compare_s']:>21.2f} "
+          f"{vicmap['snapshot_compare_s']:>22.2f}")
+    print()
+    print("Comparison engines (seconds)")
+    print(f"{'properties':>11} {'changes':>8} {'build records':>14} {'dict':>7} {'columnar':>9} {'sort-merge':>11}")
+    for row in bench_compare_engines():
+        print(f"{row['properties']:>11} {row['changes']:>8} {row['records_s']:>14.2f} {row['dict_s']:>7.2f} "
+              f"{row['columnar_s']:>9.2f} {row['sort_merge_s']:>11.2f}")
+    print()
+    row = bench_incremental()
+    print(f"Incremental comparison ({row['properties']} properties, {row['changed']} changed since snapshot)")
+    print(f"{'first run (s)':>14} {'second run (s)':>15} {'full compare (s)':>17} {'delta changes':>14}")
+    print(f"{row['first_run_s']:>14.2f} {row['incremental_s']:>15.2f} {row['full_s']:>17.2f} {row['delta_changes']:>14}")
+    print()
+    results = bench_report_sinks()
+    print(f"Change report writers ({results[0]['changes']} changes)")
+    print(f"{'writer':>18} {'seconds':>8} {'peak traced (MB)':>17}")
+    for row in results:
+        print(f"{row['sink']:>18} {row['seconds']:>8.2f} {row['peak_mb']:>17.1f}")
+    print()
+    _print_cold_start(bench_cold_start())
+    print()
+    results = bench_parallel()
+    print(f"Parallel validation ({results[0]['rows']} rows, {os.cpu_count()} CPUs)")
+    print(f"{'workers':>8} {'seconds':>8} {'speed-up':>9}")
+    for row in results:
+        print(f"{row['workers']:>8} {row['seconds']:>8.2f} {row['speedup']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,35 @@
+# cli.py
+
+import argparse
+import importlib
+
+# Subcommand -> (module whose main() runs it, summary). A command's module is imported only when that
+# command runs, so `cli.py --help` loads nothing beyond argparse and `cli.py compare` never loads pandas.
+COMMANDS = {
+    "validate": ("m1_validator", "Validate an M1 CSV against the rates data."),
+    "compare": ("comparison_engine", "Compare Council property data with the Vicmap extract."),
+    "snapshot": ("reference_snapshot", "Build a memory-mapped snapshot of the rates or Vicmap reference data."),
+    "bench": ("benchmark", "Run the component benchmarks or the benchmark suite."),
+}
+
+
+def main(argv=None):
+    """
+    Single entry point for schedulers: `python cli.py COMMAND [ARGS...]` runs COMMAND's script with ARGS,
+    e.g. `python cli.py validate m1.csv -o m1_validated.csv --rates-snapshot rates.snap`.
+    `python cli.py COMMAND --help` lists the command's options. Returns the command's exit status.
+    """
+    parser = argparse.ArgumentParser(
+        description="M1 validation and Vicmap comparison tools.", formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<10}{summary}" for name, (_, summary) in COMMANDS.items()))
+    parser.add_argument("command", choices=COMMANDS, metavar="COMMAND", help="One of the commands below.")
+    # The command parses its own options, including --help, so everything after its name is passed on.
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Options and arguments for COMMAND.")
+    args = parser.parse_args(argv)
+    module_name = COMMANDS[args.command][0]
+    prog = f"{parser.prog} {args.command}"
+    return importlib.import_module(module_name).main(args.args, prog=prog) or 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,4 +1,57 @@
-import json
+import argparse
+import csv
+import os
+import sys
+
+# numpy and pandas are imported inside the columnar and incremental engines, so the dict and sort-merge
+# engines (and --help) run without loading them.
+from address_normalizer import AddressNormalizer
+from instrumentation import PROFILER
+from reference_snapshot import ReferenceSnapshot, write_snapshot
+from report_sinks import SINKS, atomic_write, open_sink
+from rule_engine import RuleEngine
+
+# Shared by all engines, so each distinct address string is parsed once per run.
+normalizer = AddressNormalizer()
+
+CHANGE_REPORT_FIELDS = [
+    "change_category", "justification", "council_propnum", "vicmap_pfi", "linked_propnums", "attribute_changed",
+    "vicmap_old_value", "council_new_value", "proposed_edit_code", "review_status", "reviewer_notes",
+]
+
+# Text of each kind of change-report entry, declared as data like the M1 validation rules. CHANGE_RULES
+# renders them and counts every entry produced per kind in CHANGE_RULES.hits.
+CHANGE_TEMPLATES = {
+    "new_property": {
+        "change_category": "New Property (Subdivision)",
+        "justification": "New lot {lot_number} on plan {plan_number} not found in Vicmap.",
+        "proposed_edit_code": "E", # 'E' for 'Edit All' creates a new property and address
+        "reviewer_notes": "",
+    },
+    "address_update": {
+        "change_category": "Address Update",
+        "justification": "Address details mismatch between Council and Vicmap.",
+        "proposed_edit_code": "S", # 'S' for 'Site/Address' update
+        "reviewer_notes": "",
+    },
+    # A property missing from the council list is a candidate for retirement, unless it is the
+    # parent parcel of a subdivision (new child lots were found on its plan).
+    "subdivision_parent": {
+        "change_category": "Parent Parcel (Implicitly Retired)",
+        "justification": "Parent parcel of new subdivision. Retirement is handled by Vicmap upon child creation.",
+        "proposed_edit_code": "None",
+        "reviewer_notes": "",
+    },
+    "missing_from_council": {
+        "change_category": "Missing from Council Data",
+        "justification": "Property in Vicmap not found in Council's active property list.",
+        "proposed_edit_code": "Flag for Review",
+        "reviewer_notes": "Manual investigation required to confirm if property should be retired.",
+    },
+}
+CHANGE_RULES = RuleEngine(templates=CHANGE_TEMPLATES)
+_NO_FIELDS = {}
+
 
 def load_council_data():
     """
@@ -7,19 +60,19 @@ def load_council_data():
     (e.g., PostgreSQL, SQL Server) or read from a CSV file extract.
 
     The sample data demonstrates:
-    - Two new child parcels from a subdivision (propnum 7001, 7002).
+    - Two new child parcels from a staged subdivision on plan PS123456 (propnum 7001, 7002).
     - A property with an updated road name (propnum 5002).
     - An unchanged property (propnum 5003).
     """
     print("INFO: Loading Council data (using sample data)...")
     return [
         {
-            "propnum": "7001", "spi": "3\\PS800001", "plan_number": "PS800001", "lot_number": "3",
+            "propnum": "7001", "spi": "3\\PS123456", "plan_number": "PS123456", "lot_number": "3",
             "full_address": "1 INDEPENDENCE WAY, SPRINGFIELD", "road_name": "INDEPENDENCE WAY", "house_number_1": "1",
             "is_active": True
         },
         {
-            "propnum": "7002", "spi": "4\\PS800001", "plan_number": "PS800001", "lot_number": "4",
+            "propnum": "7002", "spi": "4\\PS123456", "plan_number": "PS123456", "lot_number": "4",
             "full_address": "2 INDEPENDENCE WAY, SPRINGFIELD", "road_name": "INDEPENDENCE WAY", "house_number_1": "2",
             "is_active": True
         },
@@ -41,8 +94,8 @@ def load_vicmap_data():
     This would typically involve reading from a Shapefile, File Geodatabase, or CSV.
 
     The sample data demonstrates:
-    - The parent parcel that was subdivided (propnum 6001). This property no longer exists
-      in the new Council data, so it should be identified as retired.
+    - The parent parcel that was subdivided (propnum 6001, lot 1 on PS123456). This property no longer
+      exists in the new Council data, so it should be identified as retired.
     - The property before its road name was updated (propnum 5002).
     - An unchanged property (propnum 5003).
     - A property that exists in Vicmap but is missing from the council data (propnum 9999).
@@ -67,17 +120,140 @@ def load_vicmap_data():
         }
     ]
 
-def compare_datasets(council_data, vicmap_data):
+def _new_property_change(propnum, council_prop, parent_propnums=()):
+    text = CHANGE_RULES.render("new_property", {"lot_number": council_prop.get('lot_number'),
+                                                "plan_number": council_prop.get('plan_number')})
+    return {
+        "change_category": text["change_category"],
+        "justification": text["justification"],
+        "council_propnum": propnum,
+        "vicmap_pfi": None,
+        "linked_propnums": ", ".join(parent_propnums), # Parent parcel(s) this lot was subdivided from
+        "attribute_changed": "ALL",
+        "vicmap_old_value": None,
+        "council_new_value": council_prop.get('full_address'),
+        "proposed_edit_code": text["proposed_edit_code"],
+        "review_status": "Pending",
+        "reviewer_notes": text["reviewer_notes"]
+    }
+
+
+def _address_update_change(propnum, council_prop, vicmap_prop, changed_components):
+    text = CHANGE_RULES.render("address_update", _NO_FIELDS)
+    return {
+        "change_category": text["change_category"],
+        "justification": text["justification"],
+        "council_propnum": propnum,
+        "vicmap_pfi": vicmap_prop.get('property_PFI'),
+        "linked_propnums": "",
+        "attribute_changed": ", ".join(changed_components), # e.g. 'road_type' or 'house_number_1, road_name'
+        "vicmap_old_value": vicmap_prop.get('full_address'),
+        "council_new_value": council_prop.get('full_address'),
+        "proposed_edit_code": text["proposed_edit_code"],
+        "review_status": "Pending",
+        "reviewer_notes": text["reviewer_notes"]
+    }
+
+
+def _plan_key(plan_number):
+    # Plan number for matching ('PS123456 ' -> 'PS123456'), or None when absent. Plan numbers are
+    # upper-case codes in both extracts, so only surrounding whitespace is ignored.
+    if not isinstance(plan_number, str):
+        return None
+    return plan_number.strip() or None
+
+
+def _plan_of_spi(spi):
+    # '1\\PS123456' -> 'PS123456'; also handles lot~section SPIs and bare plans such as 'CP123456'.
+    return _plan_key(spi.rsplit("\\", 1)[-1]) if isinstance(spi, str) else None
+
+
+def _subdivision_links(new_lots, missing_properties):
+    """
+    Links subdivision parents to their new child lots by plan number, replacing the old hard-coded
+    parent SPI. `new_lots` are (propnum, plan_number) of Council properties not in Vicmap and
+    `missing_properties` are (propnum, spi) of Vicmap properties not in Council. A missing Vicmap
+    property is a parent when its SPI's plan is the plan of a new lot (e.g. a staged subdivision
+    creating lots 3 and 4 from balance lot 1\\PS123456).
+
+    New lots are indexed by plan, so each missing property is a single hash probe instead of a scan
+    of every new lot. Returns (children_by_parent, parents_by_child), both mapping a propnum to a list
+    of propnums in input order.
+    """
+    new_lots_by_plan = {}
+    for propnum, plan_number in new_lots:
+        plan = _plan_key(plan_number)
+        if plan:
+            new_lots_by_plan.setdefault(plan, []).append(propnum)
+
+    children_by_parent, parents_by_child = {}, {}
+    for propnum, spi in missing_properties:
+        children = new_lots_by_plan.get(_plan_of_spi(spi))
+        if children:
+            children_by_parent[propnum] = children
+            for child in children:
+                parents_by_child.setdefault(child, []).append(propnum)
+    return children_by_parent, parents_by_child
+
+
+def _retirement_change(propnum, vicmap_prop, child_propnums=()):
+    # We assume a property missing from the council list is a candidate for retirement.
+    # It is the parent parcel of a subdivision when new child lots were found on its plan.
+    text = CHANGE_RULES.render("subdivision_parent" if child_propnums else "missing_from_council", _NO_FIELDS)
+    return {
+        "change_category": text["change_category"],
+        "justification": text["justification"],
+        "council_propnum": propnum, # In this case, it's the Vicmap propnum not found in council's active list
+        "vicmap_pfi": vicmap_prop.get('property_PFI'),
+        "linked_propnums": ", ".join(child_propnums), # New child lots of a subdivided parent
+        "attribute_changed": "status",
+        "vicmap_old_value": "Active in Vicmap",
+        "council_new_value": "Retired/Missing in Council DB",
+        "proposed_edit_code": text["proposed_edit_code"],
+        "review_status": "Pending",
+        "reviewer_notes": text["reviewer_notes"]
+    }
+
+
+def write_vicmap_snapshot(path, vicmap_data):
+    """
+    Writes Vicmap records (e.g. `iter_csv_records` over the fortnightly extract) to a snapshot file that
+    `compare_datasets` accepts in place of the record list (open it with `ReferenceSnapshot`). Records are
+    reduced to one per propnum as the comparison does (the last one, at its first position), and get
+    propnum, SPI and PFI hash indexes. Returns the number of records written.
+    """
+    by_propnum = {p["propnum"]: p for p in vicmap_data}
+    return write_snapshot(path, by_propnum.values(), hash_fields=["propnum", "spi", "property_PFI"])
+
+
+def _props_by_propnum(data):
+    # {propnum: record}; over a snapshot, a view that probes its propnum index instead of building the dict.
+    if isinstance(data, ReferenceSnapshot):
+        return data.mapping("propnum")
+    return {p["propnum"]: p for p in data}
+
+
+def iter_changes(council_data, vicmap_data):
     """
     The core comparison engine. It compares the two datasets to identify
-    and categorize changes.
+    and categorize changes, yielding each change-report entry as soon as it is found
+    (e.g. into a `report_sinks` writer). Either dataset may be a `ReferenceSnapshot`
+    (see `write_vicmap_snapshot`), which is queried in place rather than loaded.
     """
-    print("INFO: Starting data comparison...")
-    change_report = []
+    with PROFILER.stage("compare.index") as stage:
+        # Create dictionaries for quick lookups using propnum as the key
+        council_props = _props_by_propnum(council_data)
+        vicmap_props = _props_by_propnum(vicmap_data)
+        stage.rows = len(council_props) + len(vicmap_props)
 
-    # Create dictionaries for quick lookups using propnum as the key
-    council_props = {p["propnum"]: p for p in council_data}
-    vicmap_props = {p["propnum"]: p for p in vicmap_data}
+        # Vicmap properties no longer in the council list, in Vicmap order
+        missing = [propnum for propnum in vicmap_props if propnum not in council_props]
+
+        # Subdivision parents and their new child lots, matched by plan number through hash indexes
+        children_by_parent, parents_by_child = _subdivision_links(
+            ((propnum, p.get("plan_number")) for propnum, p in council_props.items() if propnum not in vicmap_props),
+            ((propnum, vicmap_props[propnum].get("spi")) for propnum in missing),
+        )
 
     # --- Stage 1: Check for new properties and attribute updates ---
     # Iterate through the council data, as it is the source of truth.
@@ -86,84 +262,378 @@ def compare_datasets(council_data, vicmap_data):
 
         # Case 1: New Property (not found in Vicmap)
         if not vicmap_prop:
-            change_report.append({
-                "change_category": "New Property (Subdivision)",
-                "justification": f"New lot {council_prop.get('lot_number')} on plan {council_prop.get('plan_number')} not found in Vicmap.",
-                "council_propnum": propnum,
-                "vicmap_pfi": None,
-                "attribute_changed": "ALL",
-                "vicmap_old_value": None,
-                "council_new_value": council_prop.get('full_address'),
-                "proposed_edit_code": "E", # 'E' for 'Edit All' creates a new property and address
-                "review_status": "Pending",
-                "reviewer_notes": ""
-            })
+            yield _new_property_change(propnum, council_prop, parents_by_child.get(propnum, ()))
             continue
 
-        # Case 2: Matched property - compare attributes for changes
-        # Simple comparison for address. A real system would compare each component.
-        if council_prop["full_address"] != vicmap_prop["full_address"]:
-            change_report.append({
-                "change_category": "Address Update",
-                "justification": "Address details mismatch between Council and Vicmap.",
-                "council_propnum": propnum,
-                "vicmap_pfi": vicmap_prop.get('property_PFI'),
-                "attribute_changed": "full_address",
-                "vicmap_old_value": vicmap_prop.get('full_address'),
-                "council_new_value": council_prop.get('full_address'),
-                "proposed_edit_code": "S", # 'S' for 'Site/Address' update
-                "review_status": "Pending",
-                "reviewer_notes": ""
-            })
+        # Case 2: Matched property - compare the canonical address components for changes
+        # (.get: a snapshot leaves out the fields a record has no value for.)
+        changed = normalizer.changes(vicmap_prop.get("full_address"), council_prop["full_address"])
+        if changed:
+            yield _address_update_change(propnum, council_prop, vicmap_prop, changed)
 
     # --- Stage 2: Check for retired properties ---
     # Iterate through Vicmap data to find properties no longer in the council's active list.
-    for propnum, vicmap_prop in vicmap_props.items():
-        if propnum not in council_props:
-            # We assume a property missing from the council list is a candidate for retirement.
-            # Here we identify the parent parcel of our sample subdivision.
-            # TODO: The condition `vicmap_prop['spi'] == '1\\PS123456'` is specific to the sample data.
-            # In a real system, a more robust way to identify parent parcels would be needed.
-            # For example, by checking if the `spi` of the Vicmap property matches the `plan_number`
-            # of new child properties identified in Stage 1, or through a dedicated list of parent SPIs
-            # that have been subdivided.
-            is_parent_of_subdivision = vicmap_prop['spi'] == '1\\PS123456' 
-            
-            category = "Parent Parcel (Implicitly Retired)" if is_parent_of_subdivision else "Missing from Council Data"
-            justification = "Parent parcel of new subdivision. Retirement is handled by Vicmap upon child creation." if is_parent_of_subdivision else "Property in Vicmap not found in Council's active property list."
-            edit_code = "None" if is_parent_of_subdivision else "Flag for Review"
-
-            change_report.append({
-                "change_category": category,
-                "justification": justification,
-                "council_propnum": propnum, # In this case, it's the Vicmap propnum not found in council's active list
-                "vicmap_pfi": vicmap_prop.get('property_PFI'),
-                "attribute_changed": "status",
-                "vicmap_old_value": "Active in Vicmap",
-                "council_new_value": "Retired/Missing in Council DB",
-                "proposed_edit_code": edit_code,
-                "review_status": "Pending",
-                "reviewer_notes": "Manual investigation required to confirm if property should be retired." if edit_code == "Flag for Review" else ""
-            })
+    for propnum in missing:
+        yield _retirement_change(propnum, vicmap_props[propnum], children_by_parent.get(propnum, ()))
+
 
+def compare_datasets(council_data, vicmap_data):
+    """Runs `iter_changes` and returns the whole change report as a list."""
+    print("INFO: Starting data comparison...")
+    with PROFILER.stage("compare_datasets") as stage:
+        change_report = list(iter_changes(council_data, vicmap_data))
+        stage.rows = len(council_data) + len(vicmap_data)
     print(f"INFO: Comparison complete. Found {len(change_report)} changes.")
     return change_report
 
-def main():
+def _as_frame(data):
+    # Accepts a DataFrame, an Arrow table (anything with .to_pandas()) or an iterable of record dicts.
+    import pandas as pd
+    if isinstance(data, pd.DataFrame):
+        return data
+    if hasattr(data, "to_pandas"):
+        return data.to_pandas()
+    return pd.DataFrame.from_records(list(data))
+
+
+def _unique_by_propnum(df):
+    # Same result as building {p["propnum"]: p}: the last record per propnum, at its first position.
+    if not df["propnum"].duplicated().any():
+        return df.reset_index(drop=True)
+    order = df.drop_duplicates("propnum", keep="first")["propnum"]
+    last = df.drop_duplicates("propnum", keep="last").set_index("propnum", drop=False)
+    return last.loc[order].reset_index(drop=True)
+
+
+def _records_without_nan(df, columns):
+    # Row dicts over `columns` with NaN as None; built from column lists, which is much faster than to_dict().
+    values = [[None if isinstance(v, float) and v != v else v for v in df[col].tolist()] for col in columns]
+    return (dict(zip(columns, row)) for row in zip(*values))
+
+
+COUNCIL_COMPARE_COLUMNS = ["lot_number", "plan_number", "full_address"]
+VICMAP_COMPARE_COLUMNS = ["property_PFI", "spi", "full_address"]
+
+
+def compare_datasets_columnar(council_data, vicmap_data, as_frame=False):
     """
-    Main function to run the comparison process and print the structured output.
+    Columnar version of `compare_datasets` for full statewide extracts.
+
+    Both inputs (DataFrames, Arrow tables or lists of record dicts) are reduced to the compared
+    columns and outer-joined once on `propnum`. New properties, address updates and missing/retired
+    properties then fall out as boolean masks over the join. Only the changed rows are turned into
+    change-report entries, so the result matches `compare_datasets` entry for entry and in the same order.
+    Returns the change report as a list of dicts, or as a DataFrame when `as_frame` is True.
     """
-    # 1. Load data from sources
-    council_data = load_council_data()
-    vicmap_data = load_vicmap_data()
+    import pandas as pd
+    print("INFO: Starting columnar data comparison...")
+    with PROFILER.stage("compare.join") as stage:
+        council = _unique_by_propnum(_as_frame(council_data).reindex(columns=["propnum"] + COUNCIL_COMPARE_COLUMNS))
+        vicmap = _unique_by_propnum(_as_frame(vicmap_data).reindex(columns=["propnum"] + VICMAP_COMPARE_COLUMNS))
+        council["council_position"] = range(len(council))
+        vicmap["vicmap_position"] = range(len(vicmap))
+        stage.rows = len(council) + len(vicmap)
+
+        joined = council.merge(vicmap, on="propnum", how="outer", suffixes=("", "_vicmap"), indicator=True)
+        in_council = joined["_merge"] != "right_only"
+        in_vicmap = joined["_merge"] != "left_only"
+        address_differs = ~((joined["full_address"] == joined["full_address_vicmap"])
+                            | (joined["full_address"].isna() & joined["full_address_vicmap"].isna()))
+
+        # Stage 1 (council order): new properties and address updates. Stage 2 (Vicmap order): missing/retired.
+        stage_1 = joined[in_council & (~in_vicmap | address_differs)].sort_values("council_position")
+        stage_2 = joined[~in_council].sort_values("vicmap_position")
+        new_lots = stage_1[stage_1["_merge"] == "left_only"]
+        children_by_parent, parents_by_child = _subdivision_links(zip(new_lots["propnum"], new_lots["plan_number"]),
+                                                                  zip(stage_2["propnum"], stage_2["spi"]))
+
+    vicmap_columns = [col if col != "full_address" else "full_address_vicmap" for col in VICMAP_COMPARE_COLUMNS]
+    change_report = []
+    for row in _records_without_nan(stage_1, ["propnum", "_merge"] + COUNCIL_COMPARE_COLUMNS + vicmap_columns):
+        council_prop = {col: row[col] for col in COUNCIL_COMPARE_COLUMNS}
+        if row["_merge"] == "left_only":
+            change_report.append(_new_property_change(row["propnum"], council_prop,
+                                                      parents_by_child.get(row["propnum"], ())))
+        else:
+            # Raw strings differ; only differing components make it an update (case or spacing do not).
+            vicmap_prop = dict(zip(VICMAP_COMPARE_COLUMNS, (row[col] for col in vicmap_columns)))
+            changed = normalizer.changes(vicmap_prop["full_address"], council_prop["full_address"])
+            if changed:
+                change_report.append(_address_update_change(row["propnum"], council_prop, vicmap_prop, changed))
+    for row in _records_without_nan(stage_2, ["propnum"] + vicmap_columns):
+        vicmap_prop = dict(zip(VICMAP_COMPARE_COLUMNS, (row[col] for col in vicmap_columns)))
+        change_report.append(_retirement_change(row["propnum"], vicmap_prop, children_by_parent.get(row["propnum"], ())))
+
+    print(f"INFO: Comparison complete. Found {len(change_report)} changes.")
+    return pd.DataFrame(change_report, columns=CHANGE_REPORT_FIELDS) if as_frame else change_report
+
+
+def _last_per_propnum(records, source_name):
+    # Collapses runs of equal propnums to their last record (dict semantics) and checks the sort order.
+    previous = None
+    for record in records:
+        if previous is not None and record["propnum"] != previous["propnum"]:
+            if record["propnum"] < previous["propnum"]:
+                raise ValueError(f"{source_name} records are not sorted by propnum "
+                                 f"({record['propnum']!r} after {previous['propnum']!r})")
+            yield previous
+        previous = record
+    if previous is not None:
+        yield previous
+
+
+def iter_changes_sorted(council_records, vicmap_records):
+    """
+    Sort-merge comparison for extracts already sorted by `propnum` on disk (e.g. read row by row
+    with `iter_csv_records`). Walks both inputs once in step, holding one record from each, and yields
+    address updates as it goes. New and missing properties are held until the end, because a
+    subdivision parent can only be linked to child lots once every new lot's plan is known, so memory
+    grows with the number of those changes, not with extract size. Yields the same change-report entries
+    as `compare_datasets`: address updates in propnum order, then new and missing properties in propnum
+    order. Raises ValueError on unsorted input.
+    """
+    _end = object()
+    council_iter = _last_per_propnum(council_records, "Council")
+    vicmap_iter = _last_per_propnum(vicmap_records, "Vicmap")
+    new_lots, missing = [], []
+    council_prop, vicmap_prop = next(council_iter, _end), next(vicmap_iter, _end)
+    while council_prop is not _end or vicmap_prop is not _end:
+        if vicmap_prop is _end or (council_prop is not _end and council_prop["propnum"] < vicmap_prop["propnum"]):
+            new_lots.append(council_prop)
+            council_prop = next(council_iter, _end)
+        elif council_prop is _end or vicmap_prop["propnum"] < council_prop["propnum"]:
+            missing.append(vicmap_prop)
+            vicmap_prop = next(vicmap_iter, _end)
+        else:
+            changed = normalizer.changes(vicmap_prop["full_address"], council_prop["full_address"])
+            if changed:
+                yield _address_update_change(council_prop["propnum"], council_prop, vicmap_prop, changed)
+            council_prop, vicmap_prop = next(council_iter, _end), next(vicmap_iter, _end)
+
+    children_by_parent, parents_by_child = _subdivision_links(((p["propnum"], p.get("plan_number")) for p in new_lots),
+                                                              ((p["propnum"], p.get("spi")) for p in missing))
+    entries = [(p["propnum"], _new_property_change(p["propnum"], p, parents_by_child.get(p["propnum"], ())))
+               for p in new_lots]
+    entries += [(p["propnum"], _retirement_change(p["propnum"], p, children_by_parent.get(p["propnum"], ())))
+                for p in missing]
+    for _, entry in sorted(entries, key=lambda item: item[0]):
+        yield entry
+
+
+def iter_csv_records(path):
+    """Yields each row of an extract CSV as a dict, without loading the file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+class _StreamedRecords:
+    # Records read once from an iterator, counting them as they pass; len() is the count read so far.
+
+    def __init__(self, records):
+        self._records = records
+        self._count = 0
+
+    def __iter__(self):
+        for record in self._records:
+            self._count += 1
+            yield record
+
+    def __len__(self):
+        return self._count
+
+
+def _plan_key_array(values, from_spi=False):
+    # Columnar _plan_key (or _plan_of_spi when `from_spi`) with numpy's C string functions; '' when absent.
+    import numpy as np
+    text = values.fillna("").to_numpy(dtype=str)
+    if from_spi:
+        text = np.char.rpartition(text, "\\")[:, 2]
+    return np.char.strip(text)
+
+
+def record_hashes(frame, columns, plans):
+    """
+    64-bit hashes of a propnum-unique frame as uint64 arrays: one of each propnum, one of each record's
+    propnum together with its `columns` (the fields the comparison reads), and one of each record's
+    plan (`plans`, an array of canonical plan text; 0 when it has none) for linking subdivision parents and lots.
+    """
+    import numpy as np
+    import pandas as pd
+    key_hashes = pd.util.hash_array(frame["propnum"].to_numpy(dtype=object), categorize=False)
+    content = pd.util.hash_pandas_object(frame[columns], index=False, categorize=False).to_numpy()
+    plan_hashes = pd.util.hash_array(plans.astype(object), categorize=False)
+    plan_hashes[plans == ""] = 0
+    return key_hashes, (key_hashes * np.uint64(1000003)) ^ content, plan_hashes
+
+
+class SnapshotStore:
+    """
+    Compact binary snapshot (a NumPy .npz file) of the previous run's extracts: per source
+    ("council", "vicmap"), the propnum, record and plan hash of every property, 24 bytes each.
+
+    `compare_incremental` uses it to find the propnums whose records were added, changed or removed
+    since the previous extract. Hashes come from `pd.util.hash_pandas_object`, so a pandas upgrade
+    that changes its hashing makes one run treat every propnum as changed.
+    """
+
+    HASHES = ("keys", "records", "plans")
+
+    def __init__(self, path):
+        import numpy as np
+        self.path = path
+        self._arrays = {}
+        if os.path.exists(path):
+            with np.load(path) as snapshot:
+                self._arrays = {name: snapshot[name] for name in snapshot.files}
+
+    def hashes(self, source):
+        """(propnum, record, plan) hashes stored for `source`; empty arrays before the first run."""
+        import numpy as np
+        empty = np.array([], dtype="uint64")
+        return tuple(self._arrays.get(f"{source}_{name}", empty) for name in self.HASHES)
+
+    def changed_keys(self, source, key_hashes, record_hashes):
+        """Propnum hashes whose record was added, changed or removed relative to the stored snapshot."""
+        import numpy as np
+        import pandas as pd
+        previous_keys, previous_records, _ = self.hashes(source)
+        # A record hash covers the propnum too, so a record only on one side means its propnum changed.
+        # pandas' hash-table isin is far faster than np.isin's sort for random 64-bit values.
+        return pd.unique(np.concatenate([key_hashes[~pd.Series(record_hashes).isin(previous_records).to_numpy()],
+                                         previous_keys[~pd.Series(previous_records).isin(record_hashes).to_numpy()]]))
+
+    def save(self, hashes_by_source):
+        import numpy as np
+        for source, arrays in hashes_by_source.items():
+            for name, array in zip(self.HASHES, arrays):
+                self._arrays[f"{source}_{name}"] = array
+        with atomic_write(self.path) as f:
+            np.savez(f, **self._arrays)
+
+
+def _isin(values, candidates):
+    import pandas as pd
+    return pd.Series(values).isin(candidates).to_numpy()
+
+
+def compare_incremental(council_data, vicmap_data, store):
+    """
+    Incremental comparison for fortnightly extracts.
+
+    The fields each record contributes to the comparison are hashed (columnar, in C) and checked
+    against `store`, a SnapshotStore. Only propnums whose Council or Vicmap record was added, changed
+    or removed since the last run are passed to the comparison (`compare_datasets_columnar`, which
+    gives the same entries as `compare_datasets`), together with every propnum on the same plan, since
+    a new or removed lot changes its subdivision parent's entry. Comparison work follows the delta,
+    not the extract size. Returns (entries, hashes): the change-report entries for those propnums (the
+    first run against an empty store reports everything; entries for other propnums were reported by an
+    earlier run) and the hashes of the current extracts. Call `store.save(hashes)` once the entries
+    are safely written, so a failed report isn't lost from the next run's delta.
+    """
+    import numpy as np
+    import pandas as pd
+    council = _unique_by_propnum(_as_frame(council_data).reindex(columns=["propnum"] + COUNCIL_COMPARE_COLUMNS))
+    vicmap = _unique_by_propnum(_as_frame(vicmap_data).reindex(columns=["propnum"] + VICMAP_COMPARE_COLUMNS))
+    council_hashes = record_hashes(council, COUNCIL_COMPARE_COLUMNS, _plan_key_array(council["plan_number"]))
+    vicmap_hashes = record_hashes(vicmap, VICMAP_COMPARE_COLUMNS, _plan_key_array(vicmap["spi"], from_spi=True))
+    dirty = pd.unique(np.concatenate([store.changed_keys("council", *council_hashes[:2]),
+                                      store.changed_keys("vicmap", *vicmap_hashes[:2])]))
+
+    # Widen the delta to whole plans: the plans of changed propnums, before and after the change.
+    snapshots = [council_hashes, vicmap_hashes, store.hashes("council"), store.hashes("vicmap")]
+    dirty_plans = np.concatenate([plans[_isin(keys, dirty)] for keys, _, plans in snapshots])
+    dirty_plans = pd.unique(dirty_plans[dirty_plans != 0])
+    dirty = pd.unique(np.concatenate([dirty] + [keys[_isin(plans, dirty_plans)] for keys, _, plans in snapshots[:2]]))
+    total = len(pd.unique(np.concatenate([council_hashes[0], vicmap_hashes[0]])))
+    print(f"INFO: {len(dirty)} of {total} propnums changed since the last snapshot (or share a plan with one).")
+
+    delta_report = compare_datasets_columnar(council[_isin(council_hashes[0], dirty)],
+                                             vicmap[_isin(vicmap_hashes[0], dirty)])
+    return delta_report, {"council": council_hashes, "vicmap": vicmap_hashes}
+
+
+def main(argv=None, prog=None):
+    """
+    Main function to run the comparison process and stream the structured output.
+    """
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Compare Council property data with the Vicmap extract.")
+    parser.add_argument("--engine", choices=["dict", "columnar", "sort-merge"], default="dict",
+                        help="Comparison engine: dict (default), columnar join, or sort-merge over propnum-sorted input.")
+    parser.add_argument("--snapshot", metavar="PATH",
+                        help="Snapshot store for incremental runs: only propnums changed since the last run are compared.")
+    parser.add_argument("--format", choices=sorted(SINKS), default="json",
+                        help="Report format: json (default), ndjson, csv or parquet (needs pyarrow).")
+    parser.add_argument("--output", metavar="PATH", help="Write the report to PATH instead of stdout.")
+    parser.add_argument("--council", metavar="PATH", help="Read Council properties from this CSV extract instead of the sample data.")
+    vicmap_source = parser.add_mutually_exclusive_group()
+    vicmap_source.add_argument("--vicmap", metavar="PATH", help="Read Vicmap properties from this CSV extract instead of the sample data.")
+    vicmap_source.add_argument("--vicmap-snapshot", metavar="PATH",
+                               help="Read Vicmap from this snapshot file (reference_snapshot.py vicmap) instead of the sample data.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-stage timings and change counts per kind to stderr at the end.")
+    parser.add_argument("--trace", metavar="PATH", help="Write the per-stage timings as Chrome trace-event JSON to PATH.")
+    args = parser.parse_args(argv)
+    if args.format == "parquet" and not args.output:
+        parser.error("--format parquet needs --output")
+    if args.profile or args.trace:
+        PROFILER.enable()
+        CHANGE_RULES.reset_hits()
+
+    # 1. Load data from sources. The sort-merge engine reads CSV extracts row by row as it compares them,
+    # so they must already be sorted by propnum; every other engine loads them first.
+    streamed = args.engine == "sort-merge" and not args.snapshot
+
+    def read_extract(path, source_name):
+        if streamed:
+            print(f"INFO: Streaming {source_name} records from {path} (must be sorted by propnum).")
+            return _StreamedRecords(iter_csv_records(path))
+        records = list(iter_csv_records(path))
+        print(f"INFO: Read {len(records)} {source_name} records from {path}.")
+        return records
+
+    with PROFILER.stage("load") as stage:
+        council_data = read_extract(args.council, "Council") if args.council else load_council_data()
+        if args.vicmap_snapshot:
+            vicmap_data = ReferenceSnapshot(args.vicmap_snapshot)
+            print(f"INFO: Opened Vicmap snapshot {args.vicmap_snapshot} ({len(vicmap_data)} records).")
+        elif args.vicmap:
+            vicmap_data = read_extract(args.vicmap, "Vicmap")
+        else:
+            vicmap_data = load_vicmap_data()
+        stage.rows = len(council_data) + len(vicmap_data)
     
-    # 2. Compare datasets and generate the change report
-    change_report = compare_datasets(council_data, vicmap_data)
+    # 2. Compare datasets; the dict and sort-merge engines yield entries as they find them
+    if args.snapshot:
+        store = SnapshotStore(args.snapshot)
+        changes, snapshot_hashes = compare_incremental(council_data, vicmap_data, store)
+    elif args.engine == "columnar":
+        changes = compare_datasets_columnar(council_data, vicmap_data)
+    elif args.engine == "sort-merge":
+        # CSV extracts stream through unsorted here; the sample data and Vicmap snapshots are sorted in memory.
+        def by_propnum(records):
+            return records if isinstance(records, _StreamedRecords) else sorted(records, key=lambda p: p["propnum"])
+        changes = iter_changes_sorted(by_propnum(council_data), by_propnum(vicmap_data))
+    else:
+        print("INFO: Starting data comparison...")
+        changes = iter_changes(council_data, vicmap_data)
     
-    # 3. Output the report as a JSON object
-    # The 'indent=4' argument makes the JSON output human-readable.
-    print("\n--- CHANGE REPORT (JSON) ---")
-    print(json.dumps(change_report, indent=4))
+    # 3. Stream the report into the chosen sink, by default as indented JSON on stdout
+    if not args.output:
+        print(f"\n--- CHANGE REPORT ({args.format.upper()}) ---")
+    options = {"columns": CHANGE_REPORT_FIELDS} if args.format in ("csv", "parquet") else {}
+    # The streaming engines compare as the sink consumes, so this stage covers both.
+    with PROFILER.stage("compare_and_write") as stage, \
+            open_sink(args.format, args.output or sys.stdout, **options) as sink:
+        sink.write_many(changes)
+        stage.rows = len(council_data) + len(vicmap_data)
+    if args.snapshot:
+        store.save(snapshot_hashes) # Only once the report is written: a failed run keeps the previous snapshot.
+    if args.output:
+        print(f"INFO: Wrote {sink.records_written} changes to {args.output}.")
+    if PROFILER.enabled:
+        PROFILER.count("change_rules", CHANGE_RULES.hits)
+        PROFILER.finish(args.profile, args.trace)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+# instrumentation.py
+
+import json
+import os
+import sys
+import time
+
+
+class _Stage:
+    __slots__ = ("_profiler", "name", "rows", "_start")
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self.name = name
+        self.rows = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler._record(self.name, self._start, time.perf_counter(), self.rows)
+
+
+class _NullStage:
+    # Returned by `stage()` while profiling is off: entering and leaving it does nothing.
+    __slots__ = ("rows",)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+_NULL_STAGE = _NullStage()
+
+
+class StageProfiler:
+    """
+    Opt-in per-stage instrumentation: wall time, call count and rows processed for each named stage
+    of a run (CSV parsing, rates lookups, each rule family, report output, ...), plus counter groups
+    such as rule hits. Stages nest, and a stage's time includes the stages inside it.
+
+    While disabled (the default), `stage()` returns one shared do-nothing context manager, so an
+    instrumented stage costs a method call per chunk or per run, not per row. `--profile` and `--trace`
+    on the m1_validator and comparison_engine command lines turn it on.
+
+    Usage:
+        PROFILER.enable()
+        with PROFILER.stage("read_csv") as stage:
+            chunk = next(reader)
+            stage.rows = len(chunk)
+        print(PROFILER.summary())
+        PROFILER.write_trace("trace.json")   # Chrome trace-event JSON, e.g. for https://ui.perfetto.dev
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.stages = {}  # name -> [calls, seconds, rows]
+        self.counters = {}  # group -> {name: count}
+        self.events = []  # (name, start, end, rows)
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name):
+        """Context manager timing one call of stage `name`; set `.rows` on it to the rows it handled."""
+        return _Stage(self, name) if self.enabled else _NULL_STAGE
+
+    def _record(self, name, start, end, rows):
+        totals = self.stages.get(name)
+        if totals is None:
+            totals = self.stages[name] = [0, 0.0, 0]
+        totals[0] += 1
+        totals[1] += end - start
+        totals[2] += rows
+        self.events.append((name, start, end, rows))
+
+    def count(self, group, counts):
+        """Adds `counts` ({name: count}, e.g. `RuleEngine.hits`) to counter group `group`."""
+        if not self.enabled:
+            return
+        group_counts = self.counters.setdefault(group, {})
+        for name, value in counts.items():
+            group_counts[name] = group_counts.get(name, 0) + value
+
+    def report(self):
+        """The profile as a dict: wall time, per-stage totals and counters."""
+        stages = [{"name": name, "calls": calls, "seconds": seconds, "rows": rows,
+                   "rows_per_s": rows / seconds if rows and seconds else None}
+                  for name, (calls, seconds, rows) in self.stages.items()]
+        return {"wall_seconds": time.perf_counter() - self._origin, "stages": stages, "counters": self.counters}
+
+    def summary(self):
+        """Summary table of the stages, in first-call order, then the counter groups."""
+        report = self.report()
+        wall = report["wall_seconds"]
+        lines = [f"--- PROFILE ({wall:.2f}s wall) ---",
+                 f"{'stage':<28} {'calls':>7} {'seconds':>9} {'% wall':>7} {'rows':>10} {'rows/s':>12}"]
+        for stage in report["stages"]:
+            rows_per_s = f"{stage['rows_per_s']:,.0f}" if stage["rows_per_s"] else "-"
+            lines.append(f"{stage['name']:<28} {stage['calls']:>7} {stage['seconds']:>9.3f} "
+                         f"{100 * stage['seconds'] / wall if wall else 0:>6.1f}% {stage['rows']:>10} {rows_per_s:>12}")
+        for group, counts in report["counters"].items():
+            lines.append(f"{group}:")
+            # Dotted names ('retirement.inactive') are totalled per prefix ('retirement') first.
+            families = {}
+            for name, value in counts.items():
+                if "." in name:
+                    family = name.split(".", 1)[0]
+                    families[family] = families.get(family, 0) + value
+            for family, value in families.items():
+                lines.append(f"  {family:<40} {value:>10}")
+            for name, value in counts.items():
+                if value:
+                    lines.append(f"    {name:<38} {value:>10}" if "." in name else f"  {name:<40} {value:>10}")
+        return "\n".join(lines)
+
+    def trace(self):
+        """Chrome trace-event JSON object: one complete ('X') event per stage call, plus `report()`."""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "pid": pid, "tid": 0, "ts": (start - self._origin) * 1e6,
+                   "dur": (end - start) * 1e6, "args": {"rows": rows}}
+                  for name, start, end, rows in self.events]
+        return {"traceEvents": events, "displayTimeUnit": "ms", **self.report()}
+
+    def write_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.trace(), f)
+
+    def finish(self, profile=False, trace_path=None, stream=sys.stderr):
+        """End of a command-line run: prints the summary if `profile` and writes the trace to `trace_path`."""
+        if profile:
+            print(self.summary(), file=stream)
+        if trace_path:
+            self.write_trace(trace_path)
+            print(f"INFO: Wrote profile trace to {trace_path}", file=stream)
+
+
+# Process-wide profiler the pipeline stages report to.
+PROFILER = StageProfiler()
@@ -0,0 +1,62 @@
+# keyword_matcher.py
+
+from functools import lru_cache
+
+
+class KeywordMatcher:
+    """
+    Compiled multi-keyword matcher: one call classifies a text into every keyword category it hits.
+
+    The keyword lists are compiled once into a plan of distinct keywords, shortest first. Each keyword
+    is searched at most once per text, however many categories share it; keywords whose categories
+    are already hit are skipped, and a missing keyword rules out every keyword containing it (no "new"
+    means no "new lot") without searching. The result equals `any(kw in text for kw in keywords)` per category.
+    `scan` memoises results for the last `cache_size` texts, since the same Rates memo often recurs on
+    nearby M1 rows; memos can run to kilobytes, so the cache is kept small. `scan_distinct` scans each
+    distinct text of a batch once and keeps nothing afterwards.
+
+    A cold scan is still one substring search per distinct keyword, so it is no faster than the plain
+    per-category `any()` checks (slower on short memos, see `bench_keyword_matching`). The gain comes from
+    classifying each distinct text once and reusing the result for every row that repeats it.
+
+    A single combined regex was tried first, but CPython's `re` walks a long alternation far more slowly
+    than `str.__contains__` scans for a literal, so the plan keeps literal substring searches.
+
+    Usage:
+        matcher = KeywordMatcher({"retirement": ["retired", "consolidated"], "activity": ["retir"]})
+        matcher.scan("parcel retired in 2024")  # frozenset({"retirement", "activity"})
+        matcher.scan_distinct(memos)            # {memo: frozenset(...)} for each distinct memo
+    """
+
+    def __init__(self, categories, cache_size=1024):
+        self.categories = {name: tuple(keywords) for name, keywords in categories.items()}
+        keyword_categories = {}
+        for name, keywords in self.categories.items():
+            for kw in keywords:
+                keyword_categories.setdefault(kw, set()).add(name)
+        # Shortest keywords first: they hit most often and, when they miss, rule out longer ones.
+        self._plan = tuple(
+            (kw, frozenset(keyword_categories[kw]), tuple(o for o in keyword_categories if o != kw and o in kw))
+            for kw in sorted(keyword_categories, key=lambda kw: (len(kw), kw))
+        )
+        self.scan = lru_cache(maxsize=cache_size)(self._scan)
+
+    def scan_distinct(self, texts):
+        """Categories hit by each distinct text of `texts`, as a dict; bypasses the `scan` cache."""
+        return {text: self._scan(text) for text in set(texts)}
+
+    def _scan(self, text):
+        if not text:
+            return frozenset()
+        hits = set()
+        missing = set()
+        for kw, kw_categories, contained in self._plan:
+            if kw_categories <= hits:
+                continue  # Every category this keyword feeds is already decided.
+            if any(sub in missing for sub in contained):
+                missing.add(kw)
+            elif kw in text:
+                hits |= kw_categories
+            else:
+                missing.add(kw)
+        return frozenset(hits)
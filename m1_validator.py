@@ -1,8 +1,21 @@
 # m1_validator.py
 
-import pandas as pd
-import requests
-import io
+# pandas, numpy and requests are imported inside the functions that use them, so importing this module
+# (for RatesIndex, or to print --help) doesn't load them.
+import argparse
+import bisect
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+
+from address_normalizer import ADDRESS_COMPONENTS, ROAD_TYPES, UNIT_TYPES, AddressNormalizer
+from instrumentation import PROFILER
+from report_sinks import SINKS, CsvSink, atomic_write, open_sink
+from rule_engine import RuleEngine
 
 # --- Step 1: Define Sample Rates Data Structure (Modified for Testing) ---
 sample_rates_data = [
@@ -52,35 +65,322 @@ sample_rates_data = [
 ]
 
 # --- Step 2: Implement Simulated Rates Lookup Function ---
-def get_rates_data(propnum_csv, spi_csv, pfi_csv, current_sample_rates_data):
-    propnum_csv = str(propnum_csv).strip() if propnum_csv and str(propnum_csv).lower() != 'nan' else None
-    spi_csv = str(spi_csv).strip() if spi_csv and str(spi_csv).lower() != 'nan' else None
-    pfi_csv = str(pfi_csv).strip() if pfi_csv and str(pfi_csv).lower() != 'nan' else None
+def clean_identifier(value):
+    # Normalise an M1 identifier (propnum/SPI/PFI) the way the lookups expect: stripped text, None for blanks/NaN.
+    return str(value).strip() if value and str(value).lower() != 'nan' else None
+
+
+class PfiSuffixIndex:
+    """
+    Suffix index answering "which rates PFI ends with this M1 PFI" without a full scan.
+
+    Rates PFIs are stored reversed and sorted, so every PFI ending with the query forms one
+    contiguous run found by binary search. A min-segment-tree over each PFI's precedence rank
+    then picks the winner of that run, preserving the active-first, list-order precedence.
+    This handles prefixed PFIs (`PFI_RATES_171763`) and float-formatted ones (`130692255.0`)
+    with the same `str.endswith` semantics as before.
+    """
+
+    _MAX_CHAR = chr(0x10FFFF)
+
+    def __init__(self, ordered_records):
+        # `ordered_records` is already in lookup precedence order; the position is the rank.
+        entries = sorted(
+            (record["property_pfi"][::-1], rank)
+            for rank, record in enumerate(ordered_records)
+            if record.get("property_pfi")
+        )
+        self._records = ordered_records
+        self._keys = [key for key, _ in entries]
+        self._size = len(entries)
+        # Bottom-up segment tree: leaves at [size, 2 * size), internal node i = min(2i, 2i + 1).
+        self._tree = [0] * self._size + [rank for _, rank in entries]
+        for i in range(self._size - 1, 0, -1):
+            self._tree[i] = min(self._tree[2 * i], self._tree[2 * i + 1])
+
+    def _min_rank(self, lo, hi):
+        best = None
+        lo += self._size
+        hi += self._size
+        while lo < hi:
+            if lo & 1:
+                best = self._tree[lo] if best is None else min(best, self._tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = self._tree[hi] if best is None else min(best, self._tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def find(self, pfi):
+        reversed_pfi = pfi[::-1]
+        lo = bisect.bisect_left(self._keys, reversed_pfi)
+        hi = bisect.bisect_left(self._keys, reversed_pfi + self._MAX_CHAR, lo)
+        if lo == hi:
+            return None
+        return self._records[self._min_rank(lo, hi)]
+
+
+class RatesIndex:
+    """
+    Prebuilt lookup index over a list of rates records.
+
+    Records are grouped in hash maps keyed on propnum and SPI, plus a `PfiSuffixIndex`. Within each key the
+    active ('C') records are kept ahead of inactive ones, in their original list
+    order, so the first entry is exactly the record the linear scans used to pick.
+    Build it once per run and pass it to `get_rates_data` in place of the list.
+
+    A RatesIndex is also the in-memory rates source: `index_for` returns the index itself for every
+    M1 chunk (see `rates_sources.DbApiRatesSource` for the database-backed source).
+    """
+
+    def __init__(self, rates_records):
+        self.records = list(rates_records)
+        # Active records first, then inactive, each in original order (the lookup precedence).
+        ordered = [r for r in self.records if r.get("status") == "C"]
+        ordered += [r for r in self.records if r.get("status") != "C"]
+        self._by_propnum = self._build_key_map(ordered, "propnum")
+        self._by_spi = self._build_key_map(ordered, "spi")
+        self._by_pfi_suffix = PfiSuffixIndex(ordered)
+
+    @staticmethod
+    def _build_key_map(ordered_records, field):
+        key_map = {}
+        for record in ordered_records:
+            key = record.get(field)
+            if key is None:
+                continue
+            key_map.setdefault(key, []).append(record)
+        return key_map
+
+    def __len__(self):
+        return len(self.records)
+
+    def __reduce__(self):
+        # Pickle just the records (e.g. into pool workers); the maps are rebuilt on unpickling.
+        return (RatesIndex, (self.records,))
+
+    def index_for(self, m1_chunk):
+        return self
+
+    def by_propnum(self, propnum):
+        matches = self._by_propnum.get(propnum)
+        return matches[0] if matches else None
 
-    if propnum_csv:
-        for record in current_sample_rates_data:
-            if record.get("propnum") == propnum_csv and record.get("status") == "C":
+    def by_spi(self, spi):
+        matches = self._by_spi.get(spi)
+        return matches[0] if matches else None
+
+    def by_pfi(self, pfi):
+        # Basic PFI match: the rates PFI ends with the M1 PFI (rates PFIs may carry a prefix).
+        return self._by_pfi_suffix.find(pfi)
+
+    def lookup(self, propnum_csv, spi_csv, pfi_csv):
+        propnum_csv = clean_identifier(propnum_csv)
+        spi_csv = clean_identifier(spi_csv)
+        pfi_csv = clean_identifier(pfi_csv)
+
+        if propnum_csv:
+            record = self.by_propnum(propnum_csv)
+            if record:
                 return record
-        for record in current_sample_rates_data: # Check inactive if no current found
-            if record.get("propnum") == propnum_csv:
+        if spi_csv:
+            record = self.by_spi(spi_csv)
+            if record:
                 return record
-    if spi_csv:
-        for record in current_sample_rates_data:
-            if record.get("spi") == spi_csv and record.get("status") == "C":
+        if pfi_csv:
+            return self.by_pfi(pfi_csv)
+        return None
+
+
+def scan_rates_records(propnum_csv, spi_csv, pfi_csv, rates_records):
+    # The original lookup over a plain list: active-then-inactive scans for propnum, SPI, then PFI suffix.
+    for key, value in (("propnum", propnum_csv), ("spi", spi_csv)):
+        if not value:
+            continue
+        for record in rates_records:
+            if record.get(key) == value and record.get("status") == "C":
                 return record
-        for record in current_sample_rates_data: # Check inactive
-            if record.get("spi") == spi_csv:
+        for record in rates_records:
+            if record.get(key) == value:
                 return record
     if pfi_csv:
-        for record in current_sample_rates_data:
-            if record.get("property_pfi") and record.get("property_pfi").endswith(pfi_csv) and record.get("status") == "C": # Basic PFI match
+        for record in rates_records:
+            if (record.get("property_pfi") or "").endswith(pfi_csv) and record.get("status") == "C":
                 return record
-        for record in current_sample_rates_data: # Check inactive
-             if record.get("property_pfi") and record.get("property_pfi").endswith(pfi_csv):
+        for record in rates_records:
+            if (record.get("property_pfi") or "").endswith(pfi_csv):
                 return record
     return None
 
+
+def get_rates_data(propnum_csv, spi_csv, pfi_csv, current_sample_rates_data):
+    # Accepts a prebuilt RatesIndex (preferred) or a plain list of rates records. A list is scanned, since
+    # indexing it costs more than one scan; build a RatesIndex once for repeated lookups.
+    # Precedence: propnum, then SPI, then PFI; active ('C') records before inactive ones.
+    if isinstance(current_sample_rates_data, RatesIndex):
+        return current_sample_rates_data.lookup(propnum_csv, spi_csv, pfi_csv)
+    return scan_rates_records(clean_identifier(propnum_csv), clean_identifier(spi_csv), clean_identifier(pfi_csv),
+                              current_sample_rates_data)
+
 # --- Step 3: Implement Core Validation Logic Function ---
+# The validation rules as data, compiled once into RULES (a RuleEngine): edit-code families, the keyword
+# categories each memo and comment is scanned for, and the status template of every rule.
+EDIT_CODE_FAMILIES = {
+    # New Properties / Subdivisions / Additions (e.g. new assessment to existing parcel)
+    # 'A' is often "Add Address" or "Add Property" in Pozi M1.
+    # 'P' can be "Property Edit" - sometimes used for new propnums on existing parcels.
+    "new_entity": ['A', 'E', 'ECN', 'ENS', 'EAS', 'CRPROPADD', 'NEWPROP', 'ADDPROP', 'ADDADD', 'P'],
+    "address_change": ['S', 'SC', 'CAD', 'CHGADD', 'CHGPROP'],
+    "retirement": ['R', 'RCN', 'RET', 'RC', 'DELPROP', 'REMPROP', 'REMADD', 'DELADD'],
+    "no_change": ['NC', 'N', 'NOCHANGE'],
+    # C often means "Crefno change" - usually minor administrative update.
+    "crefno": ['C', 'CREFNO'],
+}
+# Edit codes outside every family fall to the catch-all rules.
+OTHER_FAMILY = "other"
+
+# Keyword categories for Rates memos and M1 comments. A compiled matcher classifies each distinct text
+# (one substring search per distinct keyword) and reuses the result for repeats of that text; the rule
+# handlers below read the category hits.
+MEMO_KEYWORDS = {
+    "new_entity": ["subdivision", "new lot", "child parcel", "severance", "split", "created", "new assessment"],
+    "address_change": ["address change", "road name change", "renumber", "address update", "site address modified"],
+    "old_address": ["old address"],
+    "retirement": ["consolidated", "retired", "parent parcel", "no longer active", "demolished"],
+    # Any of these means the memo records activity, which conflicts with a No Change edit.
+    "activity": ["change", "subdivision", "new", "update", "consolidat", "retir", "error", "correct"],
+}
+COMMENT_KEYWORDS = {
+    "new_entity": ["subdivision", "new lot", "child", "adding propnum", "new multi-assessment"],
+    "address_change": ["address change", "road name", "renumber", "assigning new address", "replacing address"],
+    "retirement": ["removing propnum", "retiring", "consolidation"],
+    "crefno": ["crefno", "council reference"],
+}
+
+# Status per rule. Fields: edit_code, plan (plan number or 'N/A'), memo and comments (the lower-cased
+# Rates memo and M1 comments, truncated by the '.50' format spec), propnum, spi, and for address
+# changes m1_address, rates_address and vicmap_val.
+STATUS_TEMPLATES = {
+    "not_found": "Needs Review: Property ({propnum}/{spi}) not found/active in Rates DB",
+
+    "new_entity.memo_confirms": "OK: New/Related entity ({edit_code}) aligns with Rates Memo (e.g., activity for plan {plan})",
+    "new_entity.memo_confirms_inactive": "Review: New/Related entity ({edit_code}) - Rates record is Inactive. Memo: {memo:.100}",
+    "new_entity.comments_confirm": "OK: New/Related entity ({edit_code}) aligns with M1 comments (e.g. activity for plan {plan}). Rates Memo does not explicitly confirm.",
+    "new_entity.unconfirmed": "Needs Review: New/Related entity ({edit_code}). Rates Memo ('{memo:.50}...') does not clearly confirm. M1 Comments: '{comments:.50}...'",
+
+    "address_change.reflected": "OK: Address change ({edit_code}) reflected in Rates (Address & Memo match: '{m1_address}').",
+    "address_change.old_address_in_memo": "OK: Address change ({edit_code}) from VM '{vicmap_val}' to CL '{m1_address}' supported by Rates Memo.",
+    "address_change.memo_supports": "OK: Address change ({edit_code}) supported by Rates Memo. Review M1 Addr:'{m1_address}' vs Rates Addr:'{rates_address}'.",
+    "address_change.comments_support": "OK: Address change ({edit_code}) aligns with M1 comments. Rates Memo ('{memo:.50}...') does not explicitly confirm.",
+    "address_change.unconfirmed": "Needs Review: Address change ({edit_code}). Memo ('{memo:.50}...') & M1 Comments ('{comments:.50}...') do not clearly confirm.",
+
+    "retirement.inactive_memo_confirms": "OK: Retirement ({edit_code}) aligns with Inactive status and Memo in Rates (Memo: '{memo:.50}...').",
+    "retirement.inactive": "OK: Retirement ({edit_code}) aligns with Inactive status in Rates. Memo ('{memo:.50}...') less specific on reason.",
+    "retirement.active_memo_suggests": "Review: Retirement ({edit_code}). Rates status is ACTIVE, but Memo ('{memo:.50}...') suggests retirement. Check status.",
+    "retirement.comments_support": "Review: Retirement ({edit_code}) per M1 comments. Rates status is ACTIVE. Memo ('{memo:.50}...') not confirming.",
+    "retirement.unconfirmed": "Needs Review: Retirement ({edit_code}). Rates status is ACTIVE. Memo ('{memo:.50}...') and M1 Comments ('{comments:.50}...') do not clearly confirm.",
+
+    "no_change.uneventful_memo": "OK: No Change ({edit_code}) aligns with uneventful Rates Memo.",
+    "no_change.no_memo": "OK: No Change ({edit_code}). No specific Memo in Rates.",
+    "no_change.memo_activity": "Review: No Change ({edit_code}), but Rates Memo ('{memo:.50}...') mentions some activity. Verify if related.",
+
+    "crefno.noted": "OK: Crefno update ({edit_code}) noted in M1 comments. Usually minor.",
+    "crefno.unclear": "Review: Crefno update ({edit_code}). M1 comments ('{comments:.50}...') unclear. Rates Memo: ('{memo:.50}...').",
+
+    "other.comment_in_memo": "OK: M1 Comment ('{comments:.50}...') may align with Rates Memo ('{memo:.50}...'). Edit Code: {edit_code}.",
+    "other.comment": "Review: Edit Code {edit_code}. M1 Comment ('{comments:.50}...'). Rates Memo ('{memo:.50}...') may differ or lack detail.",
+    "other.no_comment": "Needs General Review: Edit Code {edit_code}. No/brief M1 comments. Rates Memo: '{memo:.50}...'.",
+}
+normalizer = AddressNormalizer()
+
+
+def _comment_word_in_memo(m1_comments, rates_memo):
+    # Does any longer (>3 chars) M1 comment word appear in the memo? Each distinct word is checked once.
+    return any(word in rates_memo for word in {w for w in m1_comments.split() if len(w) > 3})
+
+
+# Rule handlers, one per edit-code family: each reads the row context built by validate_m1_row
+# and returns the name of the rule (STATUS_TEMPLATES key) that applies.
+def _new_entity_rule(row):
+    plan = row['plan_number'].lower()
+    if "new_entity" in row['memo_hits'] or (plan and plan in row['memo']):
+        return "new_entity.memo_confirms" if row['status'] == 'C' else "new_entity.memo_confirms_inactive"
+    if "new_entity" in row['comment_hits'] or (plan and plan in row['comments']):
+        return "new_entity.comments_confirm"
+    return "new_entity.unconfirmed"
+
+
+def _address_change_rule(row):
+    m1_row_data = row['m1']
+    # The M1 proposed address, from its canonical components (unit, house number, road, locality)
+    m1_address = normalizer.from_components(m1_row_data)
+    row['m1_address'] = str(m1_address).lower()
+
+    # If council_val is present and looks like a full address, prefer it.
+    council_val_addr = str(m1_row_data.get('council_val', '')).strip().lower()
+    if len(council_val_addr) > 10 and any(c.isalpha() for c in council_val_addr) and any(c.isdigit() for c in council_val_addr) : # Heuristic for a full address
+        m1_address = normalizer.parse(council_val_addr)
+        row['m1_address'] = council_val_addr
+
+    rates_address = str(row['rates_record'].get('address_full', '')).strip().lower()
+    row['rates_address'] = rates_address
+    row['vicmap_val'] = m1_row_data.get('vicmap_val', '')
+
+    if "address_change" in row['memo_hits']:
+        # Equal text is a match whatever the parser makes of it; otherwise compare canonical components.
+        same_text = bool(row['m1_address']) and " ".join(row['m1_address'].split()) == " ".join(rates_address.split())
+        if same_text or (m1_address and m1_address == normalizer.parse(rates_address)):
+            return "address_change.reflected"
+        if "old_address" in row['memo_hits'] and str(row['vicmap_val']).lower() in row['memo']:
+            return "address_change.old_address_in_memo"
+        return "address_change.memo_supports"
+    if "address_change" in row['comment_hits']:
+        return "address_change.comments_support"
+    return "address_change.unconfirmed"
+
+
+def _retirement_rule(row):
+    memo_supports_retirement = "retirement" in row['memo_hits']
+    if row['status'] == 'I': # Property is Inactive in Rates
+        return "retirement.inactive_memo_confirms" if memo_supports_retirement else "retirement.inactive"
+    if memo_supports_retirement: # Active in rates, but memo suggests retirement
+        return "retirement.active_memo_suggests"
+    if "retirement" in row['comment_hits']:
+        return "retirement.comments_support"
+    return "retirement.unconfirmed"
+
+
+def _no_change_rule(row):
+    # For NC, ideally memo shows no conflicting activity. No memo often means no recent activity.
+    if not row['memo']:
+        return "no_change.no_memo"
+    return "no_change.memo_activity" if "activity" in row['memo_hits'] else "no_change.uneventful_memo"
+
+
+def _crefno_rule(row):
+    return "crefno.noted" if "crefno" in row['comment_hits'] else "crefno.unclear"
+
+
+def _other_rule(row):
+    # Catch-all for other edit codes or less clear situations
+    m1_comments = row['comments']
+    if len(m1_comments) <= 3:
+        return "other.no_comment"
+    return "other.comment_in_memo" if _comment_word_in_memo(m1_comments, row['memo']) else "other.comment"
+
+
+RULE_HANDLERS = {"new_entity": _new_entity_rule, "address_change": _address_change_rule, "retirement": _retirement_rule,
+                 "no_change": _no_change_rule, "crefno": _crefno_rule, OTHER_FAMILY: _other_rule}
+RULES = RuleEngine(
+    EDIT_CODE_FAMILIES, STATUS_TEMPLATES, keywords={"memo": MEMO_KEYWORDS, "comments": COMMENT_KEYWORDS},
+    handlers=RULE_HANDLERS, default_family=OTHER_FAMILY,
+)
+memo_matcher = RULES.matchers["memo"]
+comment_matcher = RULES.matchers["comments"]
+
+
 def validate_m1_row(m1_row_data, rates_record):
     edit_code = str(m1_row_data.get('edit_code', '')).strip().upper()
     # Pozi CSV has column names with leading spaces. Access them accordingly.
@@ -91,193 +391,579 @@ def validate_m1_row(m1_row_data, rates_record):
     m1_propnum_val = str(m1_row_data.get('propnum','')).strip() # Used for logging/messages
 
     if not rates_record:
-        return f"Needs Review: Property ({m1_propnum_val}/{m1_row_data.get('spi','')}) not found/active in Rates DB"
+        return RULES.render("not_found", {'propnum': m1_propnum_val, 'spi': m1_row_data.get('spi', '')})
 
     rates_memo = str(rates_record.get('Memo', '')).strip().lower()
     rates_status = str(rates_record.get('status', '')).strip().upper()
-    
-    # New Properties / Subdivisions / Additions (e.g. new assessment to existing parcel)
-    # 'A' is often "Add Address" or "Add Property" in Pozi M1.
-    # 'P' can be "Property Edit" - sometimes used for new propnums on existing parcels.
-    if edit_code in ['A', 'E', 'ECN', 'ENS', 'EAS', 'CRPROPADD', 'NEWPROP', 'ADDPROP', 'ADDADD', 'P']: 
-        keywords_in_memo = ["subdivision", "new lot", "child parcel", "severance", "split", "created", "new assessment"]
-        memo_has_keywords = any(kw in rates_memo for kw in keywords_in_memo)
-        plan_in_memo = m1_plan_number and m1_plan_number.lower() in rates_memo
-        
-        keywords_in_m1_comments = ["subdivision", "new lot", "child", "adding propnum", "new multi-assessment"]
-        m1_comment_has_keywords = any(kw in m1_comments for kw in keywords_in_m1_comments)
-        plan_in_m1_comments = m1_plan_number and m1_plan_number.lower() in m1_comments
-
-        if memo_has_keywords or plan_in_memo:
-            if rates_status == 'C':
-                 return f"OK: New/Related entity ({edit_code}) aligns with Rates Memo (e.g., activity for plan {m1_plan_number or 'N/A'})"
-            else:
-                 return f"Review: New/Related entity ({edit_code}) - Rates record is Inactive. Memo: {rates_memo[:100]}"
-        elif m1_comment_has_keywords or plan_in_m1_comments:
-             return f"OK: New/Related entity ({edit_code}) aligns with M1 comments (e.g. activity for plan {m1_plan_number or 'N/A'}). Rates Memo does not explicitly confirm."
-        else:
-            return f"Needs Review: New/Related entity ({edit_code}). Rates Memo ('{rates_memo[:50]}...') does not clearly confirm. M1 Comments: '{m1_comments[:50]}...'"
+    row = {
+        'm1': m1_row_data, 'rates_record': rates_record, 'edit_code': edit_code,
+        'comments': m1_comments, 'plan_number': m1_plan_number, 'plan': m1_plan_number or 'N/A',
+        'memo': rates_memo, 'status': rates_status,
+        'memo_hits': memo_matcher.scan(rates_memo), 'comment_hits': comment_matcher.scan(m1_comments),
+    }
+    # One dict lookup picks the family's handler; the rule it returns is rendered from STATUS_TEMPLATES.
+    return RULES.evaluate(edit_code, row)
+
+
+# --- Step 4: Batch (Columnar) Validation ---
+RATES_JOIN_COLUMNS = ['Memo', 'status', 'address_full']
+# Families validate_m1_batch implements as column masks. Rows of any other family registered in RULES
+# (e.g. a council-specific one) go through its handler row by row.
+BATCH_FAMILIES = frozenset(["new_entity", "address_change", "retirement", "no_change", "crefno", OTHER_FAMILY])
+
+
+def _text_column(df, column):
+    # Column as the text `str(row.get(column, ''))` would give per row: missing column -> '', NaN -> 'nan'.
+    import pandas as pd
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].astype(str).fillna('nan').astype(object)
+
+
+def _category_masks(text, matcher):
+    # One matcher scan per distinct text in the chunk, then a boolean mask per keyword category.
+    import pandas as pd
+    hits = text.map(matcher.scan_distinct(text.unique()))
+    return {name: pd.Series([name in h for h in hits], index=text.index, dtype=bool) for name in matcher.categories}
+
+
+def _contains_per_row(needles, haystacks):
+    # Row-wise `needle in haystack` where the needle differs per row (e.g. the M1 plan number).
+    import pandas as pd
+    return pd.Series([n in h for n, h in zip(needles, haystacks)], index=needles.index, dtype=bool)
+
+
+def _m1_addresses(m1_df):
+    # Canonical proposed address per M1 row, as `normalizer.from_components(row)`; components repeat, so most are cache hits.
+    import pandas as pd
+    columns = [m1_df[c] if c in m1_df.columns else pd.Series(None, index=m1_df.index, dtype=object) for c in ADDRESS_COMPONENTS]
+    return pd.Series([normalizer.from_components(dict(zip(ADDRESS_COMPONENTS, values))) for values in zip(*columns)],
+                     index=m1_df.index, dtype=object)
+
+
+def iter_m1_identifiers(m1_df):
+    # Raw (propnum, spi, property_pfi) per M1 row, as main() used to read them with row.get().
+    import pandas as pd
+    pfi_column = 'property_pfi' if 'property_pfi' in m1_df.columns else 'property pfi'
+    empty = pd.Series([None] * len(m1_df), index=m1_df.index, dtype=object)
+    return zip(
+        m1_df['propnum'] if 'propnum' in m1_df.columns else empty,
+        m1_df['spi'] if 'spi' in m1_df.columns else empty,
+        m1_df[pfi_column] if pfi_column in m1_df.columns else empty,
+    )
+
+
+def join_rates_data(m1_df, rates_index):
+    """
+    Looks up the rates record for every M1 row and returns it as a frame aligned to `m1_df`.
+    Columns are `found` plus the text of each field in RATES_JOIN_COLUMNS ('' when absent).
+    """
+    import pandas as pd
+    with PROFILER.stage("rates_lookup") as stage:
+        stage.rows = len(m1_df)
+        records = [rates_index.lookup(propnum, spi, pfi) for propnum, spi, pfi in iter_m1_identifiers(m1_df)]
+    rates_df = pd.DataFrame({'found': [bool(record) for record in records]}, index=m1_df.index)
+    for field in RATES_JOIN_COLUMNS:
+        rates_df[field] = [str(record.get(field, '')) if record else '' for record in records]
+    return rates_df
+
+
+def _apply_rule(status, mask, rule, columns):
+    # Batch counterpart of RULES.render: fills the rule's status template for the masked rows.
+    count = int(mask.sum())
+    if count:
+        status[mask] = RULES.render_columns(rule, {field: columns[field][mask] for field in RULES.fields(rule)}, count)
+
+
+def validate_m1_batch(m1_df, rates_df):
+    """
+    Columnar equivalent of calling `validate_m1_row` on every row of `m1_df`.
+
+    `rates_df` is the output of `join_rates_data`. Text fields are normalised once per column, each
+    distinct memo and comment is classified once by the keyword matchers into boolean category masks,
+    each edit code is mapped to its RULES family once, and each rule fills its status template for its
+    rows by masked assignment. Rows of families outside BATCH_FAMILIES are validated by `validate_m1_row`.
+    Returns a Series of validation statuses aligned to `m1_df`.
+    """
+    import pandas as pd
+    with PROFILER.stage("normalise") as stage:
+        stage.rows = len(m1_df)
+        edit_code = _text_column(m1_df, 'edit_code').str.strip().str.upper()
+        m1_comments = _text_column(m1_df, 'comments').str.strip().str.lower()
+        m1_plan_number = _text_column(m1_df, 'plan_number').str.strip()
+        m1_propnum_val = _text_column(m1_df, 'propnum').str.strip()
+        rates_memo = rates_df['Memo'].astype(object).str.strip().str.lower()
+        rates_status = rates_df['status'].astype(object).str.strip().str.upper()
+        found = rates_df['found'].astype(bool)
+        families = edit_code.map(RULES.family)
+
+    status = pd.Series('', index=m1_df.index, dtype=object)
+    with PROFILER.stage("keyword_scan") as stage:
+        stage.rows = len(m1_df)
+        memo_hits = _category_masks(rates_memo.where(found, ''), memo_matcher)
+        comment_hits = _category_masks(m1_comments.where(found, ''), comment_matcher)
+    has_plan = m1_plan_number != ''
+    columns = {
+        'edit_code': edit_code, 'plan': m1_plan_number.where(has_plan, 'N/A'), 'propnum': m1_propnum_val,
+        'spi': _text_column(m1_df, 'spi'), 'memo': rates_memo, 'comments': m1_comments,
+    }
+
+    with PROFILER.stage("rules.not_found") as stage:
+        stage.rows = len(m1_df) - int(found.sum())
+        _apply_rule(status, ~found, "not_found", columns)
+
+    # New Properties / Subdivisions / Additions
+    with PROFILER.stage("rules.new_entity") as stage:
+        family = found & (families == "new_entity")
+        stage.rows = int(family.sum())
+        plan_lower = m1_plan_number.str.lower()
+        memo_confirms = memo_hits["new_entity"] | (has_plan & _contains_per_row(plan_lower, rates_memo))
+        comments_confirm = comment_hits["new_entity"] | (has_plan & _contains_per_row(plan_lower, m1_comments))
+        _apply_rule(status, family & memo_confirms & (rates_status == 'C'), "new_entity.memo_confirms", columns)
+        _apply_rule(status, family & memo_confirms & (rates_status != 'C'), "new_entity.memo_confirms_inactive", columns)
+        _apply_rule(status, family & ~memo_confirms & comments_confirm, "new_entity.comments_confirm", columns)
+        _apply_rule(status, family & ~memo_confirms & ~comments_confirm, "new_entity.unconfirmed", columns)
 
     # Address/Site Changes
-    elif edit_code in ['S', 'SC', 'CAD', 'CHGADD', 'CHGPROP']:
-        # Construct the M1 proposed address string more carefully
-        m1_addr_parts = []
-        if pd.notna(m1_row_data.get('blg_unit_id_1')): # Simplified unit handling
-            m1_addr_parts.append(str(m1_row_data.get('blg_unit_type','')).strip())
-            m1_addr_parts.append(str(m1_row_data.get('blg_unit_id_1','')).strip())
-        if pd.notna(m1_row_data.get('house_number_1')):
-            m1_addr_parts.append(str(m1_row_data.get('house_number_1','')).replace('.0','')) # remove .0 from float
-        if pd.notna(m1_row_data.get('house_suffix_1')):
-             m1_addr_parts.append(str(m1_row_data.get('house_suffix_1','')).strip())
-        m1_addr_parts.append(str(m1_row_data.get('road_name','')).strip())
-        m1_addr_parts.append(str(m1_row_data.get('road_type','')).strip())
-        m1_addr_parts.append(str(m1_row_data.get('locality_name','')).strip())
-        m1_new_address_val = ' '.join(filter(None, m1_addr_parts)).strip().lower().replace('  ',' ')
-        
-        # If council_val is present and looks like a full address, prefer it.
-        council_val_addr = str(m1_row_data.get('council_val', '')).strip().lower()
-        if len(council_val_addr) > 10 and any(c.isalpha() for c in council_val_addr) and any(c.isdigit() for c in council_val_addr) : # Heuristic for a full address
-            m1_new_address_val = council_val_addr
-
-
-        rates_address = str(rates_record.get('address_full', '')).strip().lower()
-        
-        change_keywords_in_memo = ["address change", "road name change", "renumber", "address update", "site address modified"]
-        memo_supports_change = any(kw in rates_memo for kw in change_keywords_in_memo)
-
-        change_keywords_in_m1_comments = ["address change", "road name", "renumber", "assigning new address", "replacing address"]
-        m1_comment_supports_change = any(kw in m1_comments for kw in change_keywords_in_m1_comments)
-
-        if memo_supports_change:
-            if m1_new_address_val and m1_new_address_val == rates_address:
-                return f"OK: Address change ({edit_code}) reflected in Rates (Address & Memo match: '{m1_new_address_val}')."
-            elif "old address" in rates_memo and str(m1_row_data.get('vicmap_val','')).lower() in rates_memo:
-                 return f"OK: Address change ({edit_code}) from VM '{m1_row_data.get('vicmap_val','')}' to CL '{m1_new_address_val}' supported by Rates Memo."
-            else:
-                 return f"OK: Address change ({edit_code}) supported by Rates Memo. Review M1 Addr:'{m1_new_address_val}' vs Rates Addr:'{rates_address}'."
-        elif m1_comment_supports_change:
-            return f"OK: Address change ({edit_code}) aligns with M1 comments. Rates Memo ('{rates_memo[:50]}...') does not explicitly confirm."
-        else:
-            return f"Needs Review: Address change ({edit_code}). Memo ('{rates_memo[:50]}...') & M1 Comments ('{m1_comments[:50]}...') do not clearly confirm."
+    with PROFILER.stage("rules.address_change") as stage:
+        family = found & (families == "address_change")
+        stage.rows = int(family.sum())
+        if family.any():
+            rows = m1_df[family]
+            m1_address = _m1_addresses(rows)
+            council_val_addr = _text_column(rows, 'council_val').str.strip().str.lower()
+            looks_like_address = ((council_val_addr.str.len() > 10) & council_val_addr.str.contains(r'[^\W\d_]')
+                                  & council_val_addr.str.contains(r'\d'))
+            m1_address = pd.Series([normalizer.parse(text) if use_text else address for address, text, use_text
+                                    in zip(m1_address, council_val_addr, looks_like_address)], index=rows.index, dtype=object)
+            m1_new_address_val = pd.Series([str(address).lower() for address in m1_address], index=rows.index, dtype=object)
+            columns['m1_address'] = m1_new_address_val.where(~looks_like_address, council_val_addr).reindex(m1_df.index, fill_value='')
+
+            rates_address = rates_df['address_full'].astype(object).str.strip().str.lower()
+            m1_text = columns['m1_address'][family]
+            address_matches = pd.Series([(bool(m1) and " ".join(m1.split()) == " ".join(text.split()))
+                                         or (bool(address) and address == normalizer.parse(text))
+                                         for address, m1, text in zip(m1_address, m1_text, rates_address[family])],
+                                        index=rows.index, dtype=bool)
+            address_matches = address_matches.reindex(m1_df.index, fill_value=False)
+            columns['rates_address'] = rates_address
+            columns['vicmap_val'] = vicmap_val = _text_column(m1_df, 'vicmap_val')
+            memo_supports = memo_hits["address_change"]
+            comments_support = comment_hits["address_change"]
+            old_address_in_memo = memo_hits["old_address"] & _contains_per_row(vicmap_val.str.lower(), rates_memo)
+
+            _apply_rule(status, family & memo_supports & address_matches, "address_change.reflected", columns)
+            _apply_rule(status, family & memo_supports & ~address_matches & old_address_in_memo,
+                        "address_change.old_address_in_memo", columns)
+            _apply_rule(status, family & memo_supports & ~address_matches & ~old_address_in_memo,
+                        "address_change.memo_supports", columns)
+            _apply_rule(status, family & ~memo_supports & comments_support, "address_change.comments_support", columns)
+            _apply_rule(status, family & ~memo_supports & ~comments_support, "address_change.unconfirmed", columns)
 
     # Retirements / Consolidations
-    elif edit_code in ['R', 'RCN', 'RET', 'RC', 'DELPROP', 'REMPROP', 'REMADD', 'DELADD']: 
-        retirement_keywords_in_memo = ["consolidated", "retired", "parent parcel", "no longer active", "demolished"]
-        memo_supports_retirement = any(kw in rates_memo for kw in retirement_keywords_in_memo)
-        
-        retirement_keywords_in_m1_comments = ["removing propnum", "retiring", "consolidation"]
-        m1_comment_supports_retirement = any(kw in m1_comments for kw in retirement_keywords_in_m1_comments)
-
-        if rates_status == 'I': # Property is Inactive in Rates
-            if memo_supports_retirement:
-                return f"OK: Retirement ({edit_code}) aligns with Inactive status and Memo in Rates (Memo: '{rates_memo[:50]}...')."
-            else: # Inactive, but memo doesn't confirm reason
-                return f"OK: Retirement ({edit_code}) aligns with Inactive status in Rates. Memo ('{rates_memo[:50]}...') less specific on reason."
-        elif memo_supports_retirement : # Active in rates, but memo suggests retirement
-             return f"Review: Retirement ({edit_code}). Rates status is ACTIVE, but Memo ('{rates_memo[:50]}...') suggests retirement. Check status."
-        elif m1_comment_supports_retirement:
-            return f"Review: Retirement ({edit_code}) per M1 comments. Rates status is ACTIVE. Memo ('{rates_memo[:50]}...') not confirming."
-        else:
-            return f"Needs Review: Retirement ({edit_code}). Rates status is ACTIVE. Memo ('{rates_memo[:50]}...') and M1 Comments ('{m1_comments[:50]}...') do not clearly confirm."
-            
-    elif edit_code in ['NC', 'N', 'NOCHANGE']:
-        # For NC, ideally memo shows no conflicting activity.
-        no_conflict_keywords = ["change", "subdivision", "new", "update", "consolidat", "retir", "error", "correct"]
-        if rates_memo and not any(kw in rates_memo for kw in no_conflict_keywords):
-            return f"OK: No Change ({edit_code}) aligns with uneventful Rates Memo."
-        elif not rates_memo: # No memo often means no recent activity.
-             return f"OK: No Change ({edit_code}). No specific Memo in Rates."
-        else: # Memo has activity, but M1 says NC
-            return f"Review: No Change ({edit_code}), but Rates Memo ('{rates_memo[:50]}...') mentions some activity. Verify if related."
-            
-    # Catch-all for other edit codes or less clear situations
-    # C often means "Crefno change" - usually minor administrative update.
-    elif edit_code in ['C', 'CREFNO']:
-        if "crefno" in m1_comments or "council reference" in m1_comments:
-            return f"OK: Crefno update ({edit_code}) noted in M1 comments. Usually minor."
-        else:
-            return f"Review: Crefno update ({edit_code}). M1 comments ('{m1_comments[:50]}...') unclear. Rates Memo: ('{rates_memo[:50]}...')."
-    else: 
-        if m1_comments and len(m1_comments) > 3 and any(mc_word in rates_memo for mc_word in m1_comments.split() if len(mc_word)>3) : 
-            return f"OK: M1 Comment ('{m1_comments[:50]}...') may align with Rates Memo ('{rates_memo[:50]}...'). Edit Code: {edit_code}."
-        elif m1_comments and len(m1_comments) > 3 :
-            return f"Review: Edit Code {edit_code}. M1 Comment ('{m1_comments[:50]}...'). Rates Memo ('{rates_memo[:50]}...') may differ or lack detail."
-        else: 
-            return f"Needs General Review: Edit Code {edit_code}. No/brief M1 comments. Rates Memo: '{rates_memo[:50]}...'."
+    with PROFILER.stage("rules.retirement") as stage:
+        family = found & (families == "retirement")
+        stage.rows = int(family.sum())
+        memo_supports = memo_hits["retirement"]
+        comments_support = comment_hits["retirement"]
+        inactive = rates_status == 'I'
+        _apply_rule(status, family & inactive & memo_supports, "retirement.inactive_memo_confirms", columns)
+        _apply_rule(status, family & inactive & ~memo_supports, "retirement.inactive", columns)
+        _apply_rule(status, family & ~inactive & memo_supports, "retirement.active_memo_suggests", columns)
+        _apply_rule(status, family & ~inactive & ~memo_supports & comments_support, "retirement.comments_support", columns)
+        _apply_rule(status, family & ~inactive & ~memo_supports & ~comments_support, "retirement.unconfirmed", columns)
+
+    # No Change
+    with PROFILER.stage("rules.no_change") as stage:
+        family = found & (families == "no_change")
+        stage.rows = int(family.sum())
+        has_memo = rates_memo != ''
+        memo_conflicts = memo_hits["activity"]
+        _apply_rule(status, family & has_memo & ~memo_conflicts, "no_change.uneventful_memo", columns)
+        _apply_rule(status, family & ~has_memo, "no_change.no_memo", columns)
+        _apply_rule(status, family & has_memo & memo_conflicts, "no_change.memo_activity", columns)
+
+    # Crefno updates
+    with PROFILER.stage("rules.crefno") as stage:
+        family = found & (families == "crefno")
+        stage.rows = int(family.sum())
+        comments_note_crefno = comment_hits["crefno"]
+        _apply_rule(status, family & comments_note_crefno, "crefno.noted", columns)
+        _apply_rule(status, family & ~comments_note_crefno, "crefno.unclear", columns)
+
+    # Catch-all for other edit codes
+    with PROFILER.stage(f"rules.{OTHER_FAMILY}") as stage:
+        family = found & (families == OTHER_FAMILY)
+        stage.rows = int(family.sum())
+        if family.any():
+            has_comments = m1_comments.str.len() > 3
+            comment_word_in_memo = pd.Series(
+                [_comment_word_in_memo(comments, memo) for comments, memo in zip(m1_comments, rates_memo)],
+                index=m1_df.index, dtype=bool)
+            _apply_rule(status, family & has_comments & comment_word_in_memo, "other.comment_in_memo", columns)
+            _apply_rule(status, family & has_comments & ~comment_word_in_memo, "other.comment", columns)
+            _apply_rule(status, family & ~has_comments, "other.no_comment", columns)
+
+    # Families without a columnar implementation, with the joined rates fields as their rates record
+    with PROFILER.stage("rules.per_row") as stage:
+        family = found & ~families.isin(BATCH_FAMILIES)
+        stage.rows = int(family.sum())
+        if family.any():
+            status[family] = [validate_m1_row(m1_row, rates_record) for m1_row, rates_record in
+                              zip(m1_df[family].to_dict('records'), rates_df.loc[family, RATES_JOIN_COLUMNS].to_dict('records'))]
+
+    return status
+
+
+# --- Step 5: Streaming Chunked Validation ---
+DEFAULT_CHUNKSIZE = 50000
+# Identifier columns the rates lookups key on. Rates keys carry the '171763.0' text that a float read of
+# these (usually partly blank) columns produces, so whole-number identifiers are written that way.
+M1_KEY_COLUMNS = ['propnum', 'property_pfi', 'property pfi']
+_WHOLE_NUMBER = r'^\d+$'
+
+
+def iter_m1_chunks(source, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Yields the M1 CSV at `source` (a local path or a file-like object) as DataFrames of at most
+    `chunksize` rows. Header whitespace is stripped once. Every column is read as text, so values are
+    written back as they appear in the export whatever the chunk size, except that whole-number
+    identifiers in `M1_KEY_COLUMNS` get the '.0' form the rates keys use.
+    """
+    import pandas as pd
+    columns = None
+    reader = pd.read_csv(source, chunksize=chunksize, encoding='utf-8-sig', dtype=str)
+    while True:
+        with PROFILER.stage("read_csv") as stage:
+            chunk = next(reader, None)
+            stage.rows = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            return
+        if columns is None:
+            columns = [col.strip() for col in chunk.columns]
+        chunk.columns = columns
+        for col in M1_KEY_COLUMNS:
+            if col in chunk.columns:
+                chunk[col] = chunk[col].str.strip().str.replace(_WHOLE_NUMBER, r'\g<0>.0', regex=True)
+        yield chunk
+
+
+def validate_m1_csv(source, output, rates_source, chunksize=DEFAULT_CHUNKSIZE, workers=1, cache=None):
+    """
+    Streams the M1 CSV at `source` through batch validation and writes each validated chunk to
+    `output`, so peak memory depends on `chunksize` rather than the size of the M1 export.
+    `output` is a CSV path or a `report_sinks` sink (e.g. `NdjsonSink`), which is closed at the end.
+    `rates_source` is a `RatesIndex` or any object whose `index_for(m1_chunk)` returns one (such as
+    `rates_sources.DbApiRatesSource`). With `workers` > 1 the chunks are validated in a process pool
+    (see `iter_validated_parallel`). With a `ValidationCache` as `cache`, rows whose validation inputs
+    are unchanged since the cached run reuse their status (see `iter_validated_cached`), and the cache
+    is saved at the end. Returns the number of rows written.
+    """
+    chunks = iter_m1_chunks(source, chunksize)
+    if cache is not None:
+        validated = iter_validated_cached(chunks, rates_source, cache, workers)
+    elif workers > 1:
+        validated = iter_validated_parallel(chunks, rates_source, workers)
+    else:
+        validated = (_validate_chunk(chunk, rates_source) for chunk in chunks)
+
+    with (CsvSink(output) if isinstance(output, str) else output) as sink:
+        for chunk_number, chunk in enumerate(validated, start=1):
+            with PROFILER.stage("write_output") as stage:
+                stage.rows = len(chunk)
+                sink.write_frame(chunk)
+            print(f"Processed chunk {chunk_number} ({len(chunk)} rows), {sink.records_written} records so far...")
+    if cache is not None:
+        with PROFILER.stage("cache_save"):
+            cache.save()
+        PROFILER.count("validation_cache", {"hits": cache.hits, "misses": cache.misses})
+        print(f"Reused {cache.hits} cached statuses, validated {cache.misses} changed or new rows.")
+    return sink.records_written
+
+
+def _with_status(chunk, statuses):
+    chunk['validation_status'] = list(statuses)
+    return chunk
+
+
+def _validate_chunk(chunk, rates_source):
+    with PROFILER.stage("rates_index") as stage:
+        stage.rows = len(chunk)
+        rates_index = rates_source.index_for(chunk)
+    return _with_status(chunk, validate_m1_batch(chunk, join_rates_data(chunk, rates_index)))
+
+
+# --- Step 6: Parallel Validation ---
+_worker_rates_source = None
+
+
+def _init_rates_worker(rates_source):
+    # Pool initializer: each worker receives the rates source once, instead of it being pickled into every task.
+    global _worker_rates_source
+    _worker_rates_source = rates_source
+
+
+def _validate_in_worker(m1_part):
+    rates_index = _worker_rates_source.index_for(m1_part)
+    return validate_m1_batch(m1_part, join_rates_data(m1_part, rates_index)).tolist()
+
+
+def iter_validated_parallel(chunks, rates_source, workers, parts_per_worker=2):
+    """
+    Validates M1 `chunks` across a pool of `workers` processes and yields them back in original row
+    order with a `validation_status` column. Each chunk is split into `workers` parts; at most
+    `workers * parts_per_worker` parts are in flight, so memory stays bounded while streaming.
+    The rates source is sent once per worker through the pool initializer, not once per task; a
+    `RatesIndex` pickles only its records and each worker rebuilds the index.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_rates_worker,
+                                                initargs=(rates_source,)) as pool:
+        pending = collections.deque()
+        for chunk in chunks:
+            if not len(chunk):
+                pending.append((chunk, None)) # Nothing to validate; passed through in order.
+            part_rows = max(1, -(-len(chunk) // workers))
+            for start in range(0, len(chunk), part_rows):
+                part = chunk.iloc[start:start + part_rows].copy()
+                pending.append((part, pool.submit(_validate_in_worker, part)))
+                if len(pending) >= workers * parts_per_worker:
+                    part, future = pending.popleft()
+                    yield _with_status(part, future.result() if future else [])
+            while pending and pending[0][1] is None:
+                yield _with_status(pending.popleft()[0], [])
+        while pending:
+            part, future = pending.popleft()
+            yield _with_status(part, future.result() if future else [])
+
+
+# --- Step 7: Validation Result Cache ---
+# Everything a validation status depends on: the M1 fields validate_m1_row reads (PFIs only matter through the
+# lookup) and the matched rates record.
+M1_VALIDATION_FIELDS = (['edit_code', 'comments', 'plan_number', 'propnum', 'spi', 'council_val', 'vicmap_val']
+                        + list(ADDRESS_COMPONENTS))
+# Bump when the rule handlers change. Edits to the rule tables and the address abbreviations change
+# VALIDATION_RULES_VERSION by themselves.
+VALIDATION_RULES_EPOCH = "2"
+# Statuses cached under another version are discarded.
+VALIDATION_RULES_VERSION = hashlib.sha256(json.dumps(
+    [VALIDATION_RULES_EPOCH, EDIT_CODE_FAMILIES, MEMO_KEYWORDS, COMMENT_KEYWORDS, STATUS_TEMPLATES, ROAD_TYPES, UNIT_TYPES],
+    sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def validation_keys(m1_df, rates_df):
+    """
+    64-bit hash per M1 row of its validation inputs: the M1_VALIDATION_FIELDS of `m1_df` plus `found`,
+    Memo, status and address of its rates record from `rates_df` (the output of `join_rates_data`).
+    Rows with equal keys get equal statuses.
+    """
+    import pandas as pd
+    inputs = m1_df.reindex(columns=M1_VALIDATION_FIELDS)
+    for column in ['found'] + RATES_JOIN_COLUMNS:
+        inputs['rates_' + column] = rates_df[column]
+    return pd.util.hash_pandas_object(inputs, index=False, categorize=False).to_numpy()
+
+
+class ValidationCache:
+    """
+    Persistent cache of validation statuses between runs (a NumPy .npz file), keyed by `validation_keys`.
+
+    Re-running the validator on a nearly identical M1 export then only validates rows whose own fields or
+    rates record (Memo, status, address) changed; every other row reuses its cached status. Rates lookups
+    still run for every row, since the rates record is part of the key. After `save()` the file holds the
+    statuses of the rows seen in this run. A file written under another VALIDATION_RULES_VERSION is ignored.
+    """
+
+    def __init__(self, path, version=VALIDATION_RULES_VERSION):
+        import numpy as np
+        import pandas as pd
+        self.path = path
+        self.version = version
+        keys, statuses = np.array([], dtype='uint64'), np.array([], dtype=object)
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                if str(cached['version']) == version:
+                    keys = cached['keys']
+                    statuses = cached['statuses'].astype(object)[cached['status_ids']]
+        self._index = pd.Index(keys)
+        self._statuses = statuses
+        self._seen = []
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, keys):
+        """Returns (statuses, found): the cached status per key (None if absent) and a mask of cache hits."""
+        import numpy as np
+        positions = self._index.get_indexer(keys)
+        found = positions >= 0
+        statuses = np.full(len(keys), None, dtype=object)
+        statuses[found] = self._statuses[positions[found]]
+        self.hits += int(found.sum())
+        self.misses += int((~found).sum())
+        return statuses, found
+
+    def put(self, keys, statuses):
+        self._seen.append((keys, statuses))
+
+    def save(self):
+        import numpy as np
+        import pandas as pd
+        keys = np.concatenate([k for k, _ in self._seen]) if self._seen else np.array([], dtype='uint64')
+        statuses = np.concatenate([s for _, s in self._seen]) if self._seen else np.array([], dtype=object)
+        unique = ~pd.Index(keys).duplicated(keep='last')
+        status_ids, distinct = pd.factorize(statuses[unique])
+        with atomic_write(self.path) as f:
+            np.savez(f, version=np.array(self.version), keys=keys[unique],
+                     status_ids=status_ids.astype('uint32'), statuses=np.array(distinct, dtype=str))
+
+
+def iter_validated_cached(chunks, rates_source, cache, workers=1):
+    """
+    Yields M1 `chunks` with a `validation_status` column, taking statuses from `cache` (a ValidationCache)
+    where the row's validation inputs are unchanged and validating only the other rows, serially or in a
+    process pool of `workers`. Every status is recorded in the cache; call `cache.save()` afterwards.
+    """
+    import numpy as np
+    pending = collections.deque()
+
+    def uncached_rows():
+        for chunk in chunks:
+            with PROFILER.stage("rates_index") as stage:
+                stage.rows = len(chunk)
+                rates_index = rates_source.index_for(chunk)
+            rates_df = join_rates_data(chunk, rates_index)
+            with PROFILER.stage("cache_lookup") as stage:
+                stage.rows = len(chunk)
+                keys = validation_keys(chunk, rates_df)
+                statuses, found = cache.get(keys)
+            pending.append({'chunk': chunk, 'keys': keys, 'statuses': statuses, 'found': found,
+                            'parts': [], 'remaining': int((~found).sum())})
+            yield chunk[~found], rates_df[~found]
+
+    # Fully cached chunks come through as empty parts, so they are yielded as soon as they are read.
+    if workers > 1:
+        validated_parts = iter_validated_parallel((rows for rows, _ in uncached_rows()), rates_source, workers)
+    else:
+        validated_parts = (_with_status(rows, validate_m1_batch(rows, rates_df) if len(rows) else [])
+                           for rows, rates_df in uncached_rows())
+
+    def completed():
+        # Chunks leave in order once all their uncached rows are back (at once, if none needed validating).
+        while pending and pending[0]['remaining'] == 0:
+            entry = pending.popleft()
+            statuses = entry['statuses']
+            if entry['parts']:
+                statuses[~entry['found']] = np.concatenate(entry['parts'])
+            cache.put(entry['keys'], statuses)
+            yield _with_status(entry['chunk'], statuses)
+
+    for part in validated_parts:
+        yield from completed()
+        if len(part):
+            pending[0]['parts'].append(part['validation_status'].to_numpy(dtype=object))
+            pending[0]['remaining'] -= len(part)
+            yield from completed()
+    yield from completed()
 
 
 # --- Main Script Logic ---
-def main():
+SAMPLE_M1_URL = "https://raw.githubusercontent.com/Maz2580/M1_comparision/main/M1_Shepparton_2025-04-29_Pozi-Connect-2-10-0.csv"
+
+
+def _is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def default_output_path(source, output_format):
+    """Output path for the M1 CSV at `source`: '<name>_validated.<format>' beside a local file."""
+    if source == SAMPLE_M1_URL:
+        return f"M1_Shepparton_validated.{output_format}"
+    if _is_url(source):
+        return os.path.splitext(os.path.basename(source.split("?", 1)[0]))[0] + f"_validated.{output_format}"
+    return os.path.splitext(source)[0] + f"_validated.{output_format}"
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Validate an M1 CSV against the rates database.")
+    parser.add_argument("input", nargs="?", default=SAMPLE_M1_URL,
+                        help="M1 CSV to validate: a local path, or an http(s) URL to stream "
+                             "(default: the Shepparton sample export on GitHub).")
+    parser.add_argument("-o", "--output", metavar="PATH",
+                        help="Validated output file (default: <input name>_validated.<format> beside a local input).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1, serial).")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="M1 rows read per chunk.")
+    parser.add_argument("--rates-sqlite", metavar="PATH",
+                        help="Read rates from the 'rates' table of this SQLite file instead of sample_rates_data.")
+    parser.add_argument("--rates-snapshot", metavar="PATH",
+                        help="Read rates from this snapshot file (reference_snapshot.py rates) instead of sample_rates_data.")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="Validation cache file: rows unchanged since the last run reuse their cached status.")
+    parser.add_argument("--format", choices=sorted(SINKS), default="csv",
+                        help="Output format: csv (default), json, ndjson or parquet (needs pyarrow).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-stage timings and rule hit counts to stderr at the end "
+                             "(stages run inside --workers processes are not timed).")
+    parser.add_argument("--trace", metavar="PATH", help="Write the per-stage timings as Chrome trace-event JSON to PATH.")
+    args = parser.parse_args(argv)
+    if not _is_url(args.input) and not os.path.exists(args.input):
+        parser.error(f"M1 CSV {args.input} does not exist")
+    if args.profile or args.trace:
+        PROFILER.enable()
+        RULES.reset_hits()
+
     print("Starting M1 Validation Process...")
 
-    csv_url = "https://raw.githubusercontent.com/Maz2580/M1_comparision/main/M1_Shepparton_2025-04-29_Pozi-Connect-2-10-0.csv"
-    output_filename = "M1_Shepparton_validated.csv"
-    
+    output_filename = args.output or default_output_path(args.input, args.format)
+
+    if args.rates_sqlite:
+        from rates_sources import DbApiRatesSource
+        rates_source = DbApiRatesSource(functools.partial(sqlite3.connect, args.rates_sqlite), order_by="rowid")
+        print(f"Looking up rates per chunk from SQLite database {args.rates_sqlite}.")
+    elif args.rates_snapshot:
+        from rates_sources import RatesSnapshot
+        rates_source = RatesSnapshot(args.rates_snapshot)
+        print(f"Opened rates snapshot {args.rates_snapshot} ({len(rates_source)} records).")
+    else:
+        rates_source = RatesIndex(sample_rates_data)
+        print(f"Built rates lookup index over {len(rates_source)} records.")
+
+    def validate(m1_csv):
+        print("Processing M1 records for validation...")
+        return validate_m1_csv(m1_csv, open_sink(args.format, output_filename), rates_source,
+                               chunksize=args.chunksize, workers=args.workers,
+                               cache=ValidationCache(args.cache) if args.cache else None)
+
+    import pandas as pd # Needed from here on; imported late so --help and argument errors return quickly.
     try:
-        print(f"Downloading M1 CSV from {csv_url}...")
-        response = requests.get(csv_url)
-        response.raise_for_status() 
-        csv_content = response.content.decode('utf-8-sig') # Use utf-8-sig to handle potential BOM
-        m1_df = pd.read_csv(io.StringIO(csv_content))
-        print(f"Successfully loaded M1 CSV into DataFrame. Shape: {m1_df.shape}")
-        # Standardize column names by stripping leading/trailing spaces
-        m1_df.columns = [col.strip() for col in m1_df.columns]
-        print("Standardized DataFrame column names.")
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading M1 CSV: {e}")
-        return
+        if _is_url(args.input):
+            import requests # Only streaming a URL needs it; local inputs never touch the network.
+            print(f"Streaming M1 CSV from {args.input}...")
+            try:
+                with requests.get(args.input, stream=True) as response:
+                    response.raise_for_status()
+                    response.raw.decode_content = True # Let urllib3 undo any gzip transfer encoding
+                    rows_done = validate(response.raw)
+            except requests.exceptions.RequestException as e:
+                print(f"Error downloading M1 CSV: {e}")
+                return 1
+        else:
+            print(f"Reading M1 CSV from {args.input}...")
+            rows_done = validate(args.input)
     except pd.errors.EmptyDataError:
-        print("Error: The downloaded CSV file is empty.")
-        return
+        print("Error: The M1 CSV file is empty.")
+        return 1
     except Exception as e:
-        print(f"An error occurred while loading M1 CSV: {e}")
-        return
-
-    validation_statuses = []
-    print("Processing M1 records for validation...")
-    
-    for index, row in m1_df.iterrows():
-        propnum_csv = row.get('propnum')
-        spi_csv = row.get('spi')
-        # property_pfi might not exist or have a different name, ensure to check actual column name
-        pfi_csv = row.get('property_pfi', row.get('property pfi')) # Trying common variations
-
-        rates_record = get_rates_data(propnum_csv, spi_csv, pfi_csv, sample_rates_data)
-        status = validate_m1_row(row, rates_record) # Pass the original row with potentially spaced column names
-        validation_statuses.append(status)
-        
-        current_propnum_str = str(row.get('propnum')).strip()
-        # current_edit_code_str = str(row.get('edit_code')).strip().upper() # Moved this inside the if
-
-        # Temporary print for debugging rows with propnum 170045.0
-        # if current_propnum_str == "170045.0": # Condition removed for broader debug
-        #     current_edit_code_str = str(row.get('edit_code')).strip().upper()
-        #     print(f"DEBUG_PROPNUM_170045_FOUND @ index {index}:")
-        #     print(f"  M1_propnum_val: '{row.get('propnum')}' (type: {type(row.get('propnum'))})")
-        #     print(f"  M1_spi_val: '{row.get('spi')}' (type: {type(row.get('spi'))})")
-        #     print(f"  M1_edit_code_val: '{row.get('edit_code')}' (Processed as: '{current_edit_code_str}')")
-        #     print(f"  Rates Record Found for this row: {'Yes' if rates_record else 'No'}")
-        #     if rates_record:
-        #         print(f"  Rates Record propnum: {rates_record.get('propnum')}, spi: {rates_record.get('spi')}, Memo: {rates_record.get('Memo')}")
-        #     print(f"  Generated Status for this row: {status}")
-
-        # if index < 5 or index == 362: # Print for first 5 rows and specific index
-        #      print(f"DEBUG_ROW_DATA @ index {index}: propnum_raw='{row.get('propnum')}', propnum_str_stripped='{str(row.get('propnum')).strip()}', edit_code='{row.get('edit_code')}'")
-
-        # Removed specific debug prints for this run
-
-        if (index + 1) % 100 == 0 or (index + 1) == len(m1_df): 
-            print(f"Processed {index + 1}/{len(m1_df)} records...")
-
-    m1_df['validation_status'] = validation_statuses
-    print(f"\nValidation complete. Added 'validation_status' column.")
+        print(f"An error occurred while validating M1 CSV: {e}")
+        return 1
+
+    print(f"\nValidation complete. Added 'validation_status' column to {rows_done} records.")
+    print(f"Successfully saved validated data to {output_filename}")
+    if PROFILER.enabled:
+        PROFILER.count("rules", RULES.hits)
+        PROFILER.finish(args.profile, args.trace)
+    return 0
 
-    try:
-        m1_df.to_csv(output_filename, index=False)
-        print(f"Successfully saved validated data to {output_filename}")
-    except Exception as e:
-        print(f"Error saving validated CSV: {e}")
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,247 @@
+# rates_sources.py
+
+import contextlib
+import queue
+import threading
+
+from m1_validator import RatesIndex, clean_identifier, iter_m1_identifiers
+from reference_snapshot import ReferenceSnapshot, write_snapshot
+
+# Rates record fields `validate_m1_row` and the lookups read, in SELECT order.
+RATES_FIELDS = ["propnum", "spi", "property_pfi", "address_full", "lot_number", "plan_number", "status", "Memo"]
+ORDER_FIELD = "_rates_order"
+
+
+class ConnectionPool:
+    """
+    Minimal DB-API connection pool. Connections are created lazily by `connect()` (e.g.
+    `functools.partial(pyodbc.connect, conn_str)`), at most `size` at once, and reused across
+    M1 chunks instead of reconnecting to the rates server for every lookup.
+    """
+
+    def __init__(self, connect, size=4):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            except Exception:
+                conn.close() # Don't hand a connection in an unknown state to the next caller.
+                raise
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class DbApiRatesSource:
+    """
+    Rates source backed by a DB-API database (SQL Server via pyodbc in production, SQLite locally).
+
+    `index_for(m1_chunk)` collects every propnum, SPI and PFI in the chunk and fetches the matching rates
+    rows with set-based queries: one `propnum IN (...) OR spi IN (...)` query, then one query of
+    `property_pfi LIKE '%<pfi>'` terms for the rows still unmatched. Each query is split into batches of
+    `batch_size` parameters. It returns a `RatesIndex` over just those rows, so the usual lookup
+    precedence applies and round-trips grow with the number of chunks, not rows.
+
+    `columns` maps rates fields (RATES_FIELDS) to SQL expressions when the table's column names differ.
+    The expressions should yield text in the M1 export's format, e.g. '171763.0' for propnum.
+    `pfi_match="exact"` fetches PFI fallbacks with an indexable `property_pfi IN (...)` instead of the
+    leading-wildcard LIKE, which scans the table; use it when rates PFIs are stored without prefixes.
+    `order_by` is a column expression giving table order. It fixes which record wins when several share
+    a key, as list order does for `sample_rates_data` (default: the order rows come back in).
+    `connect` must be picklable (e.g. a `functools.partial`) for use with `--workers`. Each worker
+    process then opens its own pool.
+
+    Usage:
+        source = DbApiRatesSource(functools.partial(sqlite3.connect, "rates.db"), table="rates")
+        validate_m1_csv("m1.csv", "m1_validated.csv", source)
+    """
+
+    def __init__(self, connect, table="rates", columns=None, order_by=None, placeholder="?",
+                 batch_size=900, pool_size=4, pfi_match="suffix"):
+        self.connect = connect
+        self.table = table
+        self.columns = {field: field for field in RATES_FIELDS}
+        self.columns.update(columns or {})
+        self.order_by = order_by
+        self.placeholder = placeholder
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.pfi_match = pfi_match
+        self.round_trips = 0
+        self._pool = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"] = None # Connections are per process; workers open their own.
+        return state
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ConnectionPool(self.connect, self.pool_size)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+
+    def _select(self, where):
+        select_list = ", ".join(f"{expr} AS {field}" for field, expr in self.columns.items())
+        if self.order_by:
+            select_list += f", {self.order_by} AS {ORDER_FIELD}"
+        return f"SELECT {select_list} FROM {self.table} WHERE {where}"
+
+    def _fetch(self, sql, params):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        self.round_trips += 1
+        fields = list(self.columns) + ([ORDER_FIELD] if self.order_by else [])
+        # NULL columns are left out, so the record reads like a dict missing that key (e.g. no Memo).
+        return [{field: value for field, value in zip(fields, row) if value is not None} for row in rows]
+
+    def _batches(self, values):
+        values = sorted(values)
+        for start in range(0, len(values), self.batch_size):
+            yield values[start:start + self.batch_size]
+
+    def fetch_by_keys(self, propnums=(), spis=(), pfis=()):
+        """Rates rows whose propnum is in `propnums`, whose SPI is in `spis` or whose PFI is in `pfis`."""
+        records = []
+        keyed = [(self.columns["propnum"], value) for value in propnums]
+        keyed += [(self.columns["spi"], value) for value in spis]
+        keyed += [(self.columns["property_pfi"], value) for value in pfis]
+        for batch in self._batches(keyed):
+            by_column = {}
+            for column, value in batch:
+                by_column.setdefault(column, []).append(value)
+            where = " OR ".join(f"{column} IN ({', '.join([self.placeholder] * len(values))})"
+                                for column, values in by_column.items())
+            records += self._fetch(self._select(where), [v for values in by_column.values() for v in values])
+        return records
+
+    def fetch_by_pfi_suffix(self, pfis):
+        """Rates rows whose PFI ends with any of `pfis`. LIKE may over-match; RatesIndex re-checks exactly."""
+        records = []
+        column = self.columns["property_pfi"]
+        for batch in self._batches(pfis):
+            where = " OR ".join([f"{column} LIKE {self.placeholder} ESCAPE '\\'"] * len(batch))
+            patterns = ["%" + pfi.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for pfi in batch]
+            records += self._fetch(self._select(where), patterns)
+        return records
+
+    def index_for(self, m1_chunk):
+        identifiers = [tuple(clean_identifier(value) for value in row) for row in iter_m1_identifiers(m1_chunk)]
+        propnums = {propnum for propnum, _, _ in identifiers if propnum}
+        spis = {spi for _, spi, _ in identifiers if spi}
+        records = self.fetch_by_keys(propnums, spis)
+
+        # Only rows with no propnum/SPI hit fall through to the PFI suffix match.
+        keyed_index = RatesIndex(records)
+        pfis = {pfi for propnum, spi, pfi in identifiers
+                if pfi and not (propnum and keyed_index.by_propnum(propnum)) and not (spi and keyed_index.by_spi(spi))}
+        if pfis and self.pfi_match == "exact":
+            records += self.fetch_by_keys(pfis=pfis)
+        elif pfis:
+            records += self.fetch_by_pfi_suffix(pfis)
+
+        # A row can come back from several queries or batches; keep one copy, in table order if known.
+        unique = list({tuple(record.items()): record for record in records}.values())
+        return RatesIndex(self._in_table_order(unique))
+
+    def fetch_all(self):
+        """Every rates row, in table order when `order_by` is set (e.g. to build a rates snapshot)."""
+        return self._in_table_order(self._fetch(self._select("1 = 1"), []))
+
+    def _in_table_order(self, records):
+        if self.order_by:
+            records.sort(key=lambda record: record[ORDER_FIELD])
+            for record in records:
+                del record[ORDER_FIELD]
+        return records
+
+
+def write_rates_snapshot(path, rates_records):
+    """
+    Writes rates records (e.g. `DbApiRatesSource.fetch_all()`) to a snapshot file for `RatesSnapshot`.
+    Records are stored in lookup precedence order (active first, each group in list order), so the first
+    record a propnum, SPI or PFI-suffix index finds is the one `RatesIndex` would return.
+    """
+    records = list(rates_records)
+    ordered = [r for r in records if r.get("status") == "C"] + [r for r in records if r.get("status") != "C"]
+    return write_snapshot(path, ordered, fields=RATES_FIELDS, hash_fields=["propnum", "spi"],
+                          suffix_fields=["property_pfi"])
+
+
+class RatesSnapshot(RatesIndex):
+    """
+    Rates source over a snapshot file written by `write_rates_snapshot`, queried in place through `mmap`.
+
+    Opening it maps the file instead of re-querying the rates database or rebuilding a `RatesIndex`, so
+    startup takes milliseconds; `--workers` processes reopen the same file and share its pages. Lookups
+    follow `RatesIndex` precedence through the snapshot's propnum and SPI hash indexes and its PFI suffix
+    index, and decode only the record they return. Values come back as text (as stored).
+
+    Usage:
+        write_rates_snapshot("rates.snap", DbApiRatesSource(connect, order_by="rowid").fetch_all())
+        validate_m1_csv("m1.csv", "m1_validated.csv", RatesSnapshot("rates.snap"))
+    """
+
+    def __init__(self, path):
+        self.snapshot = ReferenceSnapshot(path)
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __reduce__(self):
+        return (RatesSnapshot, (self.snapshot.path,))
+
+    @property
+    def records(self):
+        return self.snapshot
+
+    def close(self):
+        self.snapshot.close()
+
+    def _record(self, position):
+        return None if position is None else self.snapshot.record(position)
+
+    def by_propnum(self, propnum):
+        return self._record(self.snapshot.find("propnum", propnum))
+
+    def by_spi(self, spi):
+        return self._record(self.snapshot.find("spi", spi))
+
+    def by_pfi(self, pfi):
+        return self._record(self.snapshot.find_suffix("property_pfi", pfi))
+
+
+def create_sqlite_rates_table(conn, rates_records, table="rates"):
+    """Creates and fills a SQLite rates table from a list of rates records (e.g. `sample_rates_data`)."""
+    conn.execute(f"CREATE TABLE {table} ({', '.join(f'{field} TEXT' for field in RATES_FIELDS)})")
+    conn.executemany(f"INSERT INTO {table} VALUES ({', '.join(['?'] * len(RATES_FIELDS))})",
+                     [tuple(record.get(field) for field in RATES_FIELDS) for record in rates_records])
+    for field in ("propnum", "spi", "property_pfi"):
+        conn.execute(f"CREATE INDEX {table}_{field} ON {table} ({field})")
+    conn.commit()
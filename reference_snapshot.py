@@ -0,0 +1,401 @@
+# reference_snapshot.py
+
+import argparse
+import itertools
+import json
+import mmap
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping
+
+from report_sinks import atomic_write
+
+MAGIC = b"M1SNAP01"
+FORMAT_VERSION = 1
+_ALIGN = 8
+_EMPTY = -1
+# Each record's values sit together in the heap, separated by _FIELD_SEPARATOR, with _MISSING for
+# a field the record has no value for, so a whole record decodes with one slice and one split.
+_FIELD_SEPARATOR = "\x1f"
+_MISSING = "\x1e"
+
+
+# Stable across processes and runs, unlike hash(str), so the tables can live on disk.
+_key_hash = zlib.crc32
+
+
+def _hash_table(keys):
+    """Open-addressing table (linear probing, power-of-two size) of the first position of each key, and the key count."""
+    first = {}
+    for position, key in enumerate(keys):
+        if key is not None and key not in first:
+            first[key] = position
+    size = 8
+    while size < 2 * len(first):
+        size *= 2
+    table = array("i", [_EMPTY]) * size
+    mask = size - 1
+    for key, position in first.items():
+        slot = _key_hash(key) & mask
+        while table[slot] != _EMPTY:
+            slot = (slot + 1) & mask
+        table[slot] = position
+    return table, len(first)
+
+
+def _suffix_index(values):
+    """
+    Suffix index over encoded values: the reversed values, sorted and NUL-padded to one width, the
+    position of each, and a bottom-up min segment tree over those positions. Returns them and the width.
+    """
+    entries = sorted((value.decode("utf-8")[::-1].encode("utf-8"), position)
+                     for position, value in enumerate(values) if value is not None)
+    width = max((len(value) for value, _ in entries), default=0)
+    keys = array("B", b"".join(value.ljust(width, b"\0") for value, _ in entries))
+    order = array("i", [position for _, position in entries])
+    size = len(order)
+    tree = array("i", [0]) * size + order
+    for i in range(size - 1, 0, -1):
+        tree[i] = min(tree[2 * i], tree[2 * i + 1])
+    return keys, order, tree, width
+
+
+def write_snapshot(path, records, fields=None, hash_fields=(), suffix_fields=()):
+    """
+    Writes `records` (dicts) to a snapshot file at `path`, in the given order, for `ReferenceSnapshot`.
+
+    Every value of `fields` (default: the keys of all records, in first-seen order) is stored as UTF-8
+    text in one string heap, record by record, and each field gets two fixed-width columns: the heap
+    offset and the byte length of every record's value (-1 when the record has no value, i.e. the key
+    is missing or None). Values must not contain NUL or the separators \\x1e and \\x1f (ValueError).
+    Each of `hash_fields` gets a hash index from value to the first position holding it, and each of
+    `suffix_fields` a suffix index answering "which position first holds a value ending with this text".
+    The file is written beside `path` and then swapped in. Returns the number of records written.
+    """
+    records = list(records)
+    if fields is None:
+        fields = list(dict.fromkeys(field for record in records for field in record))
+    fields = list(dict.fromkeys([*fields, *hash_fields, *suffix_fields]))  # Indexed fields are always stored.
+    separator = _FIELD_SEPARATOR.encode("utf-8")
+    missing = _MISSING.encode("utf-8")
+    # Column by column: encoded values (None when absent) and their byte lengths (-1 when absent).
+    encoded = {}
+    for field in fields:
+        values = [record.get(field) for record in records]
+        encoded[field] = [None if value is None else (value if isinstance(value, str) else str(value)).encode("utf-8")
+                          for value in values]
+    lengths = {field: [_EMPTY if data is None else len(data) for data in encoded[field]] for field in fields}
+
+    rows = [separator.join([missing if data is None else data for data in values])
+            for values in zip(*(encoded[field] for field in fields))] if fields else [b""] * len(records)
+    heap = b"".join(rows)
+    absent = sum(field_lengths.count(_EMPTY) for field_lengths in lengths.values())
+    if (heap.count(separator) != len(records) * max(len(fields) - 1, 0) or heap.count(missing) != absent
+            or b"\0" in heap):
+        bad = next(value for field in fields for value in encoded[field]
+                   if value is not None and (separator in value or missing in value or b"\0" in value))
+        raise ValueError(f"Value {bad.decode('utf-8')!r} contains a reserved control character.")
+    row_lengths = [len(row) for row in rows]
+    row_starts = [0] + list(itertools.accumulate(row_lengths))[:-1] if rows else []
+
+    sections = {"row.start": array("q", row_starts), "row.length": array("i", row_lengths)}
+    starts = row_starts
+    for field in fields:
+        sections[f"column.{field}.start"] = array("q", starts)
+        sections[f"column.{field}.length"] = array("i", lengths[field])
+        # The next field starts after this value (or its one-byte absent marker) and a separator.
+        starts = [start + (length if length >= 0 else 1) + 1 for start, length in zip(starts, lengths[field])]
+    distinct, widths = {}, {}
+    for field in hash_fields:
+        sections[f"hash.{field}"], distinct[field] = _hash_table(encoded[field])
+    for field in suffix_fields:
+        keys, order, tree, widths[field] = _suffix_index(encoded[field])
+        sections[f"suffix.{field}.keys"] = keys
+        sections[f"suffix.{field}.order"] = order
+        sections[f"suffix.{field}.tree"] = tree
+    sections["heap"] = array("B", heap)
+
+    # Directory (JSON) first, then each section at an 8-byte aligned offset.
+    present = {field: len(records) - lengths[field].count(_EMPTY) for field in hash_fields}
+    directory = {"version": FORMAT_VERSION, "byteorder": sys.byteorder, "count": len(records), "fields": fields,
+                 "hash_fields": list(hash_fields), "distinct": distinct,
+                 "unique_fields": [field for field in hash_fields if distinct[field] == present[field]],
+                 "suffix_fields": list(suffix_fields), "suffix_widths": widths, "sections": {}}
+    header_size = None
+    while True:  # The directory's own size moves the sections; repeat until it settles.
+        size = _aligned(len(MAGIC) + 8 + len(json.dumps(directory).encode("utf-8")))
+        if size == header_size:
+            break
+        header_size = offset = size
+        for name, values in sections.items():
+            directory["sections"][name] = [offset, values.typecode, len(values)]
+            offset = _aligned(offset + len(values) * values.itemsize)
+    directory_text = json.dumps(directory).encode("utf-8")
+
+    with atomic_write(path) as f:
+        f.write(MAGIC + len(directory_text).to_bytes(8, "little") + directory_text)
+        for name, values in sections.items():
+            f.write(b"\0" * (directory["sections"][name][0] - f.tell()))
+            values.tofile(f)
+        f.write(b"\0" * (offset - f.tell()))
+    return len(records)
+
+
+def _aligned(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class ReferenceSnapshot:
+    """
+    Read-only view of a snapshot file written by `write_snapshot`, memory-mapped rather than loaded.
+
+    Opening one maps the file and reads its small JSON directory; columns, the string heap and the
+    indexes are read in place through memoryviews, so opening costs milliseconds whatever the size and
+    processes opening the same file share its pages through the OS page cache. `find` and `find_suffix`
+    probe the embedded indexes, and only the records they return are decoded into dicts. A snapshot
+    pickles as its path (e.g. into pool workers), which reopens the mapping on the other side.
+
+    It is also a sequence of record dicts (`len`, indexing, iteration), decoded on access, and
+    `mapping(field)` is a read-only dict-like view keyed by a unique hash field.
+
+    Usage:
+        write_snapshot("vicmap.snap", vicmap_records, hash_fields=["propnum", "spi"])
+        with ReferenceSnapshot("vicmap.snap") as snapshot:
+            snapshot.record(snapshot.find("propnum", "5002"))
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self):
+        self._views = [memoryview(self._mmap)]
+        view = self._views[0]
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{self.path} is not a reference snapshot.")
+        length = int.from_bytes(view[len(MAGIC):len(MAGIC) + 8], "little")
+        start = len(MAGIC) + 8
+        directory = json.loads(bytes(view[start:start + length]))
+        if directory["version"] != FORMAT_VERSION or directory["byteorder"] != sys.byteorder:
+            raise ValueError(f"{self.path} is snapshot version {directory['version']} ({directory['byteorder']}-endian); "
+                             f"this reader needs version {FORMAT_VERSION} ({sys.byteorder}-endian). Rebuild it.")
+        self.count = directory["count"]
+        self.fields = directory["fields"]
+        self.hash_fields = directory["hash_fields"]
+        self.unique_fields = directory["unique_fields"]
+        self.distinct = directory["distinct"]
+        self.suffix_fields = directory["suffix_fields"]
+        sections = {}
+        for name, (offset, typecode, size) in directory["sections"].items():
+            section = view[offset:offset + size * array(typecode).itemsize].cast(typecode)
+            self._views.append(section)
+            sections[name] = section
+        # Text is sliced straight from the mmap (bytes), which is cheaper than through a memoryview.
+        self._heap = directory["sections"]["heap"][0]
+        self._rows = (sections["row.start"], sections["row.length"])
+        self._columns = {field: (sections[f"column.{field}.start"], sections[f"column.{field}.length"])
+                         for field in self.fields}
+        self._hashes = {field: (sections[f"hash.{field}"], len(sections[f"hash.{field}"]) - 1) + self._columns[field]
+                        for field in self.hash_fields}
+        self._suffixes = {field: (directory["sections"][f"suffix.{field}.keys"][0], directory["suffix_widths"][field],
+                                  sections[f"suffix.{field}.order"], sections[f"suffix.{field}.tree"])
+                          for field in self.suffix_fields}
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __reduce__(self):
+        return (type(self), (self.path,))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        if not -self.count <= position < self.count:
+            raise IndexError("snapshot record index out of range")
+        return self.record(position % self.count)
+
+    def __iter__(self):
+        return (self.record(position) for position in range(self.count))
+
+    def value(self, field, position):
+        """Text of `field` for the record at `position` (None when that record has no value)."""
+        starts, lengths = self._columns[field]
+        length = lengths[position]
+        if length < 0:
+            return None
+        start = self._heap + starts[position]
+        return self._mmap[start:start + length].decode("utf-8")
+
+    def values(self, field):
+        """Texts of `field` in record order (None where a record has no value), decoding only that field."""
+        starts, lengths = self._columns[field]
+        heap, data = self._heap, self._mmap
+        for start, length in zip(starts, lengths):
+            yield None if length < 0 else data[heap + start:heap + start + length].decode("utf-8")
+
+    def record(self, position):
+        """The record at `position` as a dict, without the fields it has no value for."""
+        row_starts, row_lengths = self._rows
+        start = self._heap + row_starts[position]
+        text = self._mmap[start:start + row_lengths[position]].decode("utf-8")
+        if _MISSING in text:
+            return {field: value for field, value in zip(self.fields, text.split(_FIELD_SEPARATOR)) if value != _MISSING}
+        return dict(zip(self.fields, text.split(_FIELD_SEPARATOR)))
+
+    def find(self, field, key):
+        """Position of the first record whose `field` equals `key` (a hash field), or None."""
+        if key is None:
+            return None
+        table, mask, starts, lengths = self._hashes[field]
+        data = (key if isinstance(key, str) else str(key)).encode("utf-8")
+        size = len(data)
+        slot = _key_hash(data) & mask
+        position = table[slot]
+        while position != _EMPTY:
+            if lengths[position] == size:
+                start = self._heap + starts[position]
+                if self._mmap[start:start + size] == data:
+                    return position
+            slot = (slot + 1) & mask
+            position = table[slot]
+        return None
+
+    def find_suffix(self, field, suffix):
+        """Position of the first record whose `field` (a suffix field) ends with `suffix`, or None."""
+        keys, width, order, tree = self._suffixes[field]
+        size = len(order)
+        reversed_suffix = suffix[::-1].encode("utf-8")
+        # Sorted reversed values starting with the reversed suffix form one run, [lo, hi). UTF-8 never
+        # contains byte 0xFF, so appending it gives an upper bound for the run.
+        lo = self._bisect_fixed(keys, width, reversed_suffix, 0, size)
+        upper = reversed_suffix + b"\xff"
+        # Runs are usually a record or two long: gallop past the run before bisecting for its end.
+        step = 1
+        while lo + step <= size and self._mmap[keys + (lo + step - 1) * width:keys + (lo + step) * width] < upper:
+            step *= 2
+        hi = self._bisect_fixed(keys, width, upper, lo + step // 2, min(lo + step, size))
+        if hi - lo <= 16:
+            return min(order[lo:hi]) if lo < hi else None
+        best = None
+        lo += size
+        hi += size
+        while lo < hi:
+            if lo & 1:
+                best = tree[lo] if best is None else min(best, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = tree[hi] if best is None else min(best, tree[hi])
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def _bisect_fixed(self, keys, width, target, lo, hi):
+        # bisect_left over the NUL-padded fixed-width keys at mmap offset `keys` (NUL sorts first, so padding keeps the order).
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._mmap[keys + mid * width:keys + (mid + 1) * width] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def mapping(self, field):
+        """Read-only dict-like view {value of `field`: record} over a hash field whose values are unique."""
+        if field not in self.unique_fields:
+            raise ValueError(f"{field!r} is not a unique hash field of {self.path}; "
+                             f"unique hash fields: {', '.join(self.unique_fields) or 'none'}.")
+        return SnapshotMapping(self, field)
+
+
+class SnapshotMapping(Mapping):
+    """
+    `{record[field]: record}` over a snapshot, in record order, without building the dict: lookups
+    probe the hash index and records are decoded when read. Iterating keys decodes only `field`.
+    """
+
+    def __init__(self, snapshot, field):
+        self.snapshot = snapshot
+        self.field = field
+
+    def __getitem__(self, key):
+        position = self.snapshot.find(self.field, key)
+        if position is None:
+            raise KeyError(key)
+        return self.snapshot.record(position)
+
+    def get(self, key, default=None):
+        position = self.snapshot.find(self.field, key)
+        return default if position is None else self.snapshot.record(position)
+
+    def __contains__(self, key):
+        return self.snapshot.find(self.field, key) is not None
+
+    def __iter__(self):
+        return (key for key in self.snapshot.values(self.field) if key is not None)
+
+    def __len__(self):
+        return self.snapshot.distinct[self.field]
+
+    def items(self):
+        for record in self.snapshot:
+            key = record.get(self.field)
+            if key is not None:
+                yield key, record
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(
+        prog=prog, description="Build a memory-mapped snapshot of the rates or Vicmap reference data.")
+    parser.add_argument("kind", choices=["rates", "vicmap"])
+    parser.add_argument("output", help="Snapshot file to write.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", metavar="PATH", help="Read the records from this CSV extract (default: the sample data).")
+    source.add_argument("--sqlite", metavar="PATH", help="Read rates from the 'rates' table of this SQLite file.")
+    args = parser.parse_args(argv)
+    if args.sqlite and args.kind != "rates":
+        parser.error("--sqlite only applies to rates snapshots")
+
+    if args.kind == "rates":
+        import functools
+        import sqlite3
+        from m1_validator import sample_rates_data
+        from rates_sources import DbApiRatesSource, write_rates_snapshot
+        if args.sqlite:
+            source = DbApiRatesSource(functools.partial(sqlite3.connect, args.sqlite), order_by="rowid")
+            records = source.fetch_all()
+            source.close()
+        else:
+            records = _csv_records(args.csv) if args.csv else sample_rates_data
+        count = write_rates_snapshot(args.output, records)
+    else:
+        from comparison_engine import iter_csv_records, load_vicmap_data, write_vicmap_snapshot
+        count = write_vicmap_snapshot(args.output, iter_csv_records(args.csv) if args.csv else load_vicmap_data())
+    print(f"INFO: Wrote {count} {args.kind} records to snapshot {args.output}.")
+
+
+def _csv_records(path):
+    # Rates CSV rows with blank cells left out, as NULL columns are for database rows.
+    from comparison_engine import iter_csv_records
+    return ({field: value for field, value in row.items() if value != ""} for row in iter_csv_records(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+# report_sinks.py
+
+import contextlib
+import csv
+import json
+import os
+import tempfile
+
+DEFAULT_BATCH_SIZE = 1000
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextlib.contextmanager
+def atomic_write(path):
+    """
+    Opens a uniquely named temporary file beside `path` for binary writing and moves it over `path` once
+    the block completes, so an interrupted run keeps the previous file and runs sharing `path` never
+    write into the same temporary file (the last one to finish wins). The file gets the permissions
+    `open()` would give it.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    f = tempfile.NamedTemporaryFile("wb", dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                    delete=False)
+    try:
+        with f:
+            yield f
+        os.chmod(f.name, 0o666 & ~_UMASK)
+        os.replace(f.name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(f.name)
+        raise
+
+
+class ReportSink:
+    """
+    Streaming report writer. Records (dicts) go in one at a time through `write` / `write_many` as a
+    run produces them, and validated DataFrame chunks through `write_frame`. Records are buffered and
+    written out every `batch_size` records, and the output is flushed after every batch, so memory stays
+    bounded and review tools can start reading the file before the run finishes.
+
+    `target` is a path, or an open file (e.g. sys.stdout) that is flushed but left open.
+    Use as a context manager, or call `close()`, to write the last batch.
+
+    Usage:
+        with NdjsonSink("change_report.ndjson") as sink:
+            sink.write_many(iter_changes(council_data, vicmap_data))
+    """
+
+    binary = False
+
+    def __init__(self, target, batch_size=DEFAULT_BATCH_SIZE):
+        if hasattr(target, "write"):
+            self._file, self._owns_file = target, False
+        elif self.binary:
+            self._file, self._owns_file = open(target, "wb"), True
+        else:
+            self._file, self._owns_file = open(target, "w", newline="", encoding="utf-8"), True
+        self.batch_size = batch_size
+        self.records_written = 0
+        self._batch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def write_frame(self, frame):
+        """Writes a DataFrame chunk (already bounded in size) straight through, after any buffered records."""
+        self.flush()
+        if len(frame):
+            self._write_frame(frame)
+            self.records_written += len(frame)
+            self._file.flush()
+        else:
+            self._empty_frame(frame)
+
+    def flush(self):
+        if self._batch:
+            self._write_batch(self._batch)
+            self.records_written += len(self._batch)
+            self._batch = []
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._finish()
+        self._file.flush()
+        if self._owns_file:
+            self._file.close()
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+    def _empty_frame(self, frame):
+        pass
+
+    def _write_frame(self, frame):
+        # NaN becomes None, as in the record dicts the comparison engines produce.
+        self._write_batch(json.loads(frame.to_json(orient="records", date_format="iso")))
+
+    def _finish(self):
+        pass
+
+
+class JsonArraySink(ReportSink):
+    """
+    A JSON array written element by element. The text is identical to `json.dumps(records, indent=4)`
+    (plus a final newline), but no list of all records is held and the array grows as records arrive.
+    """
+
+    def __init__(self, target, batch_size=DEFAULT_BATCH_SIZE, indent=4):
+        super().__init__(target, batch_size)
+        self.indent = indent
+        self._started = False
+        self._key_prefixes = {}
+
+    def _write_batch(self, records):
+        parts = []
+        for record in records:
+            parts.append(",\n" if self._started else "[\n")
+            parts.append(self._element(record))
+            self._started = True
+        self._file.write("".join(parts))
+
+    def _element(self, record):
+        pad = " " * self.indent
+        values = record.values()
+        if not record or not all(isinstance(key, str) for key in record) or any(isinstance(v, _CONTAINERS) for v in values):
+            return pad + json.dumps(record, indent=self.indent).replace("\n", "\n" + pad)
+        # json.dumps with an indent runs the pure-Python encoder. Flat records (every change-report entry)
+        # are laid out here instead, with strings escaped by the C encoder; the text is the same.
+        keys = tuple(record)
+        prefixes = self._key_prefixes.get(keys)
+        if prefixes is None:
+            prefixes = self._key_prefixes[keys] = [f"{pad * 2}{_encode_string(key)}: " for key in keys]
+        items = ",\n".join(prefix + _encode_scalar(value) for prefix, value in zip(prefixes, values))
+        return f"{pad}{{\n{items}\n{pad}}}"
+
+    def _finish(self):
+        self._file.write("\n]\n" if self._started else "[]\n")
+
+
+_CONTAINERS = (dict, list, tuple)
+_encode_string = json.encoder.encode_basestring_ascii
+
+
+def _encode_scalar(value):
+    if isinstance(value, str):
+        return _encode_string(value)
+    if value is None:
+        return "null"
+    if value is True or value is False:
+        return "true" if value else "false"
+    return json.dumps(value)
+
+
+class NdjsonSink(ReportSink):
+    """Newline-delimited JSON: one record per line, readable line by line while it is being written."""
+
+    def _write_batch(self, records):
+        self._file.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+
+    def _write_frame(self, frame):
+        text = frame.to_json(orient="records", lines=True, date_format="iso")
+        self._file.write(text if text.endswith("\n") else text + "\n")
+
+
+class CsvSink(ReportSink):
+    """
+    CSV with a header row. `columns` fixes the column order (default: the first record's or frame's
+    columns). Frames are written with `DataFrame.to_csv`, exactly as a single whole-frame `to_csv` would.
+    A report with no rows still gets its header when the columns are known (given, or from an empty frame).
+    """
+
+    def __init__(self, target, batch_size=DEFAULT_BATCH_SIZE, columns=None):
+        super().__init__(target, batch_size)
+        self.columns = list(columns) if columns is not None else None
+        self._writer = None
+
+    def _write_batch(self, records):
+        if self._writer is None:
+            if self.columns is None:
+                self.columns = list(records[0])
+            self._writer = csv.DictWriter(self._file, fieldnames=self.columns, lineterminator="\n")
+            if self.records_written == 0:
+                self._writer.writeheader()
+        self._writer.writerows(records)
+
+    def _write_frame(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        frame.to_csv(self._file, columns=self.columns, header=(self.records_written == 0), index=False)
+
+    def _empty_frame(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+
+    def _finish(self):
+        if self.records_written == 0 and self.columns is not None:
+            csv.writer(self._file, lineterminator="\n").writerow(self.columns)
+
+
+class ParquetSink(ReportSink):
+    """
+    Parquet file written one row group per batch through `pyarrow.parquet.ParquetWriter` (pyarrow is
+    only needed for this sink). Every column is stored as nullable text, as in the CSV output, so the
+    schema stays the same across batches whose inferred types would differ (e.g. a column that is
+    all blank in one M1 chunk). `columns` fixes the column order as for CsvSink.
+    """
+
+    binary = True
+
+    def __init__(self, target, batch_size=50000, columns=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("ParquetSink requires pyarrow (pip install pyarrow).") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        super().__init__(target, batch_size)
+        self.columns = list(columns) if columns is not None else None
+        self._writer = None
+
+    def _write_table(self, arrays):
+        table = self._pa.table({col: self._pa.array(values, type=self._pa.string()) for col, values in arrays.items()})
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._file, table.schema)
+        self._writer.write_table(table)
+
+    def _write_batch(self, records):
+        if self.columns is None:
+            self.columns = list(records[0])
+        self._write_table({col: [_as_text(record.get(col)) for record in records] for col in self.columns})
+
+    def _write_frame(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        self._write_table({col: [_as_text(value) for value in frame[col]] for col in self.columns})
+
+    def _empty_frame(self, frame):
+        if self.columns is None:
+            self.columns = list(frame.columns)
+
+    def _finish(self):
+        if self._writer is None and self.columns is not None:
+            self._write_table({col: [] for col in self.columns})  # a valid file with the schema and no rows
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _as_text(value):
+    if value is None or value != value:  # None or NaN
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+SINKS = {"json": JsonArraySink, "ndjson": NdjsonSink, "csv": CsvSink, "parquet": ParquetSink}
+
+
+def open_sink(report_format, target, **options):
+    """Creates the sink for `report_format` ('json', 'ndjson', 'csv' or 'parquet') writing to `target`."""
+    try:
+        sink_class = SINKS[report_format]
+    except KeyError:
+        raise ValueError(f"Unknown report format {report_format!r}; expected one of {', '.join(SINKS)}.") from None
+    return sink_class(target, **options)
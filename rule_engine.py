@@ -0,0 +1,128 @@
+# rule_engine.py
+
+import string
+
+from keyword_matcher import KeywordMatcher
+
+_CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+
+
+class RuleEngine:
+    """
+    Table-driven rules compiled once into dict dispatch.
+
+    The rules are declared as data: `families` maps a family name to its edit codes, `templates` maps a
+    rule name to its status template (`str.format` fields) or to a dict of such templates for records
+    with several text fields, and `keywords` maps a text source (e.g. 'memo') to the keyword categories
+    of a KeywordMatcher. `handlers` maps a family name to a function of the row context returning the
+    name of the rule that applies; codes outside every family go to `default_family`.
+
+    Every code is resolved to its handler by one dict lookup, templates are parsed up front into literal
+    and field parts (rendered per row with format(), and column-wise by `render_columns`), and every render
+    counts a hit for its rule in `hits`. Adding council-specific codes or rules is a table edit that
+    leaves the common path unchanged.
+
+    Usage:
+        rules = RuleEngine({"no_change": ["NC", "N"]}, {"no_change.ok": "OK: No Change ({edit_code})."},
+                           handlers={"no_change": lambda row: "no_change.ok"})
+        rules.evaluate("NC", {"edit_code": "NC"})   # 'OK: No Change (NC).'
+        rules.hits                                   # {'no_change.ok': 1}
+    """
+
+    def __init__(self, families=None, templates=None, keywords=None, handlers=None, default_family=None):
+        self.families = {name: frozenset(codes) for name, codes in (families or {}).items()}
+        self.default_family = default_family
+        self._family_of = {}
+        for name, codes in self.families.items():
+            for code in codes:
+                if code in self._family_of:
+                    raise ValueError(f"Edit code {code!r} is in both {self._family_of[code]!r} and {name!r}.")
+                self._family_of[code] = name
+        self.templates = dict(templates or {})
+        self._parts = {rule: self._compile(template) for rule, template in self.templates.items()}
+        self._renderers = {rule: self._renderer(template) for rule, template in self.templates.items()}
+        self.matchers = {source: KeywordMatcher(categories) for source, categories in (keywords or {}).items()}
+        handlers = handlers or {}
+        self._dispatch = {code: handlers[name] for code, name in self._family_of.items() if name in handlers}
+        self._default_handler = handlers.get(default_family)
+        self.hits = dict.fromkeys(self.templates, 0)
+
+    @staticmethod
+    def _compile(template):
+        # "OK: ({edit_code}) '{memo:.50}'" -> (('OK: (', 'edit_code', ''), (") '", 'memo', '.50'), ("'", None, None)).
+        if isinstance(template, dict):
+            return {field: RuleEngine._compile(text) for field, text in template.items()}
+        return tuple((literal, field or None, spec) for literal, field, spec, _ in string.Formatter().parse(template))
+
+    @staticmethod
+    def _renderer(template):
+        # Each template becomes a render function over its parsed parts, built once here. Values only
+        # ever go through format() with the template's spec, so a template can't run code.
+        if isinstance(template, dict):
+            renderers = {field: RuleEngine._renderer(text) for field, text in template.items()}
+            return lambda context: {field: render(context) for field, render in renderers.items()}
+        fields, literals = [], []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            literals.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"Template field {field!r} in {template!r} is not a plain name.")
+            if spec and "{" in spec:
+                raise ValueError(f"Template field {field!r} in {template!r} has a nested format spec.")
+            if conversion and conversion not in _CONVERSIONS:
+                raise ValueError(f"Template field {field!r} in {template!r} has an unknown conversion !{conversion}.")
+            fields.append(("".join(literals), field, spec or "", _CONVERSIONS.get(conversion)))
+            literals = []
+        tail = "".join(literals)
+
+        def render(context):
+            pieces = []
+            for literal, field, spec, convert in fields:
+                value = context[field]
+                pieces.append(literal)
+                pieces.append(format(convert(value) if convert else value, spec))
+            pieces.append(tail)
+            return "".join(pieces)
+        return render
+
+    def family(self, code):
+        """Family name of an edit code (`default_family` for codes outside every family)."""
+        return self._family_of.get(code, self.default_family)
+
+    def fields(self, rule):
+        """Context fields the rule's template reads."""
+        parts = self._parts[rule]
+        parts = [p for field_parts in parts.values() for p in field_parts] if isinstance(parts, dict) else parts
+        return list(dict.fromkeys(field for _, field, _ in parts if field))
+
+    def evaluate(self, code, context):
+        """Runs the handler for `code`'s family on `context` and renders the rule it picks."""
+        rule = self._dispatch.get(code, self._default_handler)(context)
+        self.hits[rule] += 1
+        return self._renderers[rule](context)
+
+    def render(self, rule, context):
+        self.hits[rule] += 1
+        return self._renderers[rule](context)
+
+    def render_columns(self, rule, columns, count):
+        """
+        Column-wise `render` for `count` rows at once: `columns` maps each template field to a pandas
+        Series of text. Returns the rendered Series, or the literal text when the template has no fields.
+        """
+        self.hits[rule] += count
+        rendered = ""
+        for literal, field, spec in self._parts[rule]:
+            rendered = rendered + literal
+            if field:
+                column = columns[field]
+                if spec and spec.startswith(".") and spec[1:].isdigit():
+                    column = column.str[:int(spec[1:])]  # '{memo:.50}' truncates, as format() does for text
+                elif spec:
+                    column = column.map(lambda value: format(value, spec))
+                rendered = rendered + column
+        return rendered
+
+    def reset_hits(self):
+        self.hits = dict.fromkeys(self.templates, 0)
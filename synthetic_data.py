@@ -0,0 +1,265 @@
+# synthetic_data.py
+
+import argparse
+import os
+import random
+import string
+
+import numpy as np
+import pandas as pd
+
+# Pozi M1 export columns, in export order (as in sample_data.csv).
+M1_COLUMNS = [
+    "lga_code", "new_sub", "property_pfi", "parcel_pfi", "address_pfi", "spi", "plan_number", "lot_number",
+    "base_propnum", "propnum", "crefno", "hsa_flag", "hsa_unit_id", "blg_unit_type", "blg_unit_prefix_1",
+    "blg_unit_id_1", "blg_unit_suffix_1", "blg_unit_prefix_2", "blg_unit_id_2", "blg_unit_suffix_2", "floor_type",
+    "floor_prefix_1", "floor_no_1", "floor_suffix_1", "floor_prefix_2", "floor_no_2", "floor_suffix_2",
+    "building_name", "complex_name", "location_descriptor", "house_prefix_1", "house_number_1", "house_suffix_1",
+    "house_prefix_2", "house_number_2", "house_suffix_2", "access_type", "new_road", "road_name", "road_type",
+    "road_suffix", "locality_name", "distance_related_flag", "is_primary", "easting", "northing", "datum_proj",
+    "outside_property", "edit_code", "comments", "date", "pozi_map",
+]
+# Roughly the sample's edit-code mix (mostly C, S, A and P), with every rule family represented.
+DEFAULT_EDIT_CODE_MIX = {"C": 0.33, "S": 0.2, "A": 0.16, "P": 0.12, "E": 0.04, "R": 0.05, "RET": 0.02,
+                         "NC": 0.05, "CHGADD": 0.01, "X": 0.02}
+# How M1 rows identify their property: by propnum, by SPI only, or by property PFI only.
+DEFAULT_KEY_MIX = {"propnum": 0.6, "spi": 0.25, "pfi": 0.15}
+
+ROAD_NAMES = ["GOWRIE", "HOGAN", "BROOKWATER", "VERNEY", "WYNDHAM", "HIGH", "MAIN", "OLD TRACK", "KIALLA WEST",
+              "CANAL", "ORRVALE", "ARCHER", "NIXON", "MCLENNAN", "BALACLAVA", "NUMURKAH"]
+ROAD_TYPES = ["STREET", "ROAD", "CRESCENT", "COURT", "AVENUE", "DRIVE", "TRACK", "LANE"]
+LOCALITIES = ["TATURA", "SHEPPARTON", "KIALLA", "MOOROOPNA", "MERRIGUM", "DOOKIE", "TALLYGAROOPNA", "MURCHISON"]
+
+# Memo phrases: routine filler, and the activity phrases the validation keywords look for.
+MEMO_FILLER = ["standard active property", "no significant actions recorded recently", "rates notice issued",
+               "owner details confirmed", "valuation reviewed", "pension rebate applied", "direct debit arranged",
+               "fire services levy", "supplementary valuation", "notice returned to sender"]
+MEMO_ACTIVITY = ["new lot created by subdivision", "child parcel of plan", "address change request processed",
+                 "road name change", "renumbering approved", "parcel retired", "consolidated with adjoining lot",
+                 "parent parcel", "no longer active", "old address:", "error corrected", "new assessment"]
+# Comment shapes per edit code, as Pozi writes them. Fields are filled per row.
+COMMENT_TEMPLATES = {
+    "A": "parcel {spi}: adding propnum {propnum} (new) ({address}) as new multi-assessment to property {other}",
+    "E": "parcel {spi}: new lot from subdivision of {plan}, adding propnum {propnum} ({address})",
+    "P": "parcel {spi}: adding propnum {propnum} to property {other} (new multi-assessment)",
+    "S": "property {propnum}: assigning new address {address} replacing address {old_address}",
+    "CHGADD": "property {propnum}: road name change to {address}",
+    "R": "parcel {spi}: removing propnum {propnum} from property {other}",
+    "RET": "property {propnum}: retiring property after consolidation",
+    "C": "property {propnum}: replacing crefno {crefno} with council reference {other}",
+    "NC": "property {propnum}: no change",
+    "X": "property {propnum}: checked {address}",
+}
+
+
+def _choice(rng, options, weights, size):
+    weights = np.asarray(weights, dtype=float)
+    return np.asarray(options, dtype=object)[rng.choice(len(options), size=size, p=weights / weights.sum())]
+
+
+def _text(values):
+    return pd.Series(values, dtype=object).astype(str)
+
+
+def _fill_template(template, columns):
+    # str.format over whole columns: 'a {x} b' -> 'a ' + columns['x'] + ' b'.
+    filled = ""
+    for literal, field, _, _ in string.Formatter().parse(template):
+        filled = filled + literal
+        if field:
+            filled = filled + columns[field]
+    return filled
+
+
+def make_memos(count, memo_words=(4, 40), activity_rate=0.4, seed=0):
+    """
+    `count` distinct Rates memos of `memo_words` (min, max) words each. A share `activity_rate` of them
+    mention an activity phrase (subdivision, address change, retirement, ...) that the rules look for.
+    """
+    rng = random.Random(seed)
+    memos = []
+    for _ in range(count):
+        words = []
+        target = rng.randint(*memo_words)
+        if rng.random() < activity_rate:
+            words += rng.choice(MEMO_ACTIVITY).split()
+        while len(words) < target:
+            words += rng.choice(MEMO_FILLER).split()
+        memos.append(" ".join(words[:max(target, 1)]).capitalize() + ".")
+    return memos
+
+
+def make_m1_dataset(rows, seed=0, edit_code_mix=None, key_mix=None, match_rate=0.9, inactive_rate=0.1,
+                    memo_words=(4, 40), memo_pool=5000, vague_comment_rate=0.1, extra_rates=0.2, lga_code="328"):
+    """
+    Generates a synthetic M1 export of `rows` rows with Pozi columns and the rates records it is
+    validated against. Returns (m1_df, rates_records): m1_df is a text DataFrame laid out like the
+    Pozi CSV (M1_COLUMNS, blanks as NaN) and rates_records a list of dicts shaped like
+    `sample_rates_data`.
+
+    `edit_code_mix` weights the edit codes (default DEFAULT_EDIT_CODE_MIX) and `key_mix` how rows identify
+    their property (propnum, SPI only or PFI only; default DEFAULT_KEY_MIX). A share `match_rate` of rows
+    has a rates record under that key, `inactive_rate` of records are inactive ('I'), memos are drawn
+    from `memo_pool` distinct memos of `memo_words` (min, max) words, `vague_comment_rate` of M1 comments
+    give no reason for the edit, and `extra_rates` x `rows` rates records belong to properties not in
+    the M1 export. The same `seed` gives the same data.
+    """
+    rng = np.random.default_rng(seed)
+    edit_code_mix = edit_code_mix or DEFAULT_EDIT_CODE_MIX
+    key_mix = key_mix or DEFAULT_KEY_MIX
+
+    ids = np.arange(rows)
+    propnum = _text(100000 + ids)
+    lot = _text(rng.integers(1, 40, rows))
+    plan = "PS" + _text(rng.integers(100000, 999999, rows))
+    spi = lot + "\\" + plan
+    pfi = _text(400000000 + ids)
+    house = _text(rng.integers(1, 400, rows))
+    road_name = pd.Series(_choice(rng, ROAD_NAMES, np.ones(len(ROAD_NAMES)), rows))
+    road_type = pd.Series(_choice(rng, ROAD_TYPES, np.ones(len(ROAD_TYPES)), rows))
+    locality = pd.Series(_choice(rng, LOCALITIES, np.ones(len(LOCALITIES)), rows))
+    address = house + " " + road_name + " " + road_type + " " + locality
+    edit_code = pd.Series(_choice(rng, list(edit_code_mix), list(edit_code_mix.values()), rows))
+    key_kind = _choice(rng, list(key_mix), list(key_mix.values()), rows)
+
+    m1_df = pd.DataFrame(index=ids)
+    m1_df["lga_code"] = lga_code
+    m1_df["propnum"] = propnum.where(key_kind == "propnum")
+    m1_df["spi"] = spi.where(key_kind == "spi")
+    m1_df["property_pfi"] = pfi.where(key_kind == "pfi")
+    m1_df["house_number_1"] = house
+    m1_df["house_suffix_1"] = pd.Series(_choice(rng, ["A", "B", ""], [0.05, 0.03, 0.92], rows)).replace("", np.nan)
+    m1_df["road_name"] = road_name
+    m1_df["road_type"] = road_type
+    m1_df["locality_name"] = locality
+    m1_df["is_primary"] = "Y"
+    m1_df["edit_code"] = edit_code
+    m1_df["date"] = "2025-" + _text(rng.integers(1, 13, rows)).str.zfill(2) + "-" + _text(rng.integers(1, 29, rows)).str.zfill(2)
+    m1_df["pozi_map"] = ('=hyperlink("https://vicmap.pozi.com/?propertypfi=' + pfi + '","https://vicmap.pozi.com/?propertypfi='
+                         + pfi + '")')
+    fields = {"spi": spi, "plan": plan, "propnum": propnum, "address": address, "other": _text(200000 + ids),
+              "old_address": _text(rng.integers(1, 400, rows)) + " OLD TRACK KIALLA", "crefno": _text(900000 + ids)}
+    comments = pd.Series("", index=ids, dtype=object)
+    for code, template in COMMENT_TEMPLATES.items():
+        has_code = (edit_code == code).to_numpy()
+        if has_code.any():
+            comments[has_code] = _fill_template(template, {name: values[has_code] for name, values in fields.items()})
+    unknown = ~edit_code.isin(list(COMMENT_TEMPLATES)).to_numpy()
+    comments[unknown] = "property " + propnum[unknown] + ": " + edit_code[unknown].str.lower() + " edit"
+    vague = rng.random(rows) < vague_comment_rate
+    comments[vague] = pd.Series(_choice(rng, ["as per request", "see attached", "checked", "ok"], np.ones(4), rows))[vague]
+    m1_df["comments"] = comments
+    # Every other Pozi column is blank, as it mostly is in real exports.
+    m1_df = m1_df.reindex(columns=M1_COLUMNS)
+
+    # Rates records: one per matched M1 row under its identifying key, plus unrelated properties.
+    memos = np.array(make_memos(memo_pool, memo_words, seed=seed), dtype=object)
+    matched = rng.random(rows) < match_rate
+    extra = int(rows * extra_rates)
+    all_ids = np.concatenate([ids[matched], rows + np.arange(extra)])
+    rates_propnum = _text(100000 + all_ids) + ".0"
+    rates_spi = pd.concat([spi[matched], _text(rng.integers(1, 40, extra)) + "\\PS" + _text(rng.integers(100000, 999999, extra))],
+                          ignore_index=True)
+    rates_pfi = np.where(rng.random(len(all_ids)) < 0.5, "PFI_RATES_", "") + _text(400000000 + all_ids) + ".0"
+    rates_address = pd.concat([address[matched], address.sample(extra, replace=True, random_state=seed)], ignore_index=True)
+    # Half of the address changes are already reflected in Rates; the other half still has the old address.
+    stale = (rng.random(len(all_ids)) < 0.5) & np.concatenate([edit_code[matched].isin(["S", "CHGADD"]), np.zeros(extra, bool)])
+    rates_address[stale] = "1 OLD TRACK KIALLA"
+    status = np.where(rng.random(len(all_ids)) < inactive_rate, "I", "C").tolist()
+    memo = memos[rng.integers(0, len(memos), len(all_ids))]
+    no_memo = rng.random(len(all_ids)) < 0.05
+    memo[no_memo] = ""
+    rates_records = [
+        {"propnum": p, "spi": s, "property_pfi": f, "address_full": a, "lot_number": s.split("\\")[0],
+         "plan_number": s.split("\\")[1], "status": st, "Memo": m}
+        for p, s, f, a, st, m in zip(rates_propnum, rates_spi, rates_pfi, rates_address, status, memo)
+    ]
+    order = rng.permutation(len(rates_records))
+    return m1_df, [rates_records[i] for i in order]
+
+
+def make_rates_records(count, seed=0):
+    """
+    Generates a synthetic rates table of `count` records shaped like `sample_rates_data`.
+    Roughly one record in ten is inactive ('I').
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        propnum = f"{100000 + i}.0"
+        lot, plan = rng.randint(1, 40), f"PS{rng.randint(100000, 999999)}"
+        records.append({
+            "propnum": propnum, "spi": f"{lot}\\{plan}", "property_pfi": f"PFI_RATES_{400000000 + i}",
+            "address_full": f"{rng.randint(1, 200)} SAMPLE STREET TATURA", "lot_number": str(lot), "plan_number": plan,
+            "status": "I" if rng.random() < 0.1 else "C",
+            "Memo": "Standard active property. No significant actions recorded recently.",
+        })
+    return records
+
+
+def make_extracts(count, change_rate=0.02, seed=0):
+    """
+    Generates synthetic Council and Vicmap extracts of about `count` properties as DataFrames sorted
+    by propnum. Roughly `change_rate` of properties each are new in Council, have a changed address,
+    or are missing from Council; half of the missing ones are subdivision parents of two new lots.
+    """
+    rng = np.random.default_rng(seed)
+    propnums = pd.Series([f"{n:07d}" for n in range(count)])
+    roads = np.array(["MAIN ROAD", "HIGH STREET", "GOWRIE STREET", "VERNEY ROAD", "WYNDHAM STREET"])
+    addresses = (pd.Series(rng.integers(1, 400, count)).astype(str) + " "
+                 + pd.Series(roads[rng.integers(0, len(roads), count)]) + ", SPRINGFIELD")
+    base = pd.DataFrame({
+        "propnum": propnums, "spi": "1\\PS" + propnums, "plan_number": "PS" + propnums, "lot_number": "1",
+        "full_address": addresses, "road_name": "MAIN ROAD", "house_number_1": "1",
+    })
+    # Bands of a uniform roll: [0, r) only in Vicmap, [r, 2r) renamed in Council, [2r, 3r) only in Council.
+    roll = rng.random(count)
+    council = base[roll >= change_rate].copy()
+    renamed = (roll[roll >= change_rate] < 2 * change_rate)
+    council.loc[renamed, "full_address"] = council.loc[renamed, "full_address"] + " (RENAMED)"
+    # Every other Vicmap-only parcel is a subdivision parent: pairs of Council-only lots go on its plan.
+    new_lots = council.index[(roll[roll >= change_rate] >= 2 * change_rate) & (roll[roll >= change_rate] < 3 * change_rate)]
+    parent_plans = base.loc[roll < change_rate, "plan_number"].to_numpy()[::2]
+    subdivided = new_lots[:2 * len(parent_plans)]
+    council.loc[subdivided, "plan_number"] = np.repeat(parent_plans, 2)[:len(subdivided)]
+    council.loc[subdivided, "lot_number"] = np.resize(["2", "3"], len(subdivided))
+    council.loc[subdivided, "spi"] = council.loc[subdivided, "lot_number"] + "\\" + council.loc[subdivided, "plan_number"]
+    council["is_active"] = True
+    vicmap = base[(roll < 2 * change_rate) | (roll >= 3 * change_rate)].copy()
+    vicmap["property_PFI"] = "PFI_" + vicmap["propnum"]
+    return council.reset_index(drop=True), vicmap.reset_index(drop=True)
+
+
+def write_dataset(directory, rows, seed=0, change_rate=0.02, **m1_options):
+    """
+    Writes a synthetic dataset of `rows` rows to `directory`: m1.csv (Pozi layout), rates.csv,
+    council.csv and vicmap.csv. `m1_options` are passed to `make_m1_dataset`. Returns the paths by name.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, name + ".csv") for name in ("m1", "rates", "council", "vicmap")}
+    m1_df, rates_records = make_m1_dataset(rows, seed=seed, **m1_options)
+    m1_df.to_csv(paths["m1"], index=False)
+    pd.DataFrame(rates_records).to_csv(paths["rates"], index=False)
+    council_df, vicmap_df = make_extracts(rows, change_rate=change_rate, seed=seed)
+    council_df.to_csv(paths["council"], index=False)
+    vicmap_df.to_csv(paths["vicmap"], index=False)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic M1, rates, Council and Vicmap dataset.")
+    parser.add_argument("rows", type=int, help="M1 rows (and Council/Vicmap properties), e.g. 10000, 100000 or 1000000.")
+    parser.add_argument("--output", default="synthetic_data", help="Output directory (default: synthetic_data).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--match-rate", type=float, default=0.9, help="Share of M1 rows with a rates record.")
+    parser.add_argument("--memo-words", type=int, nargs=2, default=(4, 40), metavar=("MIN", "MAX"),
+                        help="Rates memo length range in words.")
+    args = parser.parse_args(argv)
+    paths = write_dataset(args.output, args.rows, seed=args.seed, match_rate=args.match_rate,
+                          memo_words=tuple(args.memo_words))
+    for name, path in paths.items():
+        print(f"INFO: Wrote {name} data to {path}")
+
+
+if __name__ == "__main__":
+    main()
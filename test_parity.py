@@ -0,0 +1,394 @@
+# test_parity.py
+#
+# Parity checks for the fast paths against the reference implementations they replaced: batch against
+# per-row validation, indexed and snapshot rates lookups against linear scans, and snapshots against the
+# records they were written from. Run with `python -m pytest`.
+
+import contextlib
+import functools
+import io
+import os
+import random
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import comparison_engine
+import m1_validator
+from address_normalizer import AddressNormalizer
+from comparison_engine import compare_datasets, load_council_data, load_vicmap_data, write_vicmap_snapshot
+from keyword_matcher import KeywordMatcher
+from m1_validator import (RULES, RatesIndex, ValidationCache, get_rates_data, iter_m1_chunks, iter_validated_cached,
+                          join_rates_data, sample_rates_data, validate_m1_batch, validate_m1_csv, validate_m1_row)
+from rates_sources import DbApiRatesSource, RatesSnapshot, create_sqlite_rates_table, write_rates_snapshot
+from reference_snapshot import ReferenceSnapshot, write_snapshot
+from report_sinks import atomic_write
+from rule_engine import RuleEngine
+from synthetic_data import make_extracts, make_m1_dataset, make_rates_records
+
+SAMPLE_M1_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data.csv")
+
+
+def _quiet(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def _linear_lookup(propnum, spi, pfi, rates_records):
+    # Reference lookup, as the validator first did it: active-then-inactive scans for propnum, SPI, then PFI suffix.
+    for key, value in (("propnum", propnum), ("spi", spi)):
+        if value:
+            for wanted in (lambda r: r.get("status") == "C", lambda r: True):
+                for record in rates_records:
+                    if record.get(key) == value and wanted(record):
+                        return record
+    if pfi:
+        for wanted in (lambda r: r.get("status") == "C", lambda r: True):
+            for record in rates_records:
+                if record.get("property_pfi", "").endswith(pfi) and wanted(record):
+                    return record
+    return None
+
+
+def _per_row_statuses(m1_df, rates_index):
+    return [validate_m1_row(row, get_rates_data(row.get("propnum"), row.get("spi"),
+                                                row.get("property_pfi", row.get("property pfi")), rates_index))
+            for _, row in m1_df.iterrows()]
+
+
+def _batch_statuses(m1_df, rates_index):
+    return validate_m1_batch(m1_df, join_rates_data(m1_df, rates_index)).tolist()
+
+
+def _rates_with_duplicates(count, seed=0):
+    # Synthetic rates plus inactive/active duplicates of some keys and records without a PFI or Memo.
+    rng = random.Random(seed)
+    records = make_rates_records(count, seed=seed)
+    for record in rng.sample(records, count // 20):
+        records.append(dict(record, status="I" if record["status"] == "C" else "C", Memo="Duplicate key."))
+    for record in rng.sample(records, count // 50):
+        del record["property_pfi"]
+        record.pop("Memo", None)
+    rng.shuffle(records)
+    return records
+
+
+def _mixed_queries(records, count, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        record = rng.choice(records)
+        pfi = record.get("property_pfi", "PFI_RATES_0")
+        queries.append((record["propnum"] if rng.random() < 0.4 else "0.0",
+                        record["spi"] if rng.random() < 0.4 else None,
+                        pfi[-rng.randint(3, 12):] if rng.random() < 0.8 else None))
+    return queries
+
+
+def test_batch_matches_per_row_on_sample_data():
+    m1_df = pd.read_csv(SAMPLE_M1_CSV)
+    m1_df.columns = [col.strip() for col in m1_df.columns]
+    rates_index = RatesIndex(sample_rates_data)
+    RULES.reset_hits()
+    expected = _per_row_statuses(m1_df, rates_index)
+    row_hits = RULES.hits
+    RULES.reset_hits()
+    assert _batch_statuses(m1_df, rates_index) == expected
+    assert RULES.hits == row_hits
+
+
+def test_batch_matches_per_row_on_synthetic_data(tmp_path):
+    # Synthetic exports cover every edit-code family, unlike the sample (almost all 'not found').
+    m1_df, rates_records = make_m1_dataset(3000, seed=7)
+    m1_csv = str(tmp_path / "m1.csv")
+    m1_df.to_csv(m1_csv, index=False)
+    m1_df = next(iter_m1_chunks(m1_csv, chunksize=len(m1_df)))  # as the pipeline reads it
+    rates_index = RatesIndex(rates_records)
+    RULES.reset_hits()
+    expected = _per_row_statuses(m1_df, rates_index)
+    row_hits = RULES.hits
+    assert {rule.split(".")[0] for rule, count in row_hits.items() if count} == set(RULES.families) | {"not_found", "other"}
+    RULES.reset_hits()
+    assert _batch_statuses(m1_df, rates_index) == expected
+    assert RULES.hits == row_hits
+
+
+def test_rates_index_matches_linear_scan():
+    records = _rates_with_duplicates(2000)
+    rates_index = RatesIndex(records)
+    for query in _mixed_queries(records, 3000):
+        assert rates_index.lookup(*query) is _linear_lookup(*query, records)
+
+
+def test_get_rates_data_on_a_list_matches_index():
+    records = _rates_with_duplicates(500, seed=4)
+    rates_index = RatesIndex(records)
+    for query in _mixed_queries(records, 500, seed=4):
+        assert get_rates_data(*query, records) is get_rates_data(*query, rates_index)
+
+
+@pytest.mark.parametrize("pfi_match", ["suffix", "exact"])
+def test_db_rates_source_matches_index(tmp_path, pfi_match):
+    records = _rates_with_duplicates(1000, seed=5)
+    path = str(tmp_path / "rates.db")
+    with contextlib.closing(sqlite3.connect(path)) as conn:
+        create_sqlite_rates_table(conn, records)
+    queries = _mixed_queries(records, 600, seed=5)
+    if pfi_match == "exact":
+        # Exact matching only finds whole PFIs, so query with the full PFI each suffix came from.
+        def full_pfi(suffix):
+            return next((r["property_pfi"] for r in records if r.get("property_pfi", "").endswith(suffix)), suffix)
+        queries = [(propnum, spi, pfi and full_pfi(pfi)) for propnum, spi, pfi in queries]
+    rates_index = RatesIndex(records)
+    # Small batches, so each chunk's queries are split across several round trips.
+    source = DbApiRatesSource(functools.partial(sqlite3.connect, path), order_by="rowid", batch_size=40, pfi_match=pfi_match)
+    try:
+        for start in range(0, len(queries), 200):
+            chunk = pd.DataFrame(queries[start:start + 200], columns=["propnum", "spi", "property_pfi"])
+            chunk_index = source.index_for(chunk)
+            for query in queries[start:start + 200]:
+                assert chunk_index.lookup(*query) == rates_index.lookup(*query)
+        assert source.round_trips > 6  # more than one batch per query for each of the three chunks
+    finally:
+        source.close()
+
+
+def test_rates_snapshot_matches_linear_scan(tmp_path):
+    records = _rates_with_duplicates(2000, seed=1)
+    path = str(tmp_path / "rates.snap")
+    write_rates_snapshot(path, records)
+    snapshot = RatesSnapshot(path)
+    try:
+        for query in _mixed_queries(records, 3000, seed=1):
+            expected = _linear_lookup(*query, records)
+            assert snapshot.lookup(*query) == expected
+    finally:
+        snapshot.close()
+
+
+def test_snapshot_round_trip(tmp_path):
+    records = [{"propnum": "1", "spi": "1\\PS1", "full_address": "1 MAIN ST"},
+               {"propnum": "2", "full_address": "2 ÉTOILE WAY, MÜNSTER"},
+               {"propnum": "3", "spi": "", "full_address": None},
+               {"propnum": "1", "spi": "9\\PS9"}]
+    path = str(tmp_path / "records.snap")
+    assert write_snapshot(path, records, hash_fields=["propnum", "spi"], suffix_fields=["full_address"]) == 4
+    with ReferenceSnapshot(path) as snapshot:
+        assert len(snapshot) == 4
+        assert list(snapshot) == [{k: v for k, v in record.items() if v is not None} for record in records]
+        assert snapshot.find("propnum", "1") == 0
+        assert snapshot.find("spi", "") == 2
+        assert snapshot.find("propnum", "4") is None
+        assert snapshot.find_suffix("full_address", "MÜNSTER") == 1
+        assert snapshot.find_suffix("full_address", "ST") == 0
+        assert snapshot.find_suffix("full_address", "ROAD") is None
+        with pytest.raises(ValueError):
+            snapshot.mapping("propnum")  # propnum 1 appears twice
+
+
+def test_snapshot_rejects_reserved_characters(tmp_path):
+    with pytest.raises(ValueError):
+        write_snapshot(str(tmp_path / "bad.snap"), [{"memo": "a\x1fb"}])
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / "empty.snap")
+    write_rates_snapshot(path, [])
+    snapshot = RatesSnapshot(path)
+    try:
+        assert len(snapshot) == 0
+        assert snapshot.lookup("1.0", "1\\PS1", "PFI") is None
+    finally:
+        snapshot.close()
+
+
+def test_compare_over_vicmap_snapshot_matches_records(tmp_path):
+    council_df, vicmap_df = make_extracts(3000, seed=2)
+    council, vicmap = council_df.to_dict("records"), vicmap_df.to_dict("records")
+    path = str(tmp_path / "vicmap.snap")
+    write_vicmap_snapshot(path, [{k: v for k, v in record.items() if v == v} for record in vicmap])
+    with ReferenceSnapshot(path) as snapshot:
+        assert _quiet(compare_datasets, council, snapshot) == _quiet(compare_datasets, council, vicmap)
+
+
+def test_compare_sample_data():
+    changes = _quiet(compare_datasets, _quiet(load_council_data), _quiet(load_vicmap_data))
+    assert [(entry["change_category"], entry["council_propnum"]) for entry in changes] == [
+        ("New Property (Subdivision)", "7001"), ("New Property (Subdivision)", "7002"), ("Address Update", "5002"),
+        ("Parent Parcel (Implicitly Retired)", "6001"), ("Missing from Council Data", "9999")]
+
+
+@pytest.mark.parametrize("text, road_name, road_type, locality", [
+    ("10 FITZROY STREET ST KILDA", "FITZROY", "STREET", "ST KILDA"),
+    ("10 MAIN ST ST ALBANS", "MAIN", "STREET", "ST ALBANS"),
+    ("10 MAIN ST, ST ALBANS", "MAIN", "STREET", "ST ALBANS"),
+    ("5 HIGH STREET ROAD ASHWOOD", "HIGH STREET", "ROAD", "ASHWOOD"),
+    ("10 ST GEORGES RD NORTHCOTE", "ST GEORGES", "ROAD", "NORTHCOTE"),
+    ("71 GOWRIE STREET TATURA", "GOWRIE", "STREET", "TATURA"),
+])
+def test_parse_saint_localities(text, road_name, road_type, locality):
+    address = AddressNormalizer().parse(text)
+    assert (address.road_name, address.road_type, address.locality_name) == (road_name, road_type, locality)
+
+
+def test_address_change_reflected_in_saint_locality():
+    m1_df = pd.DataFrame([{"edit_code": "S", "propnum": "171764.0", "house_number_1": 10, "road_name": "FITZROY",
+                           "road_type": "STREET", "locality_name": "ST KILDA", "comments": ""}])
+    rates = [{"propnum": "171764.0", "address_full": "10 fitzroy street st kilda", "status": "C",
+              "Memo": "Address change request processed."}]
+    expected = _per_row_statuses(m1_df, RatesIndex(rates))
+    assert expected[0].startswith("OK: Address change (S) reflected in Rates")
+    assert _batch_statuses(m1_df, RatesIndex(rates)) == expected
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cached_rerun_streams_chunks(tmp_path, workers):
+    m1_df = pd.read_csv(SAMPLE_M1_CSV)
+    m1_df.columns = [col.strip() for col in m1_df.columns]
+    rates_index = RatesIndex(sample_rates_data)
+    chunks = [m1_df.iloc[start:start + 100].copy() for start in range(0, len(m1_df), 100)]
+    expected = _batch_statuses(m1_df, rates_index)
+    path = str(tmp_path / "cache.npz")
+
+    def run(log):
+        cache = ValidationCache(path)
+        statuses = []
+        for chunk in iter_validated_cached((log.append(i) or chunk.copy() for i, chunk in enumerate(chunks)),
+                                           rates_index, cache, workers):
+            log.append("yield")
+            statuses += chunk["validation_status"].tolist()
+        cache.save()
+        return statuses, cache
+
+    assert run([])[0] == expected
+    log = []
+    statuses, cache = run(log)
+    assert statuses == expected and cache.misses == 0
+    # Every fully cached chunk is yielded before the next one is read.
+    assert log == [entry for i in range(len(chunks)) for entry in (i, "yield")]
+
+
+def test_incremental_snapshot_saved_only_after_report(tmp_path):
+    snapshot, report = str(tmp_path / "extracts.npz"), str(tmp_path / "changes.ndjson")
+    # The report can't be written (its path is a directory), so the snapshot must not be either.
+    with pytest.raises(Exception):
+        _quiet(comparison_engine.main, ["--snapshot", snapshot, "--format", "ndjson", "--output", str(tmp_path)])
+    assert not os.path.exists(snapshot)
+    _quiet(comparison_engine.main, ["--snapshot", snapshot, "--format", "ndjson", "--output", report])
+    with open(report) as f:
+        assert len(f.readlines()) == 5
+    _quiet(comparison_engine.main, ["--snapshot", snapshot, "--format", "ndjson", "--output", report])
+    with open(report) as f:
+        assert f.read() == ""
+
+
+def test_empty_reports_keep_their_header(tmp_path):
+    with open(SAMPLE_M1_CSV) as f:
+        header = f.readline()
+    m1_csv, validated = tmp_path / "m1.csv", str(tmp_path / "m1_validated.csv")
+    m1_csv.write_text(header)
+    assert _quiet(validate_m1_csv, str(m1_csv), validated, RatesIndex(sample_rates_data)) == 0
+    with open(validated) as f:
+        assert f.read() == header.rstrip("\n") + ",validation_status\n"
+    snapshot, report = str(tmp_path / "extracts.npz"), str(tmp_path / "changes.csv")
+    for _ in range(2):  # the second run has no changes
+        _quiet(comparison_engine.main, ["--snapshot", snapshot, "--format", "csv", "--output", report])
+    with open(report) as f:
+        assert f.read() == ",".join(comparison_engine.CHANGE_REPORT_FIELDS) + "\n"
+
+
+def test_templates_render_without_evaluating_code():
+    with pytest.raises(ValueError):
+        RuleEngine(templates={"x": "{memo:{__import__('os').getpid()}}"})
+    with pytest.raises(ValueError):
+        RuleEngine(templates={"x": "{__import__('os').getpid()}"})
+    rules = RuleEngine(templates={"x": "({edit_code}) '{memo:.5}' {memo!r:.4}", "y": {"a": "{{{edit_code}}}"}})
+    context = {"edit_code": "NC", "memo": "{__import__('os')}"}
+    assert rules.render("x", context) == "(NC) '{__im' \"{__"
+    assert rules.render("y", context) == {"a": "{NC}"}
+
+
+def test_sort_merge_streams_sorted_extracts(tmp_path, monkeypatch):
+    council_df, vicmap_df = make_extracts(2000, seed=3)
+    council_csv, vicmap_csv = str(tmp_path / "council.csv"), str(tmp_path / "vicmap.csv")
+    council_df.sort_values("propnum").to_csv(council_csv, index=False)
+    vicmap_df.sort_values("propnum").to_csv(vicmap_csv, index=False)
+
+    def report(engine):
+        path = str(tmp_path / f"{engine}.ndjson")
+        _quiet(comparison_engine.main, ["--engine", engine, "--council", council_csv, "--vicmap", vicmap_csv,
+                                        "--format", "ndjson", "--output", path])
+        with open(path) as f:
+            return sorted(f.readlines())
+
+    expected = report("dict")
+    # Sort-merge gets the extracts as streamed rows, not as loaded (or sorted) lists.
+    inputs, iter_changes_sorted = [], comparison_engine.iter_changes_sorted
+    monkeypatch.setattr(comparison_engine, "iter_changes_sorted",
+                        lambda *records: inputs.extend(records) or iter_changes_sorted(*records))
+    assert report("sort-merge") == expected
+    assert not any(isinstance(records, list) for records in inputs) and len(inputs) == 2
+    vicmap_df.sample(frac=1, random_state=0).to_csv(vicmap_csv, index=False)
+    with pytest.raises(ValueError):
+        report("sort-merge")
+
+
+def test_keyword_scan_distinct_matches_scan():
+    matcher = KeywordMatcher({"retirement": ["retired", "consolidated"], "activity": ["retir"], "new": ["new lot"]})
+    texts = ["parcel retired", "", "new lot created", "parcel retired", "consolidated new lot", "nothing"]
+    assert matcher.scan_distinct(texts) == {text: matcher.scan(text) for text in texts}
+    assert matcher.scan.cache_info().maxsize <= 1024
+
+
+def test_chunk_size_does_not_change_output(tmp_path):
+    m1_df = pd.read_csv(SAMPLE_M1_CSV, dtype=str).head(60)
+    m1_df.columns = [col.strip() for col in m1_df.columns]
+    m1_df["propnum"] = [str(171700 + i) for i in range(len(m1_df))]  # every row has a propnum
+    m1_df.loc[3, "house_number_1"] = "12A"  # one row makes the column text
+    m1_df.loc[40:, "house_number_1"] = "70"
+    m1_csv = str(tmp_path / "m1.csv")
+    m1_df.to_csv(m1_csv, index=False)
+
+    outputs = []
+    for chunksize in (7, 25, 1000):
+        path = str(tmp_path / f"validated_{chunksize}.csv")
+        _quiet(validate_m1_csv, m1_csv, path, RatesIndex(sample_rates_data), chunksize)
+        with open(path) as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1] == outputs[2]
+    validated = pd.read_csv(str(tmp_path / "validated_7.csv"), dtype=str)
+    assert validated["house_number_1"].tolist() == m1_df["house_number_1"].tolist()
+    assert validated["propnum"].tolist() == [propnum + ".0" for propnum in m1_df["propnum"]]
+
+
+def test_batch_validates_council_families_through_their_handlers(monkeypatch):
+    rules = RuleEngine(dict(m1_validator.EDIT_CODE_FAMILIES, council_x=["ZZ"]),
+                       dict(m1_validator.STATUS_TEMPLATES, **{"council_x.seen": "OK: Council code ({edit_code}) for plan {plan}."}),
+                       keywords={"memo": m1_validator.MEMO_KEYWORDS, "comments": m1_validator.COMMENT_KEYWORDS},
+                       handlers=dict(m1_validator.RULE_HANDLERS, council_x=lambda row: "council_x.seen"),
+                       default_family=m1_validator.OTHER_FAMILY)
+    monkeypatch.setattr(m1_validator, "RULES", rules)
+    m1_df = pd.DataFrame([{"edit_code": "ZZ", "propnum": "171763.0", "plan_number": "PS828727", "comments": ""},
+                          {"edit_code": "NC", "propnum": "171763.0", "plan_number": "", "comments": ""}])
+    rates_index = RatesIndex(sample_rates_data)
+    expected = _per_row_statuses(m1_df, rates_index)
+    assert expected[0] == "OK: Council code (ZZ) for plan PS828727."
+    assert _batch_statuses(m1_df, rates_index) == expected
+
+
+def test_atomic_write_uses_unique_temporary_files(tmp_path):
+    path = str(tmp_path / "cache.npz")
+    with atomic_write(path) as first, atomic_write(path) as second:
+        assert first.name != second.name  # overlapping runs sharing a path
+        first.write(b"first")
+        second.write(b"second")
+    with open(path, "rb") as f:
+        assert f.read() == b"first"  # the last one to finish wins
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write(b"partial")
+            raise RuntimeError
+    with open(path, "rb") as f:
+        assert f.read() == b"first"
+    assert os.listdir(tmp_path) == ["cache.npz"]